@@ -11,3 +11,55 @@
 
 MAX_CONTENT_LENGTH = 1024 * 1024 * 4  # default content no larger than 1Mb
 STORAGE = {'prototype': 'dummy'}
+
+# SpatialReference of these srids are created on startup
+PRELOAD_SRIDS = [4326, 3857]
+
+# Bounds of prepared geometry cache used by binary predicates on stored
+# geometries
+PREPARED_GEOMETRY_CACHE_SIZE = 1024
+PREPARED_GEOMETRY_CACHE_BYTES = 64 * 1024 * 1024
+
+# Bounds of operation result cache, set size to 0 to disable the cache
+OPERATION_RESULT_CACHE_SIZE = 1024
+OPERATION_RESULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Threads evaluating batch operations, None means number of cpus
+BULK_THREADS = None
+
+# Stream GeoJson responses of features/geometries in chunks instead of
+# encoding the whole representation in memory first
+STREAMING_RESPONSE = False
+
+# Default and max number of features returned by a page of query
+QUERY_LIMIT = 1000
+
+# Grid steps of quantized coordinates when quantized GeoJson is requested by
+# Accept header without quantize argument
+QUANTIZATION = 100000
+
+# gzip/deflate compression of feature and operation responses negotiated
+# by Accept-Encoding, responses smaller than COMPRESSION_MIN_SIZE bytes are
+# not compressed
+COMPRESSION = True
+COMPRESSION_LEVEL = 6
+COMPRESSION_MIN_SIZE = 1024
+# Bounds of cache of compressed immutable responses (a feature at a
+# revision, or a cached operation result), set size to 0 to disable the
+# cache
+COMPRESSION_CACHE_SIZE = 256
+COMPRESSION_CACHE_BYTES = 64 * 1024 * 1024
+
+# Number of features validated together and stored in one transaction by
+# bulk import
+IMPORT_BATCH_SIZE = 1000
+
+# Worker processes running heavy operations (buffer, simplify, unions...)
+# on large geometries, 0 disables offloading
+OFFLOAD_PROCESSES = 0
+# Operations on geometries with less vertices runs inline
+OFFLOAD_MIN_VERTICES = 10000
+# Default timeout of offloaded operations in seconds, and timeouts of
+# specific operations keyed by operation class name, eg: {'Buffer': 10.}
+OFFLOAD_TIMEOUT = 30.
+OFFLOAD_TIMEOUTS = {}
@@ -18,6 +18,7 @@ from flask import Flask, redirect
 from . import default_settings
 from .restapi import GeoRestApi
 from . import storage
+from . import geo
 
 
 class GeoRestApp(Flask):
@@ -37,6 +38,7 @@ class GeoRestApp(Flask):
                                          **kwargs)
         self.load_config(settings)
         self.init_logging()
+        self.init_engine()
         self.init_datasources()
         self.init_api()
         self.init_views()
@@ -51,6 +53,19 @@ class GeoRestApp(Flask):
             # Load setting from instance config
             self.config.from_pyfile(settings, silent=True)
 
+    def init_engine(self):
+        geo.spatialref.preload_spatialrefs(self.config.get('PRELOAD_SRIDS'))
+        geo.operations.PREPARED_GEOMETRY_CACHE.configure(
+            max_items=self.config.get('PREPARED_GEOMETRY_CACHE_SIZE'),
+            max_bytes=self.config.get('PREPARED_GEOMETRY_CACHE_BYTES'))
+        geo.bulk.BULK_EXECUTOR.configure(
+            threads=self.config.get('BULK_THREADS'))
+        geo.offload.OFFLOAD_EXECUTOR.configure(
+            processes=self.config.get('OFFLOAD_PROCESSES'),
+            timeout=self.config.get('OFFLOAD_TIMEOUT'),
+            timeouts=self.config.get('OFFLOAD_TIMEOUTS'),
+            min_vertices=self.config.get('OFFLOAD_MIN_VERTICES'))
+
     def init_datasources(self):
         self.feature_storage = storage.build_feature_storage(
             **self.config['STORAGE'])
@@ -62,9 +62,14 @@ from .key import Key
 from .metadata import Metadata
 from .spatialref import SpatialReference
 from .geometry import Geometry
-from .feature import Feature
+from .feature import Feature, LazyFeature
 from .operations import *
 from .import jsonhelper
+from . import spatialref
+from . import geometry
+from . import operations
+from . import bulk
+from . import offload
 
 def _describe():
     import ujson
@@ -90,4 +95,16 @@ del _describe
 
 def describe():
     global _description
-    return _description
+    description = dict(_description)
+    description['spatial_reference_registry'] = \
+        spatialref.SPATIAL_REFERENCE_REGISTRY.describe()
+    description['coordinate_transform_cache'] = \
+        spatialref.COORDINATE_TRANSFORM_CACHE.describe()
+    description['geometry_parser'] = geometry.PARSER_STATS.describe()
+    description['geometry_validation'] = \
+        geometry.VALIDATION_STATS.describe()
+    description['prepared_geometry_cache'] = \
+        operations.PREPARED_GEOMETRY_CACHE.describe()
+    description['bulk_executor'] = bulk.BULK_EXECUTOR.describe()
+    description['offload_executor'] = offload.OFFLOAD_EXECUTOR.describe()
+    return description
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+"""
+    georest.geo.bulk
+    ~~~~~~~~~~~~~~~~
+    Evaluate geometry operations over lists of geometries
+
+    Shapely calls GEOS through ctypes, which releases the GIL during the
+    call, so chunks of geometries can be processed by a thread pool
+    concurrently.
+"""
+
+import itertools
+import threading
+import multiprocessing
+import multiprocessing.pool
+
+
+class BulkExecutor(object):
+    """Split a list into chunks and map a function over chunks using a
+    lazily created thread pool.  The function accepts a chunk and returns
+    a list of results of the same length.
+    """
+
+    def __init__(self, threads=None, chunk_size=256):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._threads = threads or multiprocessing.cpu_count()
+        self._chunk_size = chunk_size
+        self._batches = 0
+        self._items = 0
+
+    def configure(self, threads=None, chunk_size=None):
+        """Change pool size or chunk size, existing pool is closed"""
+        with self._lock:
+            if threads is not None:
+                self._threads = threads
+            if chunk_size is not None:
+                self._chunk_size = chunk_size
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def map(self, func, items):
+        items = list(items)
+        with self._lock:
+            self._batches += 1
+            self._items += len(items)
+            chunk_size = self._chunk_size
+            threads = self._threads
+
+        if len(items) <= chunk_size or threads <= 1:
+            # not worth the round trip to the pool
+            return list(func(items))
+
+        chunks = list(items[i:i + chunk_size]
+                      for i in range(0, len(items), chunk_size))
+        results = self._get_pool().map(func, chunks)
+        return list(itertools.chain.from_iterable(results))
+
+    def apply_each(self, func, items):
+        """Call `func` on each of items in the thread pool, returns a list
+        of results"""
+        items = list(items)
+        with self._lock:
+            threads = self._threads
+        if len(items) <= 1 or threads <= 1:
+            return list(func(item) for item in items)
+        return self._get_pool().map(func, items, chunksize=1)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.pool.ThreadPool(self._threads)
+            return self._pool
+
+    def describe(self):
+        with self._lock:
+            return {
+                'threads': self._threads,
+                'chunk_size': self._chunk_size,
+                'batches': self._batches,
+                'items': self._items,
+            }
+
+
+BULK_EXECUTOR = BulkExecutor()
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of `size` items, the last one may be
+    shorter"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,131 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+"""
+    georest.geo.cache
+    ~~~~~~~~~~~~~~~~~
+    Bounded in process caches
+
+"""
+
+import threading
+import collections
+
+
+class LRUCache(object):
+    """Thread safe least recently used cache
+
+    Bounded by number of items, and optionally by total size of items in
+    bytes, as reported by `sizeof(value)`.  `on_evict(key, value)` is called
+    when an item is evicted, while the cache is locked.
+    """
+
+    def __init__(self, max_items=1024, max_bytes=None, sizeof=None,
+                 on_evict=None):
+        assert max_items > 0
+        assert max_bytes is None or sizeof is not None
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._sizes = dict()
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._on_evict = on_evict
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def configure(self, max_items=None, max_bytes=None):
+        """Change cache bounds, evicts items if necessary"""
+        with self._lock:
+            if max_items is not None:
+                self._max_items = max_items
+            if max_bytes is not None:
+                self._max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                self._misses += 1
+                return default
+            # move to most recently used end
+            self._cache[key] = value
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value) if self._sizeof else 0
+        if self._max_bytes is not None and size > self._max_bytes:
+            # never going to fit
+            return
+        with self._lock:
+            if key in self._cache:
+                del self._cache[key]
+                self._bytes -= self._sizes.pop(key)
+            self._cache[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                return default
+            self._bytes -= self._sizes.pop(key)
+            return value
+
+    def get_or_create(self, key, factory):
+        """Return cached value of key, or create one using `factory()`
+
+        Note `factory` is called outside of the lock, so concurrent misses
+        of the same key may create the value more than once.
+        """
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while len(self._cache) > self._max_items or \
+                (self._max_bytes is not None and
+                 self._bytes > self._max_bytes):
+            key, value = self._cache.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self._evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(key, value)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def describe(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'size': len(self._cache),
+                'max_size': self._max_items,
+                'bytes': self._bytes,
+                'max_bytes': self._max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': float(self._hits) / total if total else 0.,
+            }
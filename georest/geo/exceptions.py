@@ -68,6 +68,10 @@ class OperationError(GeoException):
     HTTP_STATUS_CODE = 500
 
 
+class OperationTimeout(OperationError):
+    HTTP_STATUS_CODE = 503
+
+
 class InvalidParameter(GeoException):
     HTTP_STATUS_CODE = 400
 
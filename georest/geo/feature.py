@@ -14,12 +14,12 @@ import copy
 
 import six
 import shapely.geometry.base
-import geojson.base
 
 from . import jsonhelper as json
 from .key import Key
 from .geometry import Geometry
 from .spatialref import SpatialReference
+from .geojsonio import iter_feature, read_geometry, CHUNK_SIZE
 from .metadata import Metadata
 from .exceptions import InvalidFeature, InvalidGeometry, InvalidGeoJsonInput, \
     InvalidProperties
@@ -47,6 +47,8 @@ class Feature(object):
     safe to create a feature from request GeoJson data.
     """
 
+    __slots__ = ('_key', '_geometry', '_crs', '_properties', '_metadata')
+
     def __init__(self, key, geometry, crs, properties, metadata):
         assert isinstance(key, Key)
         assert Geometry.is_geometry(geometry)
@@ -87,49 +89,71 @@ class Feature(object):
         return self._metadata
 
     def refresh_metadata(self):
-        self._metadata = self._metadata.spawn(self._geometry)
+        self._metadata = self._metadata.spawn(self.geometry)
 
     def equals(self, other):
         assert isinstance(other, Feature)
-        return self._geometry.equals(other._geometry) and \
-               self._crs.equals(other._crs) and \
-               self._properties == other._properties
+        return self.geometry.equals(other.geometry) and \
+               self.crs.equals(other.crs) and \
+               self.properties == other.properties
 
     def almost_equals(self, other):
-        return self._geometry.almost_equals(other._geometry) and \
-               self._crs.equals(other._crs) and \
-               self._properties == other._properties
+        return self.geometry.almost_equals(other.geometry) and \
+               self.crs.equals(other.crs) and \
+               self.properties == other.properties
 
     def duplicate(self):
-        srid = self._crs.srid
-        geometry = Geometry.build_geometry(self._geometry,
+        srid = self.crs.srid
+        geometry = Geometry.build_geometry(self.geometry,
                                            srid=srid,
-                                           copy=True)
-        properties = copy.deepcopy(self._properties)
+                                           copy=True,
+                                           validate=Geometry.VALIDATE_SKIP)
+        properties = copy.deepcopy(self.properties)
 
         return Feature.build_from_geometry(geometry,
                                            key=self._key,
-                                           properties=properties)
+                                           properties=properties,
+                                           validate=Geometry.VALIDATE_SKIP)
 
     @property
     def __geo_interface__(self):
         geo_obj = dict(type='Feature',
-                      geometry=shapely.geometry.mapping(self._geometry),
-                      properties=self._properties,
+                      geometry=shapely.geometry.mapping(self.geometry),
+                      properties=self.properties,
                       id=self._key.qualified_name)
-        if not self._crs or self._crs.srid != 4326:
-            geo_obj['crs'] = self._crs.geojson
+        if not self.crs or self.crs.srid != 4326:
+            geo_obj['crs'] = self.crs.geojson
         return geo_obj
 
+    def dump_properties(self, double_precision=7):
+        """Encode properties as json"""
+        return json.dumps(self.properties, double_precision=double_precision)
+
+    def read_properties(self):
+        """Properties for reading only, don't modify the returned mapping"""
+        return self.properties
 
     @property
     def geojson(self):
-        return json.dumps(self.__geo_interface__, double_precision=7)
+        return ''.join(self.iter_geojson())
+
+    def iter_geojson(self, double_precision=7, chunk_size=CHUNK_SIZE,
+                     quantization=None):
+        """Encode as GeoJson, yields string chunks
+
+        Coordinates are quantized and delta encoded if `quantization` is
+        given, see `geojsonio.Quantizer`.
+        """
+        return iter_feature(self, double_precision=double_precision,
+                            chunk_size=chunk_size,
+                            quantization=quantization)
 
     @classmethod
     def build_from_geometry(cls, geo_input, key=None, srid=4326,
-                            properties=None):
-        geometry = Geometry.build_geometry(geo_input, srid=srid)
+                            properties=None,
+                            validate=Geometry.VALIDATE_STRICT):
+        geometry = Geometry.build_geometry(geo_input, srid=srid,
+                                           validate=validate)
         metadata = Metadata.make_metadata(geometry=geometry)
 
         if key is None:
@@ -155,6 +179,8 @@ class Feature(object):
             literal = geo_input
         else:
             raise InvalidGeoJsonInput('Not a GeoJson or a literal object')
+        if not isinstance(literal, dict):
+            raise InvalidFeature('Feature is not an object')
 
         # basic feature structural check
         try:
@@ -170,25 +196,28 @@ class Feature(object):
             crs = SpatialReference.build_from_geojson_crs(literal['crs'])
             srid = crs.srid
         else:
-            crs = SpatialReference(srid)
-
-        # build geojson feature object
-        try:
-            geojson_feature = geojson.base.GeoJSON.to_instance(literal)
-        except (TypeError, ValueError) as e:
-            raise InvalidFeature(e=e)
+            crs = SpatialReference.make_spatialref(srid)
 
-        if geojson_feature['geometry'] is None:
+        if literal['geometry'] is None:
             raise InvalidGeometry('Invalid geometry')
 
-        if geojson_feature['properties'] is None:
+        properties = literal.get('properties')
+        if properties is None:
             properties = dict()
-        else:
-            properties = geojson_feature['properties']
+        elif not isinstance(properties, dict):
+            raise InvalidFeature('Feature properties is not an object')
+
+        # validate geometry structure and build it from coordinates in one
+        # pass
+        try:
+            geometry = read_geometry(literal['geometry'])
+        except ValueError as e:
+            raise InvalidFeature(e=e)
 
         # assemble the Feature
-        geometry = Geometry.build_geometry(geojson_feature['geometry'],
-                                           srid=srid)
+        geometry = Geometry.build_geometry(geometry,
+                                           srid=srid,
+                                           validate=Geometry.VALIDATE_STRICT)
         metadata = Metadata.make_metadata(geometry=geometry)
 
         if key is None:
@@ -205,15 +234,113 @@ class Feature(object):
     def __hash__(self):
         return hash(self._key)
 
+    # Version of pickled state, state is a tuple of
+    #   (version, bucket, name, wkb, srid, properties, metadata tuple)
+    # only builtin types are used so unpickling does not look up classes,
+    # and geometry is restored straight from wkb.
+    # Legacy state (version 1) is (Key, wkb, SpatialReference, properties,
+    # Metadata), and is still accepted.
+    PICKLE_VERSION = 2
+
     def __getstate__(self):
-        return (self._key, self._geometry.wkb, self._crs,
-                self._properties, self._metadata)
+        return (Feature.PICKLE_VERSION,
+                self._key.bucket, self._key.name,
+                self.geometry.wkb, self.crs.srid,
+                self.properties, tuple(self._metadata))
 
     def __setstate__(self, state):
-        key, wkb, crs, properties, metadata = state
-        geometry = Geometry.build_geometry(wkb, srid=crs.srid)
+        if isinstance(state[0], Key):
+            # legacy state
+            key, wkb, crs, properties, metadata = state
+            srid = crs.srid
+        else:
+            version = state[0]
+            if version != Feature.PICKLE_VERSION:
+                raise InvalidFeature('Unknown pickle version %r' % version)
+            version, bucket, name, wkb, srid, properties, metadata = state
+            key = Key(bucket, name)
+            metadata = Metadata(*metadata)
+
+        geometry = Geometry.load_wkb(wkb, srid)
         self._key = key
         self._geometry = geometry
-        self._crs = crs
+        self._crs = geometry.crs
         self._properties = properties
         self._metadata = metadata
+
+
+class LazyFeature(Feature):
+    """ A Feature decoding its stored representation on demand
+
+    Holds the geometry data (WKT or WKB) and properties (a dict, or a
+    `jsonhelper.JsonObject` if storage returns encoded json) as they are
+    read from the storage, geometry is only built when `geometry` is accessed,
+    spatial reference when `crs` is accessed, and properties are only
+    copied when `properties` is accessed, so reading properties does not
+    parse the geometry, and encoding the feature does not copy properties.
+
+    Stored geometries are trusted and not validated.
+    """
+
+    __slots__ = ('_geometry_data', '_srid', '_properties_data')
+
+    def __init__(self, key, geometry_data, srid, properties_data, metadata):
+        assert isinstance(key, Key)
+        assert isinstance(metadata, Metadata)
+
+        self._key = key
+        self._metadata = metadata
+        self._geometry = None
+        self._crs = None
+        self._properties = None
+        self._geometry_data = geometry_data
+        self._srid = srid
+        self._properties_data = properties_data
+
+    @property
+    def geometry(self):
+        if self._geometry is None:
+            self._geometry = Geometry.build_geometry(
+                self._geometry_data, srid=self._srid,
+                validate=Geometry.VALIDATE_SKIP)
+            self._geometry_data = None
+        return self._geometry
+
+    @geometry.setter
+    def geometry(self, geometry):
+        Feature.geometry.fset(self, geometry)
+        self._geometry_data = None
+
+    @property
+    def properties(self):
+        if self._properties is None:
+            # storage may hold on to the original
+            self._properties = dict(self._properties_data)
+            self._properties_data = None
+        return self._properties
+
+    @property
+    def crs(self):
+        if self._crs is None:
+            self._crs = SpatialReference.make_spatialref(self._srid)
+        return self._crs
+
+    def dump_properties(self, double_precision=7):
+        if self._properties is None:
+            if isinstance(self._properties_data, json.JsonObject):
+                # encoded by storage, pass through
+                return self._properties_data.text
+            return json.dumps(self._properties_data,
+                              double_precision=double_precision)
+        return Feature.dump_properties(self, double_precision)
+
+    def read_properties(self):
+        if self._properties is None:
+            return self._properties_data
+        return self._properties
+
+    def __setstate__(self, state):
+        Feature.__setstate__(self, state)
+        self._geometry_data = None
+        self._properties_data = None
+        self._srid = self._crs.srid
@@ -0,0 +1,545 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+"""
+    georest.geo.geojsonio
+    ~~~~~~~~~~~~~~~~~~~~~
+    GeoJson encoder writes coordinates directly from geometries
+
+    `geojson.mapping.to_mapping()` builds a nested dict/tuple tree of the
+    whole geometry before it's dumped, which allocates a tuple for every
+    coordinate.  Here coordinates of every coordinate sequence are copied
+    into a numpy array via the array interface and dumped by ujson in one
+    call, and the output is yielded in chunks so large geometries can be
+    streamed instead of materialized as one string.
+
+    Optionally coordinates are quantized to integers on a grid over the
+    bounding box and delta encoded, with the transform to decode them, see
+    `Quantizer`.
+
+    The reader validates a decoded GeoJson geometry and builds the shapely
+    geometry from the coordinate lists in the same pass, without wrapping
+    the structure into `geojson` objects first.
+
+    Splitters cut a feature collection or newline delimited GeoJson read in
+    chunks into texts of features, so a large input can be decoded one
+    feature at a time.
+"""
+
+import re
+
+import numpy
+import shapely.geometry
+
+from . import jsonhelper as json
+from .exceptions import InvalidGeometry, InvalidGeoJsonInput
+
+# Output is buffered and yielded when exceeds this size
+CHUNK_SIZE = 64 * 1024
+
+# Positions of a coordinate sequence encoded at once, so encoding a huge
+# line string or ring takes bounded memory and is chunked
+SEQUENCE_BLOCK_SIZE = 4096
+
+
+def iter_geometry(geometry, crs=None, double_precision=7,
+                  chunk_size=CHUNK_SIZE, quantization=None):
+    """Encode a shapely geometry as GeoJson geometry, yields string chunks
+
+    `crs` is a `SpatialReference`, written into the output only if its not
+    the GeoJson default WGS84.
+
+    If `quantization` is given, coordinates are quantized over bounds of
+    the geometry, see `Quantizer`.
+    """
+    quantizer = Quantizer(geometry.bounds, quantization) \
+        if quantization else None
+    return buffered(_write_geometry(geometry, crs, double_precision,
+                                    quantizer, transform=True),
+                    chunk_size)
+
+
+def iter_feature(feature, double_precision=7, chunk_size=CHUNK_SIZE,
+                 quantization=None):
+    """Encode a `Feature` as GeoJson feature, yields string chunks
+
+    If `quantization` is given, coordinates are quantized over bbox of
+    feature metadata, see `Quantizer`.
+    """
+    quantizer = Quantizer(feature.metadata.bbox, quantization) \
+        if quantization else None
+    return buffered(_write_feature(feature, double_precision, quantizer),
+                    chunk_size)
+
+
+def iter_feature_collection(features, members=None, double_precision=7,
+                            chunk_size=CHUNK_SIZE):
+    """Encode `Feature`s as GeoJson feature collection, yields string chunks
+
+    `members` is a dict of extra members of the collection object.
+    """
+    return buffered(_write_feature_collection(features, members,
+                                              double_precision),
+                    chunk_size)
+
+
+def iter_feature_lines(features, double_precision=7, chunk_size=CHUNK_SIZE):
+    """Encode `Feature`s as newline delimited GeoJson, yields string chunks"""
+    return buffered(_write_feature_lines(features, double_precision),
+                    chunk_size)
+
+
+def buffered(pieces, chunk_size=CHUNK_SIZE):
+    """Join small pieces of strings into chunks of roughly `chunk_size`"""
+    buf = list()
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = list()
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _write_feature_collection(features, members, double_precision):
+    yield '{"type":"FeatureCollection","features":['
+    for n, feature in enumerate(features):
+        if n > 0:
+            yield ','
+        for piece in _write_feature(feature, double_precision):
+            yield piece
+    yield ']'
+    for name, value in sorted((members or {}).items()):
+        yield ',%s:%s' % (json.dumps(name), json.dumps(value))
+    yield '}'
+
+
+def _write_feature_lines(features, double_precision):
+    for feature in features:
+        for piece in _write_feature(feature, double_precision):
+            yield piece
+        yield '\n'
+
+
+def _write_feature(feature, double_precision, quantizer=None):
+    yield '{"type":"Feature","id":'
+    yield json.dumps(feature.key.qualified_name)
+    yield ',"properties":'
+    yield feature.dump_properties(double_precision=double_precision)
+    crs = feature.crs
+    if not crs or crs.srid != 4326:
+        yield ',"crs":'
+        yield json.dumps(crs.geojson)
+    if quantizer is not None:
+        yield ',"transform":'
+        yield quantizer.dump_transform()
+    yield ',"geometry":'
+    for piece in _write_geometry(feature.geometry, None, double_precision,
+                                 quantizer):
+        yield piece
+    yield '}'
+
+
+def _write_geometry(geometry, crs, double_precision, quantizer=None,
+                    transform=False):
+    geom_type = geometry.geom_type
+    yield '{"type":"%s",' % geom_type
+    if geom_type == 'GeometryCollection':
+        yield '"geometries":['
+        # shapely reports empty geometries as empty collections
+        members = geometry.geoms if not geometry.is_empty else []
+        for n, member in enumerate(members):
+            if n > 0:
+                yield ','
+            for piece in _write_geometry(member, None, double_precision,
+                                         quantizer):
+                yield piece
+        yield ']'
+    else:
+        yield '"coordinates":'
+        for piece in _write_coordinates(geometry, double_precision,
+                                        quantizer):
+            yield piece
+    if crs is not None and (not crs or crs.srid != 4326):
+        yield ',"crs":'
+        yield json.dumps(crs.geojson)
+    if transform and quantizer is not None:
+        yield ',"transform":'
+        yield quantizer.dump_transform()
+    yield '}'
+
+
+def _write_coordinates(geometry, double_precision, quantizer=None):
+    geom_type = geometry.geom_type
+    if geom_type == 'Point':
+        coords = ''.join(_iter_sequence(geometry, double_precision,
+                                        quantizer))
+        # a position instead of list of positions, '[[x,y]]' or '[]'
+        yield coords[1:-1] if geometry.coords else coords
+    elif geom_type in ('LineString', 'LinearRing'):
+        for piece in _iter_sequence(geometry, double_precision, quantizer):
+            yield piece
+    elif geom_type == 'Polygon':
+        yield '['
+        if not geometry.is_empty:
+            for piece in _iter_sequence(geometry.exterior, double_precision,
+                                        quantizer):
+                yield piece
+            for interior in geometry.interiors:
+                yield ','
+                for piece in _iter_sequence(interior, double_precision,
+                                            quantizer):
+                    yield piece
+        yield ']'
+    else:
+        # multi geometries
+        yield '['
+        parts = geometry.geoms if not geometry.is_empty else []
+        for n, part in enumerate(parts):
+            if n > 0:
+                yield ','
+            for piece in _write_coordinates(part, double_precision,
+                                            quantizer):
+                yield piece
+        yield ']'
+
+
+def _iter_sequence(geometry, double_precision, quantizer=None):
+    # copy coordinates out of GEOS using array interface
+    coords = numpy.asarray(geometry.coords, dtype=numpy.float64)
+    if quantizer is not None:
+        return quantizer.iter_sequence(coords)
+    return _iter_blocks(coords, double_precision)
+
+
+def _iter_blocks(array, double_precision=7):
+    """Encode rows of an array as a json list, SEQUENCE_BLOCK_SIZE rows at a
+    time"""
+    yield '['
+    for start in range(0, len(array), SEQUENCE_BLOCK_SIZE):
+        if start > 0:
+            yield ','
+        block = array[start:start + SEQUENCE_BLOCK_SIZE]
+        # strip brackets of the block
+        yield json.dumps(block.tolist(),
+                         double_precision=double_precision)[1:-1]
+    yield ']'
+
+
+class Quantizer(object):
+    """Quantize coordinates to integers on a grid over the bbox
+
+    The bbox is divided into `quantization` steps on each axis, a quantized
+    coordinate is the index of the nearest grid line.  Positions of each
+    line string or ring are delta encoded, the first position is quantized
+    as is and the following ones are differences to the previous position.
+    Points (including members of a multi point) are not delta encoded.
+
+    Clients decode a sequence by accumulating deltas and applying the
+    transform, like TopoJSON:
+
+        x = sum(dx[0..i]) * scale[0] + translate[0]
+        y = sum(dy[0..i]) * scale[1] + translate[1]
+
+    Only x and y are written, z is dropped.
+    """
+
+    def __init__(self, bbox, quantization=100000):
+        assert quantization > 1
+        if not bbox:
+            # bbox of empty geometries
+            bbox = (0., 0., 0., 0.)
+        minx, miny, maxx, maxy = bbox
+        steps = float(quantization - 1)
+        self.translate = numpy.array([minx, miny], dtype=numpy.float64)
+        # degenerate bbox, eg: of a point
+        self.scale = numpy.array([(maxx - minx) / steps or 1.,
+                                  (maxy - miny) / steps or 1.],
+                                 dtype=numpy.float64)
+
+    def quantize(self, coords):
+        """Quantize a n*2 (or n*3) array of coordinates, returns a n*2
+        integer array"""
+        return numpy.rint((coords[:, :2] - self.translate) / self.scale) \
+            .astype(numpy.int64)
+
+    def iter_sequence(self, coords):
+        """Encode delta encoded positions, yields string pieces"""
+        if not len(coords):
+            return iter(['[]'])
+        quantized = self.quantize(coords)
+        deltas = numpy.empty_like(quantized)
+        deltas[0] = quantized[0]
+        deltas[1:] = numpy.diff(quantized, axis=0)
+        return _iter_blocks(deltas)
+
+    def dump_sequence(self, coords):
+        return ''.join(self.iter_sequence(coords))
+
+    def dump_transform(self):
+        return json.dumps({'scale': self.scale.tolist(),
+                           'translate': self.translate.tolist()},
+                          double_precision=15)
+
+
+class _CoordinateError(ValueError):
+    pass
+
+
+def read_geometry(literal):
+    """Build a shapely geometry from a decoded GeoJson geometry object, or
+    a python geo interface mapping
+
+    :raises InvalidGeometry: malformed geometry structure
+    :raises ValueError: coordinates are not arrays of numbers
+    """
+    if not isinstance(literal, dict):
+        raise InvalidGeometry('Geometry is not an object')
+    geom_type = literal.get('type')
+    if geom_type == 'GeometryCollection':
+        members = literal.get('geometries')
+        if not isinstance(members, (list, tuple)):
+            raise InvalidGeometry('Invalid GeometryCollection members')
+        return shapely.geometry.GeometryCollection(
+            list(read_geometry(member) for member in members))
+
+    try:
+        reader = _COORDINATE_READERS[geom_type]
+    except (KeyError, TypeError):
+        raise InvalidGeometry('Unrecognized geometry type %r' % geom_type)
+    try:
+        coordinates = literal['coordinates']
+    except KeyError:
+        raise InvalidGeometry('No coordinates in the %s' % geom_type)
+    if not isinstance(coordinates, (list, tuple)):
+        raise _CoordinateError('%r is not a coordinate array' %
+                               (coordinates,))
+
+    try:
+        return reader(coordinates)
+    except (IndexError, AssertionError) as e:
+        raise InvalidGeometry('Invalid %s coordinates' % geom_type, e=e)
+    except _CoordinateError:
+        raise
+    except ValueError as e:
+        # too few positions, raised by shapely
+        raise InvalidGeometry(e=e)
+
+
+def _read_positions(coordinates):
+    # numpy checks the array is rectangular and numeric in C
+    positions = numpy.asarray(coordinates)
+    if positions.ndim != 2 or positions.dtype.kind not in 'if':
+        raise _CoordinateError('%r is not an array of positions' %
+                               (coordinates,))
+    if positions.shape[1] not in (2, 3):
+        raise InvalidGeometry('Positions must have 2 or 3 elements')
+    return positions
+
+
+def _read_point(coordinates):
+    if not coordinates:
+        return shapely.geometry.Point()
+    position = _read_positions([coordinates])[0]
+    return shapely.geometry.Point(*position)
+
+
+def _read_linestring(coordinates):
+    if not coordinates:
+        return shapely.geometry.LineString()
+    return shapely.geometry.LineString(_read_positions(coordinates))
+
+
+def _read_polygon(coordinates):
+    if not coordinates:
+        return shapely.geometry.Polygon()
+    rings = list(_read_positions(ring) for ring in coordinates)
+    return shapely.geometry.Polygon(rings[0], rings[1:])
+
+
+def _read_multipoint(coordinates):
+    if not coordinates:
+        return shapely.geometry.MultiPoint()
+    return shapely.geometry.MultiPoint(_read_positions(coordinates))
+
+
+def _read_multilinestring(coordinates):
+    if not coordinates:
+        return shapely.geometry.MultiLineString()
+    return shapely.geometry.MultiLineString(
+        list(_read_positions(line) for line in coordinates))
+
+
+def _read_multipolygon(coordinates):
+    if not coordinates:
+        return shapely.geometry.MultiPolygon()
+    polygons = list()
+    for polygon in coordinates:
+        if not isinstance(polygon, (list, tuple)) or not polygon:
+            raise _CoordinateError('%r is not an array of rings' % (polygon,))
+        rings = list(_read_positions(ring) for ring in polygon)
+        polygons.append((rings[0], rings[1:]))
+    return shapely.geometry.MultiPolygon(polygons)
+
+
+_COORDINATE_READERS = {
+    'Point': _read_point,
+    'LineString': _read_linestring,
+    'Polygon': _read_polygon,
+    'MultiPoint': _read_multipoint,
+    'MultiLineString': _read_multilinestring,
+    'MultiPolygon': _read_multipolygon,
+}
+
+
+# structural characters outside of features, and inside of a feature where
+# only brackets need to be matched
+_TOKEN_REGEX = re.compile(r'[{}\[\]:,"]')
+_BRACKET_REGEX = re.compile(r'[{}\[\]"]')
+# rest of a string up to its closing quote, or a trailing escape
+_STRING_BODY_REGEX = re.compile(r'(?:[^"\\]|\\.)*')
+
+
+def _inherit_crs(text, crs):
+    """insert crs of the collection as the first member of a feature text,
+    so a crs of the feature itself still takes precedence"""
+    if crs is None or crs == 'null' or not text.startswith('{'):
+        return text
+    rest = text[1:]
+    if rest.lstrip().startswith('}'):
+        return '{"crs":%s%s' % (crs, rest)
+    return '{"crs":%s,%s' % (crs, rest)
+
+
+def split_feature_collection(chunks):
+    """Split a GeoJson feature collection into feature texts, yields texts
+    of members of the `features` array as soon as they are read
+
+    `chunks` is an iterable of strings.  Only the structure required to
+    locate features is checked, other members of the collection are
+    skipped and features themselves are left to the decoder, so every
+    member yields a text even if it's not an object.  A `crs` of the
+    collection is inserted into each feature, it must precede `features`.
+
+    :raises InvalidGeoJsonInput: not a json object with a features array
+    """
+    buf = ''
+    pos = 0
+    depth = 0
+    key = None  # last string at depth 1, a member name if followed by ':'
+    crs = None  # text of the crs member of the collection
+    in_features = False
+    found = False
+    count = 0  # members of features yielded
+    string = None  # start of the current string
+    start = None  # start of the current feature or crs in buf
+    pieces = list()  # previous pieces of the current feature or crs
+    chunks = iter(chunks)
+    while True:
+        if string is not None:
+            pos = _STRING_BODY_REGEX.match(buf, pos).end()
+            if pos < len(buf):
+                # closing quote
+                pos += 1
+                if depth == 1:
+                    key = buf[string:pos]
+                string = None
+                continue
+            # only strings at depth 1 are kept as a whole
+            resume = string if depth == 1 else pos
+            match = None
+        else:
+            regex = _TOKEN_REGEX if depth <= 2 else _BRACKET_REGEX
+            match = regex.search(buf, pos)
+            resume = len(buf)
+
+        if match is None:
+            # need more input, pieces of the current feature are joined
+            # once it's complete
+            if start is not None:
+                pieces.append(buf[start:resume])
+                start = 0
+            if string is not None:
+                string -= resume
+            pos -= resume
+            buf = buf[resume:]
+            try:
+                buf += next(chunks)
+            except StopIteration:
+                break
+            continue
+
+        char = match.group()
+        pos = match.end()
+        if char == '"':
+            string = match.start()
+            continue
+
+        # a feature ends at depth 2 and the crs at depth 1, by the next
+        # separator or closing bracket
+        text = None
+        if start is not None and char in ',]}' and \
+                depth == (2 if in_features else 1):
+            text = (''.join(pieces) + buf[start:match.start()]).strip()
+            start = None
+            del pieces[:]
+            if not in_features:
+                crs = text
+
+        if depth == 0 and char != '{':
+            raise InvalidGeoJsonInput('Not a GeoJson object')
+        if char in '{[':
+            if char == '[' and depth == 1 and key == '"features"':
+                in_features = found = True
+                start = pos
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth < 0:
+                raise InvalidGeoJsonInput('Unbalanced brackets')
+            if in_features and depth == 1:
+                if char != ']':
+                    raise InvalidGeoJsonInput('Unbalanced brackets')
+                # an empty array has no member
+                if text or count:
+                    count += 1
+                    yield _inherit_crs(text, crs)
+                in_features = False
+            elif depth == 0:
+                break
+        elif char == ',':
+            if in_features and depth == 2:
+                count += 1
+                yield _inherit_crs(text, crs)
+                start = pos
+            elif depth == 1:
+                key = None
+        elif char == ':' and depth == 1 and key == '"crs"':
+            if found:
+                raise InvalidGeoJsonInput(
+                    'crs of the FeatureCollection must precede features')
+            start = pos
+
+    if depth != 0:
+        raise InvalidGeoJsonInput('Unexpected end of GeoJson input')
+    if not found:
+        raise InvalidGeoJsonInput('No features in the FeatureCollection')
+
+
+def split_lines(chunks):
+    """Split newline delimited GeoJson into feature texts, blank lines are
+    skipped"""
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if rest.strip():
+        yield rest
@@ -11,7 +11,8 @@ __date__ = '6/4/14'
 """
 
 import re
-import io
+import time
+import threading
 
 import six
 
@@ -23,12 +24,11 @@ import shapely.validation
 import shapely.wkt
 import shapely.wkb
 
-import geojson
-import geojson.base
-import geojson.mapping
+from shapely.errors import ReadingError
 
 from .exceptions import InvalidGeometry, InvalidGeoJsonInput
 from .spatialref import SpatialReference
+from .geojsonio import iter_geometry, read_geometry, CHUNK_SIZE
 from . import jsonhelper as json
 
 
@@ -45,8 +45,17 @@ class Geometry(object):
         return isinstance(obj, Geometry) and \
                isinstance(obj, shapely.geometry.base.BaseGeometry)
 
+    # Validation policies:
+    # - strict: validate when created, for untrusted input
+    # - skip: never validate, for data we wrote ourselves
+    # - lazy: validate on first topological use, for intermediate results
+    VALIDATE_STRICT = 'strict'
+    VALIDATE_SKIP = 'skip'
+    VALIDATE_LAZY = 'lazy'
+
     @classmethod
-    def build_geometry(cls, geo_input, srid=4326, copy=False, empty_check=True):
+    def build_geometry(cls, geo_input, srid=4326, copy=False, empty_check=True,
+                       validate=VALIDATE_STRICT):
         """Make a shapely Geometry object from given geometry input and srid
 
         `geo_input` can be one of the following format:
@@ -59,6 +68,9 @@ class Geometry(object):
         - A subclass of shapely.geometry.base.BaseGeometry
         - A dict satisfies python geo interface
 
+        Input format is decided by `sniff_geometry_format()` and only the
+        matching parser is called.
+
         `srid` specifies spatial reference in EPSG, a `SpatialReference` object
         will be created and assign to `_crs` member of the created geometry
         object.  Available srid is determined by underlying projection library
@@ -68,10 +80,14 @@ class Geometry(object):
         If `geo_input` already contains a bundled SRID (eg: EWKT) then `srid`
         parameter is ignored.
 
-        `copy` means coordinates are copied from GeoJson input to the created
-        geometry instead of using a coordinates value proxy.  Don't copy
-        coordinates means fast creation but can cause problems when doing
-        geometry operations.
+        `copy` means a shapely geometry input is copied instead of used as
+        the created geometry.  Coordinates of GeoJson input are always
+        copied into the created geometry.
+
+        `validate` is the validation policy, one of `VALIDATE_STRICT`,
+        `VALIDATE_SKIP` and `VALIDATE_LAZY`.  A lazy validated geometry is
+        checked when `check_validity()` is called, geometry operations does
+        this before using the geometry.
 
         Returns a shapely.base.geometry.BaseGeometry object.
 
@@ -79,62 +95,96 @@ class Geometry(object):
         """
         assert isinstance(srid, int)
 
-        # factory methods, ordered by attempt priority
-        factories = [create_geometry_from_geometry,
-                     create_geometry_from_literal,
-                     create_geometry_from_geojson,
-                     create_geometry_from_wkt,
-                     create_geometry_from_wkb, ]
-
-        for factory in factories:
-            # find a suitable factory for given input
-            try:
-                geometry, bundled_srid = factory(geo_input, copy=copy)
-            except NotMyType:
-                continue
-            try:
-                if not geometry.is_valid:
-                    reason = shapely.validation.explain_validity(geometry)
-                    raise InvalidGeometry(
-                        'Invalid geometry is not allowed: %s' % reason)
-            except Exception as e:
-                # delayed asShape geometry build causes error only surfaces
-                # when we read the geometry
-                raise InvalidGeometry('Invalid coordinates', e=e)
-
-            if empty_check and geometry.is_empty:
-                raise InvalidGeometry('Empty geometry is not allowed')
-
-            # bundled srid always overwrites provided one
-            if bundled_srid is not None and bundled_srid != 4326:
-                srid = bundled_srid
-
-            # hack the geometry
-            hack_geometry(geometry)
-
-            # assign new crs only if geometry don't already have one
-            if not geometry.crs:
-                geometry._the_crs = SpatialReference(srid=srid)
-            return geometry
-
+        # decide input format by peeking the first few bytes
+        geo_format = sniff_geometry_format(geo_input)
+        factory = GEOMETRY_FACTORIES[geo_format]
+
+        tic = time.time()
+        try:
+            geometry, bundled_srid = factory(geo_input, copy=copy)
+        finally:
+            PARSER_STATS.record(geo_format, time.time() - tic)
+
+        if validate == Geometry.VALIDATE_STRICT:
+            validate_geometry(geometry)
+            VALIDATION_STATS.incr('strict')
+        elif validate == Geometry.VALIDATE_LAZY:
+            # geometry already built keeps its validation state
+            if not Geometry.is_geometry(geometry):
+                geometry._validity_pending = True
+                VALIDATION_STATS.incr('deferred')
         else:
-            raise InvalidGeometry('Unrecognized geometry input')
+            assert validate == Geometry.VALIDATE_SKIP
+            VALIDATION_STATS.incr('skipped')
+
+        if empty_check and geometry.is_empty:
+            raise InvalidGeometry('Empty geometry is not allowed')
+
+        # bundled srid always overwrites provided one
+        if bundled_srid is not None and bundled_srid != 4326:
+            srid = bundled_srid
+
+        # hack the geometry
+        hack_geometry(geometry)
+
+        # assign new crs only if geometry don't already have one
+        if not geometry.crs:
+            geometry._the_crs = SpatialReference.make_spatialref(srid=srid)
+        return geometry
+
+    @classmethod
+    def load_wkb(cls, wkb, srid):
+        """Restore a geometry we dumped ourselves from WKB
+
+        Skips format sniffing, validation and empty check of
+        `build_geometry()`, for unpickling.
+        """
+        geometry = shapely.wkb.loads(wkb)
+        hack_geometry(geometry)
+        geometry._the_crs = SpatialReference.make_spatialref(srid=srid)
+        return geometry
 
     @property
     def geojson(self, double_precision=7):
-        geo_obj = geojson.mapping.to_mapping(self)
-        if not self._the_crs or self._the_crs.srid != 4326:
-            geo_obj['crs'] = self._the_crs.geojson
-        return json.dumps(geo_obj,
-                          double_precision=double_precision)
+        return ''.join(self.iter_geojson(double_precision=double_precision))
+
+    def iter_geojson(self, double_precision=7, chunk_size=CHUNK_SIZE,
+                     quantization=None):
+        """Encode as GeoJson, yields string chunks
+
+        Coordinates are quantized and delta encoded if `quantization` is
+        given, see `geojsonio.Quantizer`.
+        """
+        return iter_geometry(self, crs=self._the_crs,
+                             double_precision=double_precision,
+                             chunk_size=chunk_size,
+                             quantization=quantization)
 
     @property
     def ewkt(self):
         return 'SRID=%d;%s' % (self.crs.srid, self.wkt)
 
+    def check_validity(self):
+        """Validate the geometry if its validation is deferred"""
+        if self._validity_pending:
+            validate_geometry(self)
+            self._validity_pending = False
+            VALIDATION_STATS.incr('deferred_checked')
+
     # don't use shapely's _crs
     _the_crs = None
 
+    # set by lazy validation policy
+    _validity_pending = False
+
+    # identifies a stored geometry, (key, revision, srid), used by caches
+    # of derived objects like prepared geometries
+    _cache_key = None
+
+    @property
+    def cache_key(self):
+        return self._cache_key
+
     @property
     def crs(self):
         return self._the_crs
@@ -182,36 +232,114 @@ def hack_geometry(geometry):
     geometry.__class__ = new_type
 
 
+def validate_geometry(geometry):
+    try:
+        if not geometry.is_valid:
+            reason = shapely.validation.explain_validity(geometry)
+            raise InvalidGeometry(
+                'Invalid geometry is not allowed: %s' % reason)
+    except Exception as e:
+        # delayed asShape geometry build causes error only surfaces
+        # when we read the geometry
+        raise InvalidGeometry('Invalid coordinates', e=e)
+
+
+class GeometryValidationStats(object):
+    """Geometry validation counters of each validation policy"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict(strict=0, skipped=0, deferred=0,
+                           deferred_checked=0)
+
+    def incr(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def describe(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+VALIDATION_STATS = GeometryValidationStats()
+
+
 #
-# Magic regular expression
+# Input format sniffing
 #
 
-# NOTE: Not really secure, are we allowing only GeoJSON input from API?
-HEX_REGEX = re.compile(r'^[0-9A-F]+$', re.I)
+WKT_TYPES = ('POINT', 'LINESTRING', 'LINEARRING', 'POLYGON',
+             'MULTIPOINT', 'MULTILINESTRING', 'MULTIPOLYGON',
+             'GEOMETRYCOLLECTION')
+
+HEX_DIGITS = frozenset('0123456789ABCDEFabcdef')
+
+LEADING_SPACE_REGEX = re.compile(r'\s*')
+
+
+def sniff_geometry_format(geo_input):
+    """Decide format of the geometry input without parsing it
+
+    Only the first few non-whitespace bytes are checked, so this is O(1)
+    regardless of input size, actual validation is left to the parser.
+    Returns one of the keys of `GEOMETRY_FACTORIES`.
+    """
+    if isinstance(geo_input, shapely.geometry.base.BaseGeometry):
+        return 'geometry'
+    elif isinstance(geo_input, dict):
+        return 'literal'
+    elif isinstance(geo_input, buffer):
+        return 'wkb'
+    elif not isinstance(geo_input, six.string_types):
+        raise InvalidGeometry('Unrecognized geometry input')
+
+    # WKB starts with a byte order marker
+    if isinstance(geo_input, six.binary_type) and \
+            geo_input[:1] in ('\x00', '\x01'):
+        return 'wkb'
+
+    start = LEADING_SPACE_REGEX.match(geo_input).end()
+    head = geo_input[start:start + 20]
 
-WKT_REGEX = re.compile(r'^(SRID=(?P<SRID>\-?\d+);)?'
-                       r'(?P<WKT>'
-                       r'(?P<TYPE>POINT|LINESTRING|LINEARRING|POLYGON|'
-                       r'MULTIPOINT|MULTILINESTRING|MULTIPOLYGON|'
-                       r'GEOMETRYCOLLECTION)'
-                       r'[ACEGIMLONPSRUTYZ\d,\.\-\(\) ]+)$',
-                       re.I)
-JSON_REGEX = re.compile(r'^(\s+)?\{[\s\w,\[\]\{\}\-\."\':]+\}(\s+)?$')
+    if head.startswith('{'):
+        return 'geojson'
+    # HEXWKB starts with a hex encoded byte order marker
+    elif head[:2] in ('00', '01') and head[2:3] in HEX_DIGITS:
+        return 'hexwkb'
+
+    head = head.upper()
+    if head.startswith('SRID=') or head.startswith(WKT_TYPES):
+        return 'wkt'
+
+    raise InvalidGeometry('Unrecognized geometry input')
+
+
+class GeometryParserStats(object):
+    """Per format geometry parse count and time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict()
+
+    def record(self, geo_format, elapsed):
+        with self._lock:
+            count, total = self._stats.get(geo_format, (0, 0.))
+            self._stats[geo_format] = (count + 1, total + elapsed)
+
+    def describe(self):
+        with self._lock:
+            return dict((k, {'count': count, 'time': total})
+                        for k, (count, total) in six.iteritems(self._stats))
+
+
+PARSER_STATS = GeometryParserStats()
 
 
 #
 # Geometry factory methods for each format, returns a (geometry, srid) tuple
 #
-class NotMyType(RuntimeError):
-    """Exception thrown when factory methods don't recognize the input"""
-    pass
-
 
 def create_geometry_from_geojson(geo_input, copy=False):
-    if not isinstance(geo_input, six.string_types) or \
-            not JSON_REGEX.match(geo_input):
-        raise NotMyType('GeoJson')
-
     try:
         # load json first
         literal = json.loads(geo_input, precise_float=True)
@@ -222,15 +350,15 @@ def create_geometry_from_geojson(geo_input, copy=False):
 
 
 def create_geometry_from_literal(geo_input, copy=False):
-    if not isinstance(geo_input, dict):
-        raise NotMyType
-    if 'type' not in geo_input:
-        raise NotMyType
+    # `copy` is accepted for a uniform factory signature only, coordinates
+    # are never shared with the literal
+    if not isinstance(geo_input, dict) or 'type' not in geo_input:
+        raise InvalidGeometry('Unrecognized geometry input')
 
     try:
-        # geojson validation
-        geojson_geometry = geojson.base.GeoJSON.to_instance(geo_input)
-    except (TypeError, ValueError) as e:
+        # validates geojson structure while building the shapely geometry
+        geometry = read_geometry(geo_input)
+    except ValueError as e:
         raise InvalidGeometry("Invalid GeoJson geometry", e=e)
 
     if 'crs' in geo_input and geo_input['crs']:
@@ -240,96 +368,49 @@ def create_geometry_from_literal(geo_input, copy=False):
         # geojson default crs is wgs84
         srid = 4326
 
-    try:
-        if geojson_geometry['type'] != 'GeometryCollection':
-            # whether to copy geometry coordinates from geojson geometry,
-            # which is slightly slower
-            builder = shapely.geometry.shape if copy else shapely.geometry.asShape
-
-            # create shapely geometry
-            geometry = builder(geojson_geometry)
-
-        else:
-            # painfully create GeometryCollection from geojson object
-            geometry = create_geometrycollection_from_geojson(geojson_geometry)
-
-    except ValueError as e:
-        raise InvalidGeometry(e=e)
-
     # for GeoJson, SRID is always undefined
     return geometry, srid
 
 
-def create_geometrycollection_from_geojson(geometry, buf=None):
-    """shapley don't support create GeometryCollection from python geo
-    interface, only from a GEOS Geometry is available, so we convert the
-    collection object to WKT and load into shapely again.
-    """
-    # XXX: https://github.com/Toblerity/Shapely/issues/115
-    if buf is None:
-        is_top = True
-        buf = io.BytesIO()
-    else:
-        is_top = False
-
-    length = len(geometry.geometries)
-    if length == 0:
-        buf.write('GEOMETRYCOLLECTION EMPTY')
-    else:
-        buf.write('GEOMETRYCOLLECTION (')
-        for n, geom in enumerate(geometry.geometries):
-            if geom['type'] == 'GeometryCollection':
-                create_geometrycollection_from_geojson(geom, buf=buf)
-            else:
-                buf.write(shapely.geometry.asShape(geom).wkt)
-                if n < length - 1:
-                    buf.write(',')
-        buf.write(')')
-    if is_top:
-        wkt = buf.getvalue()
-        return shapely.wkt.loads(wkt)
-
-
-def create_geometry_from_wkt(geo_input, copy):
-    if not isinstance(geo_input, six.string_types):
-        raise NotMyType('WKT')
-    wkt_m = WKT_REGEX.match(geo_input)
-    if not wkt_m:
-        raise NotMyType('WKT')
+def create_geometry_from_wkt(geo_input, copy=False):
+    start = LEADING_SPACE_REGEX.match(geo_input).end()
 
     # try decode bundled geometry srid
-    if wkt_m.group('SRID'):
-        srid = int(wkt_m.group('SRID'))
+    if geo_input[start:start + 5].upper() == 'SRID=':
+        end = geo_input.find(';', start)
+        try:
+            srid = int(geo_input[start + 5:end])
+        except ValueError as e:
+            raise InvalidGeometry('Invalid EWKT srid', e=e)
+        wkt = geo_input[end + 1:]
     else:
         srid = None
-
-    # get wkt
-    wkt = wkt_m.group('WKT')
+        wkt = geo_input
 
     try:
         geometry = shapely.wkt.loads(wkt)
-    except shapely.wkt.geos.ReadingError as e:
+    except ReadingError as e:
         raise InvalidGeometry(e=e)
 
     return geometry, srid
 
 
-def create_geometry_from_wkb(geo_input, copy):
-    if isinstance(geo_input, six.string_types):
-        if HEX_REGEX.match(geo_input):
-            # HEX WKB
-            hex = True
-        else:
-            hex = False
-    elif isinstance(geo_input, buffer):
-        hex = False
+def create_geometry_from_hexwkb(geo_input, copy=False):
+    try:
+        geometry = shapely.wkb.loads(geo_input.strip(), hex=True)
+    except ReadingError as e:
+        raise InvalidGeometry(e=e)
+
+    return geometry, None
+
+
+def create_geometry_from_wkb(geo_input, copy=False):
+    if isinstance(geo_input, buffer):
         geo_input = str(geo_input)
-    else:
-        raise NotMyType('WKB')
 
     try:
-        geometry = shapely.wkb.loads(geo_input, hex=hex)
-    except shapely.wkt.geos.ReadingError as e:
+        geometry = shapely.wkb.loads(geo_input)
+    except ReadingError as e:
         raise InvalidGeometry(e=e)
 
     return geometry, None
@@ -342,11 +423,18 @@ def create_geometry_from_geometry(geo_input, copy=False):
             return geo_input, bundled_srid
         else:
             return shapely.geometry.shape(geo_input), bundled_srid
-    elif isinstance(geo_input, shapely.geometry.base.BaseGeometry):
+    else:
         if not copy:
             return geo_input, None
         else:
             return shapely.geometry.shape(geo_input), None
-    else:
-        raise NotMyType('Shapely Geometry')
 
+
+GEOMETRY_FACTORIES = {
+    'geometry': create_geometry_from_geometry,
+    'literal': create_geometry_from_literal,
+    'geojson': create_geometry_from_geojson,
+    'wkt': create_geometry_from_wkt,
+    'hexwkb': create_geometry_from_hexwkb,
+    'wkb': create_geometry_from_wkb,
+}
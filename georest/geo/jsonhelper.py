@@ -9,6 +9,8 @@ __date__ = '6/12/14'
     Wraps ujson
 """
 
+import collections
+
 import ujson
 
 # ujson doesn't support most kwargs in standard json library
@@ -22,3 +24,42 @@ def dumps(obj, ensure_ascii=False, encode_html_chars=False,
 def loads(s, precise_float=False, **kw):
     return ujson.loads(s, precise_float=precise_float)
 
+
+
+class JsonObject(collections.Mapping):
+    """Read only mapping backed by an encoded json object
+
+    The text is only decoded when the content is accessed, and can be
+    written to the output as is, saves a decode/encode round trip when
+    data is passed through unmodified.
+    """
+
+    __slots__ = ('_text', '_value')
+
+    def __init__(self, text):
+        self._text = text
+        self._value = None
+
+    @property
+    def text(self):
+        return self._text
+
+    def _decode(self):
+        if self._value is None:
+            self._value = loads(self._text, precise_float=True)
+        return self._value
+
+    def __getitem__(self, key):
+        return self._decode()[key]
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __reduce__(self):
+        return JsonObject, (self._text,)
+
+    def __repr__(self):
+        return 'JsonObject(%r)' % self._text
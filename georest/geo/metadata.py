@@ -9,12 +9,14 @@ __date__ = '6/3/14'
     Metadata of a geometry, aka geoindex helpers
 """
 
+import heapq
 import collections
 
 import geohash
 
 import shapely.geometry
 import shapely.geometry.base
+import shapely.prepared
 
 
 class Metadata(collections.namedtuple('Metadata',
@@ -26,25 +28,46 @@ class Metadata(collections.namedtuple('Metadata',
       by its bounding box.  Note geohash only works on geometry with lonlat
       based coordinate reference systems.
     - `bbox` bounding box of the geometry as a list [minx, miny, maxx, maxy]
-    - `cells` a list of integers describes S2CellID of the geometry, currently
-      not implemented.
+    - `cells` a sorted list of integer cell ids covering the geometry, see
+      `calc_cell_union()`.  Like geohash, only works on geometry with lonlat
+      based coordinate reference systems.
     """
 
     GEOHASH_LENGTH = 12
 
+    def __new__(cls, bbox, geohash, cells=None):
+        # cells is missing in metadata created before it's added
+        if cells is None:
+            cells = []
+        return super(Metadata, cls).__new__(cls, bbox, geohash, cells)
+
+    # Cell covering parameters
+    CELL_MIN_LEVEL = 4
+    CELL_MAX_LEVEL = 16
+    CELL_MAX_CELLS = 8
+
     @classmethod
     def make_metadata(cls, geometry=None):
         bbox = calc_bbox(geometry)
 
         geohash = calc_geohash(geometry, Metadata.GEOHASH_LENGTH)
 
-        return cls(bbox, geohash, [])
+        cells = calc_cell_union(geometry,
+                                min_level=Metadata.CELL_MIN_LEVEL,
+                                max_level=Metadata.CELL_MAX_LEVEL,
+                                max_cells=Metadata.CELL_MAX_CELLS)
+
+        return cls(bbox, geohash, cells)
 
     def spawn(self, geometry):
         assert geometry is not None
         bbox = calc_bbox(geometry)
         geohash = calc_geohash(geometry, Metadata.GEOHASH_LENGTH)
-        return self._replace(bbox=bbox, geohash=geohash)
+        cells = calc_cell_union(geometry,
+                                min_level=Metadata.CELL_MIN_LEVEL,
+                                max_level=Metadata.CELL_MAX_LEVEL,
+                                max_cells=Metadata.CELL_MAX_CELLS)
+        return self._replace(bbox=bbox, geohash=geohash, cells=cells)
 
 
 def calc_bbox(geom):
@@ -96,6 +119,163 @@ def calc_geohash(geom, length=7, ignore_crs=False):
                               bounds_precision)
 
 
-def calc_cell_union(geom):
-    # not until we have implemented google.s2 extension
-    raise NotImplementedError
+#
+# Cells
+#
+# A S2 a-like hierarchical cell system, but on the plain lonlat rectangle
+# instead of cube faces and ordered by z-order curve instead of hilbert
+# curve.  A cell at `level` is one of 4^level equal rectangles, identified
+# by a 64bit integer:
+#
+#   [ position on z-order curve: 2*level bits ][ 1 ][ 0: 2*(30-level) bits ]
+#
+# so descendants of a cell always fall in a continuous integer range, see
+# `cell_range()`, which makes cell ids indexable by a b-tree.
+#
+
+CELL_MAX_LEVEL = 30
+
+
+def cell_id(level, i, j):
+    """Cell id of the cell in column `i` and row `j` at `level`"""
+    assert 0 <= level <= CELL_MAX_LEVEL
+    position = 0
+    for bit in range(level):
+        position |= ((i >> bit) & 1) << (2 * bit)
+        position |= ((j >> bit) & 1) << (2 * bit + 1)
+    return ((position << 1) | 1) << (2 * (CELL_MAX_LEVEL - level))
+
+
+def _lowest_bit(cell):
+    return cell & -cell
+
+
+def cell_level(cell):
+    """Level of the cell"""
+    return CELL_MAX_LEVEL - (_lowest_bit(cell).bit_length() - 1) // 2
+
+
+def cell_range(cell):
+    """Range of ids of the cell and all its descendants as (min, max),
+    both inclusive"""
+    lsb = _lowest_bit(cell)
+    return cell - (lsb - 1), cell + (lsb - 1)
+
+
+def cell_children(cell):
+    """Four children of the cell"""
+    lsb = _lowest_bit(cell)
+    assert lsb > 1, 'cell at max level has no children'
+    child_lsb = lsb >> 2
+    return list(cell - lsb + child_lsb * (2 * k + 1) for k in range(4))
+
+
+def cell_parent(cell):
+    """Parent of the cell"""
+    lsb = _lowest_bit(cell)
+    parent_lsb = lsb << 2
+    return (cell & ~(parent_lsb * 2 - 1)) | parent_lsb
+
+
+def cell_bounds(cell):
+    """Bounds of the cell in lonlat as (left, bottom, right, top)"""
+    level = cell_level(cell)
+    position = cell >> (2 * (CELL_MAX_LEVEL - level) + 1)
+    i = j = 0
+    for bit in range(level):
+        i |= ((position >> (2 * bit)) & 1) << bit
+        j |= ((position >> (2 * bit + 1)) & 1) << bit
+    width = 360. / (1 << level)
+    height = 180. / (1 << level)
+    return (-180. + i * width, -90. + j * height,
+            -180. + (i + 1) * width, -90. + (j + 1) * height)
+
+
+def calc_cell_union(geom, min_level=4, max_level=16, max_cells=8,
+                    ignore_crs=False):
+    """Calculate a covering of the geometry as a sorted list of cell ids
+
+    Cells are between `min_level` and `max_level`, and the covering tries to
+    use no more than `max_cells` cells, unless `min_level` requires more.
+    Like `S2RegionCoverer`, coarse cells are subdivided first, cells with
+    less intersecting children are preferred, and cells entirely inside the
+    geometry are never subdivided.
+    """
+    assert isinstance(geom, shapely.geometry.base.BaseGeometry)
+    assert 0 <= min_level <= max_level <= CELL_MAX_LEVEL
+    assert max_cells >= 1
+
+    if geom.is_empty:
+        return []
+
+    # only supports lonlat coordinates
+    if not ignore_crs:
+        crs = geom.crs
+        if crs is None or not crs.proj.is_latlong():
+            return []
+
+    prepared = shapely.prepared.prep(geom)
+    # cells only touching boundary of a polygon are not needed
+    areal = geom.geom_type in ('Polygon', 'MultiPolygon')
+
+    def intersecting_children(cell):
+        children = list()
+        for child in cell_children(cell):
+            box = shapely.geometry.box(*cell_bounds(child))
+            if prepared.intersects(box) and \
+                    not (areal and prepared.touches(box)):
+                children.append((child, prepared.contains(box)))
+        return children
+
+    result = list()
+    # candidate: (level, number of children, cell, children)
+    root = cell_id(0, 0, 0)
+    candidates = [(0, 0, root, intersecting_children(root))]
+    while candidates:
+        level, _, cell, children = heapq.heappop(candidates)
+        if level >= min_level and \
+                len(result) + len(candidates) + len(children) > max_cells:
+            # subdivide would exceed limit
+            result.append(cell)
+            continue
+        for child, contained in children:
+            child_level = level + 1
+            if child_level == max_level or \
+                    (contained and child_level >= min_level):
+                result.append(child)
+            else:
+                grandchildren = intersecting_children(child)
+                heapq.heappush(candidates, (child_level, len(grandchildren),
+                                            child, grandchildren))
+
+    return normalize_cells(result, min_level)
+
+
+def normalize_cells(cells, min_level=0):
+    """Sort cells, remove cells covered by other cells, and replace four
+    siblings by their parent if the parent level is not below `min_level`"""
+    # sort by start of descendant range, larger cells first, so a cell
+    # always comes before cells it contains
+    cells = sorted(set(cells),
+                   key=lambda c: (cell_range(c)[0], cell_level(c)))
+    # remove cells contained by previous cell
+    normalized = list()
+    for cell in cells:
+        if normalized and cell_range(normalized[-1])[1] >= cell:
+            continue
+        normalized.append(cell)
+    # merge siblings
+    merged = True
+    while merged:
+        merged = False
+        result = list()
+        for cell in normalized:
+            result.append(cell)
+            if len(result) >= 4 and cell_level(cell) > min_level:
+                parent = cell_parent(cell)
+                if cell_children(parent) == result[-4:]:
+                    del result[-4:]
+                    result.append(parent)
+                    merged = True
+        normalized = result
+    return normalized
@@ -0,0 +1,252 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+"""
+    georest.geo.offload
+    ~~~~~~~~~~~~~~~~~~~
+    Run heavy geometry operations in worker processes
+
+    Each task leases a dedicated worker process and talks to it through a
+    pipe, geometries are sent as WKB.  A task exceeding its timeout is
+    cancelled by killing its worker, which is then replaced by a new one,
+    other running tasks are not affected.
+"""
+
+import time
+import threading
+import multiprocessing
+
+import shapely.wkb
+import shapely.geometry.base
+
+from . import exceptions
+from .exceptions import GeoException, OperationError, OperationTimeout
+
+
+def count_vertices(geometry):
+    """Number of vertices of the geometry"""
+    geom_type = geometry.geom_type
+    if geometry.is_empty:
+        return 0
+    elif geom_type in ('Point', 'LineString', 'LinearRing'):
+        return len(geometry.coords)
+    elif geom_type == 'Polygon':
+        return len(geometry.exterior.coords) + \
+               sum(len(interior.coords) for interior in geometry.interiors)
+    else:
+        return sum(count_vertices(part) for part in geometry.geoms)
+
+
+def _run_operation(operation, wkbs):
+    """Called in worker process, evaluates operation on geometries"""
+    geometries = list(shapely.wkb.loads(wkb) for wkb in wkbs)
+    result = operation._impl(*geometries)
+    if isinstance(result, shapely.geometry.base.BaseGeometry):
+        return 'geometry', result.wkb
+    else:
+        return 'value', result
+
+
+def _worker_main(conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        operation, wkbs = task
+        try:
+            reply = 'ok', _run_operation(operation, wkbs)
+        except Exception as e:
+            reply = 'error', (e.__class__.__name__, str(e))
+        conn.send(reply)
+    conn.close()
+
+
+class _Worker(object):
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main,
+                                               args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (IOError, EOFError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class OffloadExecutor(object):
+    """Execute operations in worker processes
+
+    Disabled unless configured with a positive number of `processes`.
+    Operations are only offloaded if their inputs have at least
+    `min_vertices` vertices in total, small ones runs inline.  `timeout`
+    is the default timeout in seconds, `timeouts` maps operation class
+    names to timeouts overriding the default one.
+    """
+
+    def __init__(self, processes=0, timeout=30., timeouts=None,
+                 min_vertices=10000):
+        self._lock = threading.Lock()
+        self._processes = processes
+        self._timeout = timeout
+        self._timeouts = timeouts or dict()
+        self._min_vertices = min_vertices
+
+        self._slots = threading.Semaphore(processes)
+        self._idle = list()
+        self._workers = 0
+
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._timedout = 0
+        self._latency = 0.
+
+    def configure(self, processes=None, timeout=None, timeouts=None,
+                  min_vertices=None):
+        """Change executor settings, idle workers are shutdown"""
+        with self._lock:
+            if processes is not None:
+                assert self._running == 0 and self._queued == 0
+                self._processes = processes
+                self._slots = threading.Semaphore(processes)
+            if timeout is not None:
+                self._timeout = timeout
+            if timeouts is not None:
+                self._timeouts = timeouts
+            if min_vertices is not None:
+                self._min_vertices = min_vertices
+            idle, self._idle = self._idle, list()
+            self._workers -= len(idle)
+        for worker in idle:
+            worker.close()
+
+    @property
+    def enabled(self):
+        return self._processes > 0
+
+    def should_offload(self, geometries):
+        if not self.enabled:
+            return False
+        vertices = 0
+        for geometry in geometries:
+            vertices += count_vertices(geometry)
+            if vertices >= self._min_vertices:
+                return True
+        return False
+
+    def execute(self, operation, geometries):
+        """Evaluate `operation._impl()` on geometries in a worker process,
+        returns a shapely geometry or value.
+
+        :raises OperationTimeout: operation takes longer than its timeout
+        """
+        timeout = self._timeouts.get(operation.__class__.__name__,
+                                     self._timeout)
+        wkbs = list(geometry.wkb for geometry in geometries)
+
+        start = time.time()
+        with self._lock:
+            self._queued += 1
+        self._slots.acquire()
+        try:
+            worker = self._lease()
+            try:
+                worker.conn.send((operation, wkbs))
+                # timeout counts from start of execution, not queueing
+                if not worker.conn.poll(timeout):
+                    self._discard(worker)
+                    with self._lock:
+                        self._timedout += 1
+                    raise OperationTimeout(
+                        '%s takes longer than %rs, cancelled' % \
+                        (operation.__class__.__name__, timeout))
+                status, payload = worker.conn.recv()
+            except (IOError, EOFError) as e:
+                # worker died
+                self._discard(worker)
+                with self._lock:
+                    self._failed += 1
+                raise OperationError('Worker process failed', e=e)
+            else:
+                self._release(worker)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._running -= 1
+                self._latency += time.time() - start
+
+        if status == 'error':
+            with self._lock:
+                self._failed += 1
+            name, message = payload
+            error_class = getattr(exceptions, name, None)
+            if isinstance(error_class, type) and \
+                    issubclass(error_class, GeoException):
+                raise error_class(message)
+            raise OperationError(message)
+
+        with self._lock:
+            self._completed += 1
+        kind, value = payload
+        if kind == 'geometry':
+            return shapely.wkb.loads(value)
+        return value
+
+    def _lease(self):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            if self._idle:
+                return self._idle.pop()
+            self._workers += 1
+        try:
+            return _Worker()
+        except Exception:
+            with self._lock:
+                self._workers -= 1
+            raise
+
+    def _release(self, worker):
+        with self._lock:
+            self._idle.append(worker)
+
+    def _discard(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers -= 1
+
+    def describe(self):
+        with self._lock:
+            finished = self._completed + self._failed + self._timedout
+            return {
+                'processes': self._processes,
+                'workers': self._workers,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'timeouts': self._timedout,
+                'mean_latency': self._latency / finished if finished else 0.,
+            }
+
+
+OFFLOAD_EXECUTOR = OffloadExecutor()
@@ -25,11 +25,18 @@ __date__ = '6/12/14'
     twisted, cruel, wild, pythonic metaprogrammingish way to save typing :)
 """
 
+import threading
+
 import six
+import numpy
 import shapely.geometry.base
 import shapely.ops
+import shapely.prepared
 
 from .geometry import Geometry
+from .cache import LRUCache
+from .bulk import BULK_EXECUTOR, chunked
+from .offload import OFFLOAD_EXECUTOR
 from .exceptions import GeoException, OperationError, InvalidParameter
 from .spatialref import CoordinateTransform, SpatialReference
 
@@ -46,7 +53,53 @@ __all__ = ['BaseOperation', 'UnaryOperation', 'Attribute', 'UnaryPredicate',
            'Touches', 'Within',
 
            'Intersection', 'SymmetricDifference', 'Difference', 'Union',
-           'CascadeUnion', ]
+           'CascadeUnion',
+
+           'Pipeline', ]
+
+#
+# Prepared geometry cache
+#
+
+def _sizeof_prepared(entry):
+    # rough estimate, coordinates plus the index GEOS builds on them
+    return 2 * len(entry.prepared.context.wkb)
+
+
+class SharedPreparedGeometry(object):
+    """A cached prepared geometry shared by request threads
+
+    GEOS builds the index of a prepared geometry lazily and is not thread
+    safe, so predicates are evaluated holding the lock of the entry.
+    """
+
+    __slots__ = ('prepared', '_lock')
+
+    def __init__(self, geometry):
+        self.prepared = shapely.prepared.prep(geometry)
+        self._lock = threading.Lock()
+
+    def evaluate(self, predicate, geometry):
+        """Evaluate predicate method of the prepared geometry"""
+        with self._lock:
+            return getattr(self.prepared, predicate)(geometry)
+
+
+# Prepared geometries of stored geometries, keyed by `Geometry.cache_key`
+PREPARED_GEOMETRY_CACHE = LRUCache(max_items=1024,
+                                   max_bytes=64 * 1024 * 1024,
+                                   sizeof=_sizeof_prepared)
+
+
+def get_prepared_geometry(geometry):
+    """Get `SharedPreparedGeometry` of a stored geometry from cache,
+    returns `None` if the geometry can't be cached"""
+    key = geometry.cache_key
+    if key is None:
+        return None
+    return PREPARED_GEOMETRY_CACHE.get_or_create(
+        key, lambda: SharedPreparedGeometry(geometry))
+
 
 #
 # Base classes
@@ -75,19 +128,70 @@ class BaseOperation(object):
         # any left args is assumed to be used by actual operator
         self._kwargs = kwargs
 
+    # Whether the operation is CPU heavy and may run in a worker process
+    HEAVY = False
+
+    # Validation policy of geometry results
+    RESULT_VALIDATION = Geometry.VALIDATE_LAZY
+
+    # Whether the operation supports the array execution path, if so,
+    # `_impl_array()` evaluates the operation on a list of geometries
+    VECTORIZED = False
+
     def __call__(self, *geometries):
+        geometries, result_crs = self._prepare(geometries)
+        result = self._evaluate(self._execute, *geometries)
+        return self._build_result(result, result_crs)
+
+    def map(self, geometries, *args):
+        """Apply the operation on each of the geometries, `args` are extra
+        geometries passed to every invocation, returns a list of results.
+
+        `VECTORIZED` operations are evaluated by `_impl_array()` on chunks
+        of geometries using the bulk executor, otherwise the operation is
+        called on every geometry.
+        """
+        if not self.VECTORIZED:
+            return list(self(geometry, *args) for geometry in geometries)
+
+        these = list()
+        result_crss = list()
+        # extra geometries are validated and transformed once
+        others = self._prepare(args)[0] if args else args
+        for geometry in geometries:
+            (this,), result_crs = self._prepare((geometry,))
+            if args and not self._srid:
+                # can't mix crs with extra geometries either
+                result_crs = self._check_crs((geometry,) + tuple(args))
+            these.append(this)
+            result_crss.append(result_crs)
+
+        operands = self._array_operands(others)
+        results = BULK_EXECUTOR.map(
+            lambda chunk: self._evaluate(self._impl_array, chunk, *operands),
+            these)
+        return list(self._build_result(result, result_crs)
+                    for result, result_crs in zip(results, result_crss))
+
+    def _prepare(self, geometries):
         assert all(Geometry.is_geometry(g) for g in geometries)
 
+        # validate intermediate results before actually using them
+        for geometry in geometries:
+            geometry.check_validity()
+
         if self._srid:
             # need do crs transform before performing operation
             geometries = tuple(self._transform_crs(geometries))
-            result_crs = SpatialReference(self._srid)
+            result_crs = SpatialReference.make_spatialref(self._srid)
         else:
             result_crs = self._check_crs(geometries)
+        return geometries, result_crs
 
+    def _evaluate(self, func, *args):
         # call implementation, catch all exception and raise as 500 error
         try:
-            result = self._impl(*geometries)
+            return func(*args)
         except GeoException as e:
             raise
         except Exception as e:
@@ -96,36 +200,54 @@ class BaseOperation(object):
             else:
                 raise OperationError(e=e)
 
+    def _build_result(self, result, result_crs):
         if isinstance(result, shapely.geometry.base.BaseGeometry):
             assert self.RESULT_TYPE == Geometry
             # update spatial reference
             result = Geometry.build_geometry(result,
                                              srid=result_crs.srid,
-                                             empty_check=False)
-
+                                             empty_check=False,
+                                             validate=self.RESULT_VALIDATION)
         return result
 
+    def _execute(self, *geometries):
+        """Evaluate the operation, by default calls `_impl()`, `HEAVY`
+        operations on large geometries are offloaded to worker processes
+        if the offload executor is enabled"""
+        if self.HEAVY and OFFLOAD_EXECUTOR.should_offload(geometries):
+            return OFFLOAD_EXECUTOR.execute(self, geometries)
+        return self._impl(*geometries)
+
+    def _array_operands(self, others):
+        """Extra operands of `_impl_array()` computed once per `map()`,
+        by default the extra geometries"""
+        return others
+
+    def _impl_array(self, these, *others):
+        """Evaluate the operation on each of `these`, by default calls
+        `_execute()` on every geometry"""
+        return list(self._execute(this, *others) for this in these)
+
     def _transform_crs(self, geometries):
         for geometry in geometries:
             geom_crs = geometry.crs
             if not geom_crs:
                 raise InvalidParameter(
                     'Requires all geometries have CRS defined')
-            result_crs = SpatialReference(self._srid)
             transform = CoordinateTransform.build_transform(geom_crs,
-                                                            result_crs)
+                                                            self._srid)
             yield transform(geometry)
 
     def _check_crs(self, geometries):
         if not any(bool(g.crs) for g in geometries):
             # if all geometries have undefined CRS or unassigned CRS
             # we assume you know what you are doing
-            return SpatialReference(srid=0)
+            return SpatialReference.make_spatialref(srid=0)
         elif len(set(g.crs.srid for g in geometries)) > 1:
             # but in any case you can't mix different CRS
             raise InvalidParameter('Cannot operate on mixed CRS')
         else:
-            return SpatialReference(geometries[0].crs.srid)
+            return SpatialReference.make_spatialref(geometries[0].crs.srid)
 
 
 class UnaryOperation(BaseOperation):
@@ -181,10 +303,39 @@ class BinaryOperation(BaseOperation):
 
 
 class BinaryPredicate(BinaryOperation):
-    """Accepts two geometries and returns bool"""
+    """Accepts two geometries and returns bool
+
+    If either geometry is a stored one, the predicate is evaluated using
+    its cached prepared geometry when possible.
+    """
 
     RESULT_TYPE = bool
 
+    # method of prepared geometry evaluates `this.predicate(other)`
+    PREPARED_PREDICATE = None
+
+    # method of prepared geometry evaluates `other.predicate(this)`
+    PREPARED_CONVERSE = None
+
+    VECTORIZED = True
+
+    def _execute(self, this, other):
+        if self.PREPARED_PREDICATE and this.cache_key is not None:
+            prepared = get_prepared_geometry(this)
+            return prepared.evaluate(self.PREPARED_PREDICATE, other)
+        if self.PREPARED_CONVERSE and other.cache_key is not None:
+            prepared = get_prepared_geometry(other)
+            return prepared.evaluate(self.PREPARED_CONVERSE, this)
+        return self._impl(this, other)
+
+    def _impl_array(self, these, other):
+        if not self.PREPARED_CONVERSE:
+            return list(self._impl(this, other) for this in these)
+        # chunks are evaluated concurrently and prepared geometries are not
+        # thread safe, so every chunk prepares its own
+        method = getattr(shapely.prepared.prep(other), self.PREPARED_CONVERSE)
+        return list(method(this) for this in these)
+
 
 class BinarySetTheoreticMethod(BinaryOperation):
     """Binary set-theoretic methods"""
@@ -196,7 +347,10 @@ class LineReference(BinaryOperation):
 
 
 class MultiGeometryOperation(BaseOperation):
-    pass
+    def reduce(self, geometries):
+        """Apply the operation on an iterable of geometries, by default
+        reads all of them first"""
+        return self(*list(geometries))
 
 
 class ParameterHelper(object):
@@ -306,6 +460,7 @@ class Area(Attribute):
     RESULT_TYPE = float
 
     __doc__ = shapely.geometry.base.BaseGeometry.area.__doc__
+    VECTORIZED = True
 
 
     def _impl(self, this):
@@ -315,6 +470,7 @@ class Area(Attribute):
 class Length(Attribute):
     RESULT_TYPE = float
     __doc__ = shapely.geometry.base.BaseGeometry.length.__doc__
+    VECTORIZED = True
 
 
     def _impl(self, this):
@@ -332,6 +488,8 @@ class IsSimple(UnaryPredicate):
 
 class Buffer(UnaryConstructor, ParameterHelper):
     __doc__ = shapely.geometry.base.BaseGeometry.buffer.__doc__
+    HEAVY = True
+    VECTORIZED = True
 
     def __init__(self, distance=0.01, resolution=16,
                  cap_style='round', join_style='round',
@@ -364,6 +522,7 @@ class Buffer(UnaryConstructor, ParameterHelper):
 
 class ConvexHull(UnaryConstructor):
     __doc__ = shapely.geometry.base.BaseGeometry.convex_hull.__doc__
+    VECTORIZED = True
 
     def _impl(self, this):
         return this.convex_hull
@@ -371,6 +530,7 @@ class ConvexHull(UnaryConstructor):
 
 class Envelope(UnaryConstructor):
     __doc__ = shapely.geometry.base.BaseGeometry.envelope.__doc__
+    VECTORIZED = True
 
     def _impl(self, this):
         return this.envelope
@@ -378,6 +538,7 @@ class Envelope(UnaryConstructor):
 
 class ParallelOffset(UnaryConstructor, ParameterHelper):
     __doc__ = shapely.geometry.LineString.parallel_offset.__doc__
+    HEAVY = True
 
 
     def __init__(self, distance=0.01, side='left', resolution=16,
@@ -409,6 +570,8 @@ class ParallelOffset(UnaryConstructor, ParameterHelper):
 
 class Simplify(UnaryConstructor, ParameterHelper):
     __doc__ = shapely.geometry.base.BaseGeometry.simplify.__doc__
+    HEAVY = True
+    VECTORIZED = True
 
     def __init__(self, tolerance=0.01, preserve_topology=False, **kwargs):
         ParameterHelper.__init__(self, ['tolerance', 'preserve_topology'])
@@ -435,6 +598,7 @@ class Boundary(UnarySetTheoreticMethod, ParameterHelper):
 
 class Centroid(UnarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.centroid.__doc__
+    VECTORIZED = True
 
     def _impl(self, this):
         return this.centroid
@@ -442,6 +606,7 @@ class Centroid(UnarySetTheoreticMethod):
 
 class PointOnSurface(UnarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.representative_point.__doc__
+    VECTORIZED = True
 
     def _impl(self, this):
         return this.representative_point()
@@ -449,6 +614,7 @@ class PointOnSurface(UnarySetTheoreticMethod):
 
 class Distance(BinaryOperation):
     __doc__ = shapely.geometry.base.BaseGeometry.distance.__doc__
+    VECTORIZED = True
     RESULT_TYPE = float
 
     def _impl(self, this, other):
@@ -473,6 +639,8 @@ class Equals(BinaryPredicate, ParameterHelper):
 
 class Contains(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.contains.__doc__
+    PREPARED_PREDICATE = 'contains'
+    PREPARED_CONVERSE = 'within'
 
     def _impl(self, this, other):
         return this.contains(other)
@@ -480,6 +648,7 @@ class Contains(BinaryPredicate):
 
 class Crosses(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.crosses.__doc__
+    PREPARED_PREDICATE = 'crosses'
 
     def _impl(self, this, other):
         return this.crosses(other)
@@ -487,6 +656,8 @@ class Crosses(BinaryPredicate):
 
 class Disjoint(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.disjoint.__doc__
+    PREPARED_PREDICATE = 'disjoint'
+    PREPARED_CONVERSE = 'disjoint'
 
     def _impl(self, this, other):
         return this.disjoint(other)
@@ -494,6 +665,8 @@ class Disjoint(BinaryPredicate):
 
 class Intersects(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.intersects.__doc__
+    PREPARED_PREDICATE = 'intersects'
+    PREPARED_CONVERSE = 'intersects'
 
     def _impl(self, this, other):
         return this.intersects(other)
@@ -501,6 +674,8 @@ class Intersects(BinaryPredicate):
 
 class Touches(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.touches.__doc__
+    PREPARED_PREDICATE = 'touches'
+    PREPARED_CONVERSE = 'touches'
 
     def _impl(self, this, other):
         return this.touches(other)
@@ -508,6 +683,8 @@ class Touches(BinaryPredicate):
 
 class Within(BinaryPredicate):
     __doc__ = shapely.geometry.base.BaseGeometry.within.__doc__
+    PREPARED_PREDICATE = 'within'
+    PREPARED_CONVERSE = 'contains'
 
     def _impl(self, this, other):
         return this.within(other)
@@ -515,6 +692,7 @@ class Within(BinaryPredicate):
 
 class Intersection(BinarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.intersection.__doc__
+    HEAVY = True
 
     def _impl(self, this, other):
         return this.intersection(other)
@@ -522,6 +700,7 @@ class Intersection(BinarySetTheoreticMethod):
 
 class Difference(BinarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.difference.__doc__
+    HEAVY = True
 
 
     def _impl(self, this, other):
@@ -530,6 +709,7 @@ class Difference(BinarySetTheoreticMethod):
 
 class SymmetricDifference(BinarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.symmetric_difference.__doc__
+    HEAVY = True
 
     def _impl(self, this, other):
         return this.symmetric_difference(other)
@@ -537,6 +717,7 @@ class SymmetricDifference(BinarySetTheoreticMethod):
 
 class Union(BinarySetTheoreticMethod):
     __doc__ = shapely.geometry.base.BaseGeometry.union.__doc__
+    HEAVY = True
 
     def _impl(self, this, other):
         return this.union(other)
@@ -544,8 +725,138 @@ class Union(BinarySetTheoreticMethod):
 
 class CascadeUnion(MultiGeometryOperation):
     __doc__ = shapely.ops.unary_union.__doc__
+    HEAVY = True
+
+    # Large inputs are split into spatially close partitions of this size,
+    # which are unioned in parallel, then partial results are merged
+    # `MERGE_FANOUT` at a time until there is only one left
+    PARTITION_SIZE = 256
+    MERGE_FANOUT = 8
+
+    def _execute(self, *geometries):
+        if len(geometries) <= self.PARTITION_SIZE:
+            return self._union(geometries)
+
+        partitions = partition_geometries(geometries, self.PARTITION_SIZE)
+        partials = BULK_EXECUTOR.apply_each(self._union, partitions)
+        while len(partials) > 1:
+            groups = list(chunked(partials, self.MERGE_FANOUT))
+            partials = BULK_EXECUTOR.apply_each(self._union, groups)
+        return partials[0]
+
+    def reduce(self, geometries):
+        """Union a stream of geometries with bounded memory
+
+        Geometries are read `PARTITION_SIZE` at a time and each group is
+        unioned as it fills, partial unions are merged `MERGE_FANOUT` at a
+        time as soon as there are enough of the same level, so only one
+        group plus a few partial unions per level are kept in memory.
+        Unlike `__call__()`, groups are in input order instead of spatially
+        partitioned.
+        """
+        levels = list()  # partial unions merged i times
+        result_crs = None
+        for group in chunked(geometries, self.PARTITION_SIZE):
+            group, group_crs = self._prepare(tuple(group))
+            if result_crs is None:
+                result_crs = group_crs
+            elif group_crs.srid != result_crs.srid:
+                raise InvalidParameter('Cannot operate on mixed CRS')
+            partial = self._evaluate(self._union, group)
+            del group
+
+            level = 0
+            while True:
+                if level == len(levels):
+                    levels.append(list())
+                levels[level].append(partial)
+                if len(levels[level]) < self.MERGE_FANOUT:
+                    break
+                partial = self._evaluate(self._union, levels[level])
+                levels[level] = list()
+                level += 1
+
+        if result_crs is None:
+            raise InvalidParameter('Requires at least one geometry')
+
+        partials = list(p for level in levels for p in level)
+        while len(partials) > 1:
+            partials = list(self._evaluate(self._union, group) for group in
+                            chunked(partials, self.MERGE_FANOUT))
+        return self._build_result(partials[0], result_crs)
+
+    def _union(self, geometries):
+        # runs in worker process if the geometries are large enough
+        return BaseOperation._execute(self, *geometries)
 
     def _impl(self, *geometries):
         return shapely.ops.unary_union(geometries)
 
 
+def partition_geometries(geometries, size):
+    """Split geometries into lists of `size` geometries, geometries in a
+    list are close to each other, ordered by z-order curve of their bounding
+    box centers."""
+    bounds = numpy.array(list(g.bounds if not g.is_empty else (0, 0, 0, 0)
+                              for g in geometries), dtype=numpy.float64)
+    x = (bounds[:, 0] + bounds[:, 2]) / 2.
+    y = (bounds[:, 1] + bounds[:, 3]) / 2.
+    keys = _interleave(_quantize(x), _quantize(y))
+    order = numpy.argsort(keys, kind='mergesort')
+    return list(list(geometries[i] for i in order[start:start + size])
+                for start in range(0, len(geometries), size))
+
+
+def _quantize(values, bits=16):
+    low, high = values.min(), values.max()
+    scale = (2 ** bits - 1) / (high - low) if high > low else 0.
+    return ((values - low) * scale).astype(numpy.uint64)
+
+
+def _interleave(x, y):
+    # morton code of 16bit integers, spreads bits of x to even positions
+    # and y to odd positions
+    def spread(v):
+        v = (v | (v << 8)) & 0x00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+        return v
+    return spread(x) | (spread(y) << 1)
+
+
+#
+# Pipeline
+#
+
+class Pipeline(object):
+    """Chain of operations, the result of an operation is the input of the
+    next one, only the first operation may accept more than one geometry.
+
+    Intermediate results are geometries computed by GEOS and are passed to
+    the next operation without validation.  Only the first operation should
+    be created with `srid`, so geometries are transformed at most once.
+    """
+
+    def __init__(self, operations):
+        assert operations
+        for operation in operations[:-1]:
+            if operation.RESULT_TYPE is not Geometry:
+                raise InvalidParameter(
+                    '%s does not return a geometry, must be the last '
+                    'operation of a pipeline' % operation.__class__.__name__)
+            operation.RESULT_VALIDATION = Geometry.VALIDATE_SKIP
+        for operation in operations[1:]:
+            if not isinstance(operation, UnaryOperation):
+                raise InvalidParameter(
+                    '%s is not an unary operation, can only be the first '
+                    'operation of a pipeline' % operation.__class__.__name__)
+        self._operations = operations
+        self.RESULT_TYPE = operations[-1].RESULT_TYPE
+
+    def __call__(self, *geometries):
+        first = self._operations[0]
+        result = first(*geometries)
+        for operation in self._operations[1:]:
+            result = operation(result)
+        return result
@@ -12,10 +12,13 @@ __date__ = '6/5/14'
 
 import functools
 import re
+import threading
 
+import numpy
 import pyproj
-import shapely.ops
+import shapely.geometry
 import shapely.geometry.base
+import shapely.wkt
 
 from .exceptions import InvalidSpatialReference, CoordinateTransformationError
 
@@ -25,6 +28,11 @@ class SpatialReference(object):
 
     In case we replace pyproj to use osgeo.osr.SpatialReference, but not
     simulating osgeo.osr.SpatialReference's mighty interface here....
+
+    Creating a `pyproj.Proj` parses the EPSG database, so use
+    `make_spatialref()` to get a shared instance from the registry instead
+    of calling the constructor directly.  A `SpatialReference` is treated as
+    immutable once created.
     """
 
     def __init__(self, srid=0):
@@ -57,6 +65,11 @@ class SpatialReference(object):
                         'name': 'EPSG:%d' % self._srid
                     }}
 
+    @classmethod
+    def make_spatialref(cls, srid=0):
+        """Get the interned spatial reference of given srid"""
+        return SPATIAL_REFERENCE_REGISTRY.get(srid)
+
     @classmethod
     def build_from_geojson_crs(cls, crs):
         if crs is None:
@@ -77,7 +90,7 @@ class SpatialReference(object):
 
         if match:
             srid = int(match.group('srid'))
-            return cls(srid=srid)
+            return cls.make_spatialref(srid=srid)
         else:
             raise InvalidSpatialReference('Only supports EPSG:SRID')
 
@@ -91,17 +104,82 @@ class SpatialReference(object):
         # valid CRS only when srid!=0
         return bool(self._srid)
 
-    def __getstate__(self):
-        return self._srid
+    def __reduce__(self):
+        # unpickled as the shared instance from the registry
+        return _restore_spatialref, (self._srid,)
 
     def __setstate__(self, state):
+        # pickles before __reduce__ was added carries srid as state
         srid = state
         self._srid = srid
-        self._proj = self._make_proj(srid)
+        # borrow the proj from registry instead of parsing EPSG database again
+        self._proj = SpatialReference.make_spatialref(srid).proj
+
+
+def _restore_spatialref(srid):
+    return SpatialReference.make_spatialref(srid)
+
+
+class SpatialReferenceRegistry(object):
+    """Process wide, thread safe registry of `SpatialReference` objects
+    keyed by srid."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._registry = dict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, srid):
+        assert isinstance(srid, int)
+        with self._lock:
+            try:
+                crs = self._registry[srid]
+            except KeyError:
+                self._misses += 1
+            else:
+                self._hits += 1
+                return crs
+
+        # create outside the lock since its slow, invalid srid is not cached
+        crs = SpatialReference(srid)
+        with self._lock:
+            return self._registry.setdefault(srid, crs)
+
+    def preload(self, srids):
+        for srid in srids:
+            if srid not in self._registry:
+                self.get(srid)
+
+    def describe(self):
+        with self._lock:
+            return {
+                'size': len(self._registry),
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+
+SPATIAL_REFERENCE_REGISTRY = SpatialReferenceRegistry()
+
+# Commonly used srids, overwrite using `PRELOAD_SRIDS` setting
+PRELOAD_SRIDS = [4326, 3857]
+
+
+def preload_spatialrefs(srids=None):
+    """Populate the spatial reference registry"""
+    if srids is None:
+        srids = PRELOAD_SRIDS
+    SPATIAL_REFERENCE_REGISTRY.preload(srids)
 
 
 class CoordinateTransform(object):
-    """ A coordinate transformation functor"""
+    """ A coordinate transformation functor
+
+    All coordinates of the geometry are projected in one `pyproj.transform`
+    call using numpy arrays, instead of calling back into python for every
+    coordinate sequence like `shapely.ops.transform`.
+    """
 
     def __init__(self, crs1, crs2):
         assert isinstance(crs1, SpatialReference)
@@ -118,30 +196,120 @@ class CoordinateTransform(object):
             # violates behavior of transform, but saves a copy
             return geometry
 
-        if geometry.geom_type == 'GeometryCollection':
-            # XXX shapely don't support transform GeometryCollection
-            raise CoordinateTransformationError(
-                message='GeometryCollection is not supported')
-        try:
-            result = shapely.ops.transform(self._projection, geometry)
-            # shapely transform uses type() so the result is already an
-            # instance of `geo.Geometry`, but crs is left unassigned
-            result._the_crs = self._crs2
-        except RuntimeError as e:
-            raise CoordinateTransformationError(e=e)
+        if geometry.is_empty:
+            # a new empty geometry so the result is tagged with target crs
+            result = shapely.wkt.loads(geometry.wkt)
+        else:
+            result = self._transform(geometry)
 
+        # make result an instance of `geo.Geometry`, imported here to
+        # avoid circular import
+        from .geometry import hack_geometry
+        hack_geometry(result)
+        result._the_crs = self._crs2
         return result
 
+    def _transform(self, geometry):
+        try:
+            arrays = list()
+            collect_coordinates(geometry, arrays)
+            widths = list(a.shape[1] for a in arrays)
+            if len(set(widths)) > 1:
+                # collection mixing 2D and 3D members, pad 2D ones with z=0
+                arrays = list(a if a.shape[1] == 3 else
+                              numpy.column_stack([a, numpy.zeros(len(a))])
+                              for a in arrays)
+            coords = numpy.concatenate(arrays)
+
+            # project all coordinates in a single call
+            if coords.shape[1] > 2:
+                x, y, z = self._projection(coords[:, 0], coords[:, 1],
+                                           coords[:, 2])
+                coords = numpy.column_stack([x, y, z])
+            else:
+                x, y = self._projection(coords[:, 0], coords[:, 1])
+                coords = numpy.column_stack([x, y])
+
+            # split projected coordinates back to the original components
+            offsets = numpy.cumsum(list(len(a) for a in arrays))[:-1]
+            parts = list(part[:, :width] for part, width in
+                         zip(numpy.split(coords, offsets), widths))
+            return rebuild_geometry(geometry, iter(parts))
+        except (RuntimeError, ValueError) as e:
+            raise CoordinateTransformationError(e=e)
 
     @classmethod
     def build_transform(cls, before, after):
         if isinstance(before, int):
-            crs1 = SpatialReference(srid=before)
+            crs1 = SpatialReference.make_spatialref(srid=before)
         else:
             crs1 = before
         if isinstance(after, int):
-            crs2 = SpatialReference(after)
+            crs2 = SpatialReference.make_spatialref(after)
         else:
             crs2 = after
 
-        return cls(crs1, crs2)
\ No newline at end of file
+        return COORDINATE_TRANSFORM_CACHE.get(crs1, crs2)
+
+
+class CoordinateTransformCache(object):
+    """Reusable `CoordinateTransform` objects keyed by (srid1, srid2)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = dict()
+
+    def get(self, crs1, crs2):
+        key = (crs1.srid, crs2.srid)
+        with self._lock:
+            try:
+                return self._cache[key]
+            except KeyError:
+                transform = CoordinateTransform(crs1, crs2)
+                self._cache[key] = transform
+                return transform
+
+    def describe(self):
+        with self._lock:
+            return {'size': len(self._cache)}
+
+
+COORDINATE_TRANSFORM_CACHE = CoordinateTransformCache()
+
+
+def collect_coordinates(geometry, arrays):
+    """Append coordinate arrays of all components of the geometry to
+    `arrays`, in the same order `rebuild_geometry()` consumes them."""
+    geom_type = geometry.geom_type
+    if geom_type in ('Point', 'LineString', 'LinearRing'):
+        arrays.append(numpy.asarray(geometry.coords, dtype=numpy.float64))
+    elif geom_type == 'Polygon':
+        collect_coordinates(geometry.exterior, arrays)
+        for interior in geometry.interiors:
+            collect_coordinates(interior, arrays)
+    else:
+        # multi geometries and GeometryCollection
+        for part in geometry.geoms:
+            if not part.is_empty:
+                collect_coordinates(part, arrays)
+
+
+def rebuild_geometry(geometry, arrays):
+    """Create a new geometry of the same structure from an iterator of
+    coordinate arrays"""
+    geom_type = geometry.geom_type
+    if geom_type == 'Point':
+        return shapely.geometry.Point(next(arrays)[0])
+    elif geom_type == 'LineString':
+        return shapely.geometry.LineString(next(arrays))
+    elif geom_type == 'LinearRing':
+        return shapely.geometry.LinearRing(next(arrays))
+    elif geom_type == 'Polygon':
+        shell = next(arrays)
+        holes = list(next(arrays) for _ in geometry.interiors)
+        return shapely.geometry.Polygon(shell, holes)
+    else:
+        parts = list(rebuild_geometry(part, arrays)
+                     for part in geometry.geoms if not part.is_empty)
+        factory = getattr(shapely.geometry, geom_type)
+        return factory(parts)
@@ -20,5 +20,6 @@ __author__ = 'pp'
 """
 
 from .feature import FeaturesModel, GeometryModel, FeaturePropertiesModel
-from .operations import OperationsModel, AttributesModel
+from .operations import OperationsModel, AttributesModel, \
+    OperationResultCache
 from .exceptions import ModelException
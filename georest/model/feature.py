@@ -10,10 +10,12 @@ __author__ = 'pp'
 """
 
 
+import itertools
 from datetime import datetime
 
 from .. import geo
 from ..geo import jsonhelper as json
+from ..geo.geojsonio import iter_feature_collection, iter_feature_lines
 from .. import storage
 from . import exceptions
 
@@ -59,6 +61,14 @@ class BaseFeatureModel(object):
         """
         raise NotImplementedError
 
+    def iter_json(self, obj, **kwargs):
+        """to string representation in chunks, for streaming response
+
+        :returns: iterator of string chunks
+        :raises ModelInvalidData: invalid obj
+        """
+        yield self.as_json(obj, **kwargs)
+
     def create(self, obj, bucket=None):
         """create an obj in storage without giving the key
 
@@ -121,9 +131,14 @@ class FeaturesModel(BaseFeatureModel):
     def from_json(self, s, **kwargs):
         return geo.Feature.build_from_geojson(s)
 
-    def as_json(self, obj, **kwargs):  # XXX: flat precision
+    def as_json(self, obj, quantization=None, **kwargs):  # XXX: flat precision
+        if quantization:
+            return ''.join(obj.iter_geojson(quantization=quantization))
         return obj.geojson
 
+    def iter_json(self, obj, quantization=None, **kwargs):
+        return obj.iter_geojson(quantization=quantization)
+
     def create(self, obj, bucket=None):
         key = geo.Key.make_key(bucket=bucket)
         visitor = self._get_visitor(key)
@@ -153,19 +168,185 @@ class FeaturesModel(BaseFeatureModel):
         metadata = _result2metadata(r)
         return metadata
 
+    def query_bbox(self, bbox, bucket=None, limit=None, cursor=None):
+        """query features in the bucket whose bbox overlaps given bbox
+
+        :param bbox: (minx, miny, maxx, maxy)
+        :param limit: page size
+        :param cursor: key of the last feature of previous page
+        :returns: features, cursor of next page (None if no more pages)
+        """
+        return self._query('query_bbox', bbox,
+                           bucket=bucket, limit=limit, cursor=cursor)
+
+    def query_geohash(self, prefix, bucket=None, limit=None, cursor=None):
+        """query features in the bucket whose geohash starts with prefix,
+        see `query_bbox()`"""
+        return self._query('query_geohash', prefix,
+                           bucket=bucket, limit=limit, cursor=cursor)
+
+    def query_distance(self, geometry, distance, bucket=None, limit=None,
+                       cursor=None):
+        """query features in the bucket within distance of the geometry,
+        see `query_bbox()`
+
+        :param distance: in units of the geometry's crs
+        """
+        return self._query('query_distance', geometry, distance,
+                           bucket=bucket, limit=limit, cursor=cursor)
+
+    def _query(self, method, *args, **kwargs):
+        bucket = kwargs.pop('bucket', None)
+        limit = kwargs.pop('limit', None)
+        cursor = kwargs.pop('cursor', None)
+
+        key = geo.Key.make_key(bucket=bucket)
+        if cursor is not None:
+            cursor = geo.Key.build_from_qualified_name(cursor)
+            if cursor.bucket != key.bucket:
+                raise geo.exceptions.InvalidKey(
+                    'cursor %s is not in bucket %s' % (cursor.qualified_name,
+                                                       key.bucket))
+        visitor = self._get_visitor(key)
+        result = getattr(visitor, method)(*args, limit=limit, cursor=cursor)
+        features = list(feature for r, feature in result)
+        if limit is not None and len(features) == limit:
+            next_cursor = features[-1].key.qualified_name
+        else:
+            next_cursor = None
+        return features, next_cursor
+
+    def iter_collection_json(self, features, cursor=None):
+        """feature collection representation in chunks"""
+        return iter_feature_collection(features, members=dict(cursor=cursor))
+
+    def export_features(self, bucket=None, ndjson=False, cursor=None):
+        """all features of the bucket ordered by key, as a feature
+        collection or newline delimited GeoJson in chunks
+
+        Features are read from storage as the chunks are iterated.
+
+        :param cursor: only features after this key
+        :raises BucketNotFound: no such bucket
+        """
+        key = geo.Key.make_key(bucket=bucket)
+        if cursor is not None:
+            cursor = geo.Key.build_from_qualified_name(cursor)
+        # export never creates a bucket
+        visitor = storage.FeatureEntry(
+            self.feature_storage.get_bucket(key.bucket))
+        # check the query is supported before the response is started
+        features = _peek(feature for r, feature in
+                         visitor.iter_features(cursor=cursor))
+        if ndjson:
+            return iter_feature_lines(features)
+        return iter_feature_collection(features)
+
+    def import_features(self, texts, bucket=None, batch_size=1000):
+        """create features from GeoJson feature texts
+
+        Features of a batch are built and validated concurrently, then
+        stored in one transaction if the storage supports it.  Invalid
+        features are skipped, the rest of the batch is still stored.
+
+        :param texts: iterable of GeoJson feature texts
+        :param batch_size: number of features of a batch
+        :returns: iterator of results in order of texts, a result is a dict
+                  of index and code, plus key and etag if created, or
+                  exception and message if failed.  A failure of input
+                  structure ends the iterator with a result without index.
+        """
+        # check the bucket before results are iterated
+        key = geo.Key.make_key(bucket=bucket)
+        visitor = self._get_visitor(key)
+        return self._import_features(visitor, key, texts, batch_size)
+
+    def _import_features(self, visitor, key, texts, batch_size):
+        index = 0
+        try:
+            for batch in geo.bulk.chunked(texts, batch_size):
+                built = geo.bulk.BULK_EXECUTOR.map(_build_features, batch)
+                results = dict((index + n, _error_result(index + n, e))
+                               for n, e in enumerate(built)
+                               if isinstance(e, geo.GeoException))
+                created = list((index + n, feature)
+                               for n, feature in enumerate(built)
+                               if isinstance(feature, geo.Feature))
+                try:
+                    responses = visitor.put_features(
+                        (key, feature) for n, feature in created)
+                except storage.StorageError as e:
+                    results.update((n, _error_result(n, e))
+                                   for n, feature in created)
+                else:
+                    for (n, feature), r in zip(created, responses):
+                        result = dict(index=n, code=201,
+                                      key=r.key.qualified_name)
+                        if r.revision is not None:
+                            result['etag'] = r.revision
+                        results[n] = result
+                for n in range(index, index + len(batch)):
+                    yield results[n]
+                index += len(batch)
+        except geo.GeoException as e:
+            yield _error_result(None, e)
+
+
+def _peek(iterator):
+    """advance iterator to its first item so errors are raised now, returns
+    an equivalent iterator"""
+    iterator = iter(iterator)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter([])
+    return itertools.chain([first], iterator)
+
+
+def _build_features(texts):
+    """build features from a chunk of texts, returns features or
+    exceptions of invalid ones"""
+    result = list()
+    for text in texts:
+        try:
+            result.append(geo.Feature.build_from_geojson(text))
+        except geo.GeoException as e:
+            result.append(e)
+        except Exception as e:
+            # eg: geohash of out of range coordinates, must not end the
+            # import of the rest
+            result.append(geo.exceptions.InvalidFeature(e=e))
+    return result
+
+
+def _error_result(index, e):
+    result = dict(code=getattr(e, 'HTTP_STATUS_CODE', 500),
+                  exception=e.__class__.__name__,
+                  message=str(e))
+    if index is not None:
+        result['index'] = index
+    return result
+
 
 class GeometryModel(BaseFeatureModel):
     def from_json(self, s, **kwargs):
-        return geo.Geometry.build_geometry(s)
+        return geo.Geometry.build_geometry(
+            s, validate=geo.Geometry.VALIDATE_STRICT)
 
-    def as_json(self, obj, **kwargs):
+    def as_json(self, obj, quantization=None, **kwargs):
+        if quantization:
+            return ''.join(obj.iter_geojson(quantization=quantization))
         return obj.geojson
 
+    def iter_json(self, obj, quantization=None, **kwargs):
+        return obj.iter_geojson(quantization=quantization)
+
     def create(self, obj, bucket=None):
         key = geo.Key.make_key(bucket=bucket)
 
-        # new object
-        feature = geo.Feature.build_from_geometry(obj)
+        # new object, geometry is already validated by from_json()
+        feature = geo.Feature.build_from_geometry(
+            obj, validate=geo.Geometry.VALIDATE_SKIP)
 
         # store
         visitor = self._get_visitor(key)
@@ -183,6 +364,13 @@ class GeometryModel(BaseFeatureModel):
             # geometry srid conversion
             # XXX: maybe add a function for this.
             geometry = geo.UnaryOperation(srid=srid)(geometry)
+        # identifies this version of stored geometry for operation caches,
+        # storage without revision nor timestamp (memcache) can't tell
+        # versions apart, such geometries are not cached by key
+        version = r.revision if r.revision is not None else r.timestamp
+        if version is not None:
+            geometry._cache_key = (r.key.qualified_name, version,
+                                   geometry.crs.srid)
         metadata = _result2metadata(r)
         return geometry, metadata
 
@@ -195,7 +383,8 @@ class GeometryModel(BaseFeatureModel):
         except storage.FeatureNotFound:
 
             # create new feature from scratch
-            feature = geo.Feature.build_from_geometry(obj)
+            feature = geo.Feature.build_from_geometry(
+                obj, validate=geo.Geometry.VALIDATE_SKIP)
         else:
             if etag and r1.revision != etag:
                 raise exceptions.KeyExists('given etag %s is stale' % etag)
@@ -214,6 +403,9 @@ class FeaturePropertiesModel(BaseFeatureModel):
         return json.loads(s)
 
     def as_json(self, obj, **kwargs):
+        if isinstance(obj, json.JsonObject):
+            # not modified since read from storage
+            return obj.text
         return json.dumps(obj, double_precision=7)
 
     # No direct create for properties
@@ -224,7 +416,7 @@ class FeaturePropertiesModel(BaseFeatureModel):
         visitor = self._get_visitor(key)
         r, feature = visitor.get_feature(key)
         metadata = _result2metadata(r)
-        return feature.properties, metadata
+        return feature.read_properties(), metadata
 
     def put(self, obj, key, etag=None):
         key = geo.Key.build_from_qualified_name(key)
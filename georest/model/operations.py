@@ -9,13 +9,22 @@ __date__ = '6/19/14'
     thin operation wrapper/mapper for georest.geo.operations
 """
 
-from collections import namedtuple
+import hashlib
+import itertools
+import threading
+from collections import namedtuple, defaultdict
+
 from .. import geo
 from ..geo import operations as ops
 from ..geo import jsonhelper as json
+from ..geo.bulk import chunked
+from ..geo.cache import LRUCache
 from .exceptions import NoSuchOperation, BadInvoke
 
 
+# Number of geometries handed to the operator at once by batch invocation
+BATCH_SIZE = 4096
+
 OPERATION_MAPPING = dict(
     area=ops.Area,
     length=ops.Length,
@@ -40,6 +49,7 @@ OPERATION_MAPPING = dict(
     difference=ops.Difference,
     symmetric_difference=ops.SymmetricDifference,
     union=ops.Union,
+    cascade_union=ops.CascadeUnion,
 )
 
 ATTRIBUTE_MAPPING = dict((k, v) for k, v in OPERATION_MAPPING.items() if
@@ -68,6 +78,118 @@ class OperationResult(namedtuple('OperationResult', ['value', 'is_pod'])):
         else:
             return self.value.geojson
 
+    def value_json(self):
+        """json representation of the bare result value"""
+        if self.is_pod:
+            return json.dumps(self.value)
+        else:
+            return self.value.geojson
+
+
+def _sizeof_result(result):
+    # rough estimate of memory used by the result
+    if result.is_pod:
+        return 64
+    else:
+        return 64 + len(result.value.wkb)
+
+
+class OperationResultCache(object):
+    """cache of operation results
+
+    Results are keyed by operation name, normalized operation arguments and
+    the inputs, stored geometries are identified by their key and revision,
+    literal geometries (and stored ones without a revision) by a hash of
+    their wkb.  Results of a stored feature
+    are dropped as soon as a result of a newer revision of it is stored.
+    """
+    def __init__(self, max_items=1024, max_bytes=None):
+        self._lock = threading.Lock()
+        # feature name -> last seen revision
+        self._revisions = dict()
+        # feature name -> keys of cached results using the feature
+        self._entries = defaultdict(set)
+        self._invalidations = 0
+        self._cache = LRUCache(max_items=max_items,
+                               max_bytes=max_bytes,
+                               sizeof=_sizeof_result,
+                               on_evict=self._forget)
+
+    def make_key(self, op_name, operator, geometries):
+        """key of the result, `operator` is the created operation whose
+        arguments are already converted and validated"""
+        inputs = []
+        for geometry in geometries:
+            # without a revision updates of a stored geometry can't be
+            # told apart, identify it by content like literal geometries
+            if geometry.cache_key is not None and \
+                    geometry.cache_key[1] is not None:
+                inputs.append(geometry.cache_key)
+            else:
+                digest = hashlib.sha1(geometry.wkb).hexdigest()
+                srid = geometry.crs.srid if geometry.crs else None
+                inputs.append((None, digest, srid))
+        kwargs = tuple(sorted(operator._kwargs.items()))
+        return op_name, operator._srid, kwargs, tuple(inputs)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def put(self, key, result):
+        inputs = key[3]
+        stale = set()
+        with self._lock:
+            for name, revision, _ in inputs:
+                if name is None:
+                    continue
+                last_revision = self._revisions.get(name)
+                if last_revision is not None and last_revision != revision:
+                    stale.update(self._drop(name))
+                self._revisions[name] = revision
+                self._entries[name].add(key)
+        for stale_key in stale:
+            self._cache.pop(stale_key)
+        self._cache.put(key, result)
+
+    def invalidate(self, name):
+        """drop all results computed from the feature"""
+        with self._lock:
+            keys = self._drop(name)
+        for key in keys:
+            self._cache.pop(key)
+
+    def _drop(self, name):
+        # forget the feature and results computed from it, returns keys of
+        # the results, called with the lock held
+        self._invalidations += 1
+        self._revisions.pop(name, None)
+        keys = self._entries.pop(name, set())
+        for key in keys:
+            self._discard(key)
+        return keys
+
+    def _discard(self, key):
+        # remove the result from entries of its inputs, called with the
+        # lock held
+        for name, _, _ in key[3]:
+            entries = self._entries.get(name)
+            if entries is not None:
+                entries.discard(key)
+                if not entries:
+                    del self._entries[name]
+                    self._revisions.pop(name, None)
+
+    def _forget(self, key, result):
+        # called by the lru cache on eviction
+        with self._lock:
+            self._discard(key)
+
+    def describe(self):
+        description = self._cache.describe()
+        with self._lock:
+            description['invalidations'] = self._invalidations
+        return description
+
 
 class OperationsModel(object):
     """high-level operation model
@@ -75,14 +197,23 @@ class OperationsModel(object):
     This model wraps georest.geo.operations, provide ways to invoke, inspect
     operations for view.
     """
-    def __init__(self):
+    def __init__(self, result_cache=None):
+        """initialize the operations model
+
+        :param result_cache: an `OperationResultCache`, results of
+                             operations are cached if provided
+        """
         self.operations = OPERATION_MAPPING
+        self.result_cache = result_cache
 
     def describe(self):
         """list useful informations for this model here"""
-        return {
+        description = {
             'operations': list(self.operations)
         }
+        if self.result_cache is not None:
+            description['result_cache'] = self.result_cache.describe()
+        return description
 
     def describe_operation(self, op_name):
         op = self.operations.get(op_name, None)
@@ -100,11 +231,100 @@ class OperationsModel(object):
         :raises NoSuchOperation: when operation is not found
         :rtype: OperationResult
         """
+        op = self._get_operation(op_name, len(args))
+        operator = op(**kwargs)
+
+        if self.result_cache is not None:
+            key = self.result_cache.make_key(op_name, operator, args)
+            result = self.result_cache.get(key)
+            if result is not None:
+                return result
+
+        value = operator(*args)
+        is_pod = not op.RESULT_TYPE is geo.Geometry
+        result = OperationResult(value, is_pod)
+
+        if self.result_cache is not None:
+            self.result_cache.put(key, result)
+        return result
+
+    def invoke_pipeline(self, steps, *args, **kwargs):
+        """invoke a chain of operations
+
+        The whole pipeline is checked before any operation is invoked,
+        only the last operation may return a non-geometry result.
+
+        :param steps: list of (op_name, op_kwargs)
+        :param args: list of geometry objects passed to the first operation
+        :param kwargs: pipeline arguments, only `srid` is accepted, which
+                       is applied to the first operation
+        :raises NoSuchOperation: when an operation is not found
+        :raises BadInvoke: when the pipeline is not valid
+        :rtype: OperationResult
+        """
+        if not steps:
+            raise BadInvoke('invoking an empty pipeline')
+        if set(kwargs) - set(['srid']):
+            raise BadInvoke('unknown pipeline arguments %s' %
+                            ', '.join(sorted(set(kwargs) - set(['srid']))))
+
+        operators = []
+        for n, (op_name, op_kwargs) in enumerate(steps):
+            op = self._get_operation(op_name, len(args) if n == 0 else 1)
+            if n == 0 and 'srid' in kwargs:
+                op_kwargs = dict(op_kwargs, srid=kwargs['srid'])
+            operators.append(op(**op_kwargs))
+        try:
+            pipeline = ops.Pipeline(operators)
+        except geo.exceptions.InvalidParameter as e:
+            raise BadInvoke(str(e))
+
+        value = pipeline(*args)
+        is_pod = not pipeline.RESULT_TYPE is geo.Geometry
+        return OperationResult(value, is_pod)
+
+    def invoke_batch(self, op_name, geometries, *args, **kwargs):
+        """invoke an operation on each of the geometries
+
+        The operator is created and its arguments are validated only once,
+        `args` are extra geometries passed to every invocation after the
+        geometry from `geometries`, eg: for binary operations.  Geometries
+        are read and evaluated `BATCH_SIZE` at a time using `map()` of the
+        operator.  Variadic operations like `cascade_union` reduce all
+        geometries into one result using `reduce()` of the operator.
+
+        :param op_name: name of the operation
+        :param geometries: iterable of geometry objects, consumed lazily
+        :param args: list of extra geometry objects
+        :param kwargs: operation arguments
+        :raises NoSuchOperation: when operation is not found
+        :returns: iterator of OperationResult, in the order of geometries
+        """
+        op = self._get_operation(op_name, 1 + len(args))
+        operator = op(**kwargs)
+        is_pod = not op.RESULT_TYPE is geo.Geometry
+
+        if issubclass(op, ops.MultiGeometryOperation):
+            # variadic operations reduce the whole batch into one result,
+            # reading geometries as a stream
+            def invoke():
+                yield OperationResult(
+                    operator.reduce(itertools.chain(geometries, args)),
+                    is_pod)
+            return invoke()
+
+        def invoke():
+            for chunk in chunked(geometries, BATCH_SIZE):
+                for value in operator.map(chunk, *args):
+                    yield OperationResult(value, is_pod)
+
+        return invoke()
+
+    def _get_operation(self, op_name, l_args):
         op = self.operations.get(op_name, None)
         if not op:
             raise NoSuchOperation('Cannot find op %s' % op_name)
 
-        l_args = len(args)
         if l_args <= 0:
             raise BadInvoke('invoking %s with zero args' % op_name)
 
@@ -115,10 +335,7 @@ class OperationsModel(object):
         if issubclass(op, ops.BinaryOperation) and l_args != 2:
             raise BadInvoke('invoking binary operation %s with %d args'
                             % (op_name, l_args))
-
-        value = op(**kwargs)(*args)
-        is_pod = not op.RESULT_TYPE is geo.Geometry
-        return OperationResult(value, is_pod)
+        return op
 
 
 class AttributesModel(object):
@@ -46,7 +46,17 @@ class GeoRestApi(object):
         features_model = model.FeaturesModel(feature_storage, **feature_model_config)
         geometry_model = model.GeometryModel(feature_storage, **feature_model_config)
         feature_prop_model = model.FeaturePropertiesModel(feature_storage, **feature_model_config)
-        operations_model = model.OperationsModel()
+        cache_size = self.app.config.get('OPERATION_RESULT_CACHE_SIZE')
+        if cache_size:
+            result_cache = model.OperationResultCache(
+                max_items=cache_size,
+                max_bytes=self.app.config.get('OPERATION_RESULT_CACHE_BYTES'))
+        else:
+            result_cache = None
+        operations_model = model.OperationsModel(result_cache=result_cache)
+        view.compression.COMPRESSED_CACHE.configure(
+            max_items=self.app.config.get('COMPRESSION_CACHE_SIZE') or None,
+            max_bytes=self.app.config.get('COMPRESSION_CACHE_BYTES'))
         attributes_model = model.AttributesModel()
 
         self.add_resource(view.describe, '/describe',
@@ -65,6 +75,14 @@ class GeoRestApi(object):
                                                   feature_prop_model),
                           '/features/<key>/properties',
                           endpoint='properties')
+        self.add_resource(view.BucketImport.as_view('bucket_import',
+                                                    features_model),
+                          '/buckets/<name>/import',
+                          endpoint='bucket_import')
+        self.add_resource(view.BucketExport.as_view('bucket_export',
+                                                    features_model),
+                          '/buckets/<name>/export',
+                          endpoint='bucket_export')
         self.add_resource(view.Operations.as_view('operations',
                                                   operations_model,
                                                   geometry_model
@@ -75,6 +93,16 @@ class GeoRestApi(object):
                           '/features/<arg_list>/geometry/attributes/<op_name>',
                           '/geometries/<arg_list>/attributes/<op_name>',
                           endpoint='operations')
+        self.add_resource(view.Pipeline.as_view('pipeline',
+                                                operations_model,
+                                                geometry_model),
+                          '/operations/pipeline/<path:arg_list>',
+                          endpoint='pipeline')
+        self.add_resource(view.BatchOperations.as_view('batch_operations',
+                                                       operations_model,
+                                                       geometry_model),
+                          '/operations/batch/<op_name>',
+                          endpoint='batch_operations')
         self.add_resource(view.Attributes.as_view('attributes',
                                                   attributes_model,
                                                   geometry_model),
@@ -105,7 +133,7 @@ def rest_error(e):
                 message=str(e),
                 exception=e.__class__.__name__
                 )
-    if code >= 500 and flask.current_app.config['debug'] or True:
+    if code >= 500 and flask.current_app.config['DEBUG'] or True:
         data['traceback'] = traceback.format_tb(e.traceback)
     response = flask.jsonify(data)
     response.status_code = code
@@ -53,7 +53,8 @@ from .exceptions import (
     FeatureNotFound,
     NotHeadRevision,
     ParentRevisionNotFound,
-    UnknownStoragePrototype
+    UnknownStoragePrototype,
+    QueryNotSupported,
 )
 
 
@@ -10,8 +10,11 @@ __date__ = '6/20/14'
 """
 
 import uuid
+import bisect
 from collections import namedtuple
 
+from .exceptions import QueryNotSupported
+
 
 class Commit(namedtuple('Foo', 'name revision create_at expire_at')):
     """Commit result
@@ -52,6 +55,21 @@ class FeatureBucket(object):
         """
         raise NotImplementedError
 
+    def commit_many(self, items):
+        """Put a batch of feature data.
+
+        Returns a list of :class:`Commit` objects in the same order of
+        items.
+
+        Buckets supporting transaction commit the batch atomically, a
+        failure fails the whole batch.  Otherwise items are committed one
+        by one, and a failure leaves committed ones in place.
+
+        :param list items: list of (name, :class:`FeatureMapper`)
+        :rtype list of :class:`Commit`
+        """
+        return list(self.commit(name, mapper) for name, mapper in items)
+
     def checkout(self, name, revision=None):
         """Get a feature data
 
@@ -104,6 +122,75 @@ class FeatureBucket(object):
         """
         return self.status(name)
 
+    def query_all(self, limit=None, cursor=None):
+        """Iterate all features
+
+        Returns an iterable of (:class:`Commit`, :class:`FeatureMapper`) of
+        top revision of all features, see :meth:`query_bbox` for ordering
+        and paging.  Features are read lazily as the result is iterated,
+        so a whole bucket can be exported.
+
+        :rtype iterable
+        """
+        raise QueryNotSupported('%s does not support listing features' % \
+                                self.__class__.__name__)
+
+    def query_bbox(self, bbox, limit=None, cursor=None):
+        """Find features by bounding box
+
+        Returns an iterable of (:class:`Commit`, :class:`FeatureMapper`) of
+        top revision of features whose bounding box overlaps given bbox,
+        ordered by name.  Only features with name after `cursor` are
+        returned, at most `limit` of them.
+
+        :param tuple bbox: (minx, miny, maxx, maxy) in bucket coordinates
+        :param int limit: max number of features to return
+        :param basestring cursor: name of the last feature of previous page
+        :rtype iterable
+        """
+        raise QueryNotSupported('%s does not support bbox query' % \
+                                self.__class__.__name__)
+
+    def query_intersects(self, wkt, srid, limit=None, cursor=None):
+        """Find features intersects given geometry
+
+        Returns an iterable of (:class:`Commit`, :class:`FeatureMapper`),
+        see :meth:`query_bbox` for ordering and paging.
+
+        :param basestring wkt: wkt of the geometry
+        :param int srid: srid of the geometry
+        :rtype iterable
+        """
+        raise QueryNotSupported('%s does not support intersects query' % \
+                                self.__class__.__name__)
+
+    def query_distance(self, wkt, srid, distance, limit=None, cursor=None):
+        """Find features within distance of given geometry
+
+        Returns an iterable of (:class:`Commit`, :class:`FeatureMapper`),
+        see :meth:`query_bbox` for ordering and paging.
+
+        :param basestring wkt: wkt of the geometry
+        :param int srid: srid of the geometry
+        :param float distance: distance in units of bucket coordinates
+        :rtype iterable
+        """
+        raise QueryNotSupported('%s does not support distance query' % \
+                                self.__class__.__name__)
+
+    def query_geohash(self, prefix, limit=None, cursor=None):
+        """Find features by geohash prefix
+
+        Returns an iterable of (:class:`Commit`, :class:`FeatureMapper`) of
+        features whose `Metadata.geohash` starts with prefix, see
+        :meth:`query_bbox` for ordering and paging.
+
+        :param basestring prefix: geohash prefix
+        :rtype iterable
+        """
+        raise QueryNotSupported('%s does not support geohash query' % \
+                                self.__class__.__name__)
+
     def make_random_name(self):
         """create a random name
 
@@ -113,3 +200,13 @@ class FeatureBucket(object):
         """
         name = uuid.uuid4().hex
         return name
+
+
+def page_names(names, limit=None, cursor=None):
+    """Sort names and returns ones after `cursor`, at most `limit` of them"""
+    names = sorted(names)
+    if cursor is not None:
+        names = names[bisect.bisect_right(names, cursor):]
+    if limit is not None:
+        names = names[:limit]
+    return names
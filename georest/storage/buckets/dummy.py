@@ -14,6 +14,7 @@ import datetime
 
 from ..storage import FeatureStorage
 from ..bucket import FeatureBucket, Commit
+from ..index import FeatureIndex, IndexedBucketMixin
 from ..exceptions import FeatureNotFound, DuplicatedBucket, BucketNotFound
 
 
@@ -51,14 +52,16 @@ class DummyFeatureStorage(FeatureStorage):
         return name in self._collection
 
 
-class DummyFeatureBucket(FeatureBucket):
+class DummyFeatureBucket(IndexedBucketMixin, FeatureBucket):
     def __init__(self, name):
         FeatureBucket.__init__(self, name)
         self._storage = dict()
+        self._index = FeatureIndex()
 
     def commit(self, name, mapper, parent=None):
         timestamp = datetime.datetime.now()
         self._storage[name] = mapper, timestamp
+        self._index.insert(name, mapper.metadata)
 
         commit = Commit(
             name=name,
@@ -92,6 +95,7 @@ class DummyFeatureBucket(FeatureBucket):
             del self._storage[name]
         except KeyError:
             raise FeatureNotFound(name)
+        self._index.remove(name)
 
         new_commit = Commit(
             name=name,
@@ -104,6 +104,14 @@ class MemcacheFeatureStorage(FeatureStorage):
 
 
 class MemcacheFeatureBucket(FeatureBucket):
+    """Feature bucket in memcache
+
+    Memcache can't search by value or list keys, and an index kept in
+    process only sees features committed by the same process, so listing
+    and spatial queries are not supported rather than silently missing
+    features written by other processes.
+    """
+
     def __init__(self, name, client, prefix):
         assert isinstance(client, Client)
         FeatureBucket.__init__(self, name)
@@ -125,6 +133,24 @@ class MemcacheFeatureBucket(FeatureBucket):
             name=name, revision=None, create_at=None, expire_at=None)
         return commit
 
+    def commit_many(self, items):
+        # one round trip for the whole batch
+        mapping = dict((self._make_full_name(name), mapper)
+                       for name, mapper in items)
+        try:
+            failed = self._client.set_multi(mapping)
+        except Exception as e:
+            raise StorageInternalError('set_multi error', e)
+
+        if failed:
+            raise StorageInternalError(', '.join(failed))
+
+        commits = list()
+        for name, mapper in items:
+            commits.append(Commit(
+                name=name, revision=None, create_at=None, expire_at=None))
+        return commits
+
     def checkout(self, name, revision=None):
         full_name = self._make_full_name(name)
 
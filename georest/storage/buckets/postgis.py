@@ -14,13 +14,15 @@ import sqlalchemy
 import geoalchemy2
 import geoalchemy2.shape
 from sqlalchemy import create_engine
-from sqlalchemy import PrimaryKeyConstraint, Table, Column, DDL, event
-from sqlalchemy import String, DateTime
-from sqlalchemy.sql import select, and_
+from sqlalchemy import PrimaryKeyConstraint, Table, Column, Index, DDL, \
+    event
+from sqlalchemy import String, DateTime, Text
+from sqlalchemy.sql import select, and_, func
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.exc import IntegrityError
 
+from ...geo.jsonhelper import JsonObject
 from ..exceptions import *
 from ..storage import FeatureStorage
 from ..bucket import FeatureBucket, FeatureMapper, Commit
@@ -152,13 +154,24 @@ class PostGISFeatureBucket(FeatureBucket):
             Column('name', String, index=True),
             Column('properties', JSON, default=None),
             Column('metadata', JSON, default=None),
-            Column('geometry', geoalchemy2.Geometry('GEOMETRY', srid=4326)),
+            Column('geometry', geoalchemy2.Geometry('GEOMETRY', srid=4326,
+                                                    spatial_index=False)),
             Column('create_at', DateTime, nullable=False),
             Column('expire_at', DateTime, nullable=False),
             Column('revision', String, index=True),
             PrimaryKeyConstraint('name', 'expire_at')
         )
 
+        # spatial index on top revisions only, old revisions are never
+        # searched spatially.  queries must repeat the index predicate so
+        # the planner can use the partial index.  tables created with the
+        # full index of geoalchemy2 can drop it:
+        #   DROP INDEX <schema>.idx_feature_geometry;
+        Index('feature_current_geometry_idx',
+              self.FEATURE_TABLE.c.geometry,
+              postgresql_using='gist',
+              postgresql_where=self.FEATURE_TABLE.c.expire_at == 'infinity')
+
         create_feature_view = DDL("""
             CREATE OR REPLACE VIEW %(schema)s.current_feature AS
                 SELECT * FROM %(fullname)s WHERE expire_at = 'infinity';
@@ -300,32 +313,40 @@ class PostGISFeatureBucket(FeatureBucket):
 
     def commit(self, name, mapper, parent=None):
         with self._engine.begin() as conn:
+            return self._commit(conn, name, mapper, parent)
+
+    def commit_many(self, items):
+        # one transaction for the whole batch
+        with self._engine.begin() as conn:
+            return list(self._commit(conn, name, mapper)
+                        for name, mapper in items)
 
-            top = self._select_top_revision(conn, name)
-            if top:
-                if parent is None:
-                    inserted = self._update(conn, name, mapper)
-                else:
-                    try:
-                        inserted = self._update_against_parent(
-                            conn, name, mapper, parent)
-                    except sqlalchemy.exc.InternalError as e:
-                        raise NotHeadRevision(
-                            message='%s@%s' % (name, parent), e=e)
+    def _commit(self, conn, name, mapper, parent=None):
+        top = self._select_top_revision(conn, name)
+        if top:
+            if parent is None:
+                inserted = self._update(conn, name, mapper)
             else:
-                if parent is not None:
-                    raise ParentRevisionNotFound(message='%s@%s' % (name, parent))
+                try:
+                    inserted = self._update_against_parent(
+                        conn, name, mapper, parent)
+                except sqlalchemy.exc.InternalError as e:
+                    raise NotHeadRevision(
+                        message='%s@%s' % (name, parent), e=e)
+        else:
+            if parent is not None:
+                raise ParentRevisionNotFound(message='%s@%s' % (name, parent))
 
-                inserted = self._insert(conn, name, mapper)
+            inserted = self._insert(conn, name, mapper)
 
-            commit = Commit(
-                name=inserted.name,
-                revision=inserted.revision,
-                create_at=inserted.create_at,
-                expire_at=inserted.expire_at,
-            )
+        commit = Commit(
+            name=inserted.name,
+            revision=inserted.revision,
+            create_at=inserted.create_at,
+            expire_at=inserted.expire_at,
+        )
 
-            return commit
+        return commit
 
     def checkout(self, name, revision=None):
         with self._engine.begin() as conn:
@@ -339,21 +360,7 @@ class PostGISFeatureBucket(FeatureBucket):
                 if selected is None:
                     raise FeatureNotFound(message='%s@%s' % (name, revision))
 
-            commit = Commit(
-                name=selected.name,
-                revision=selected.revision,
-                create_at=selected.create_at,
-                expire_at=selected.expire_at,
-            )
-
-            mapper = FeatureMapper(
-                properties=selected.properties,
-                metadata=selected.metadata,
-                wkt=geoalchemy2.shape.to_shape(selected.geometry).wkt,
-                srid=selected.geometry.srid
-            )
-
-            return commit, mapper
+            return self._make_commit_mapper(selected)
 
     def status(self, name, revision=None):
         with self._engine.begin() as conn:
@@ -395,6 +402,97 @@ class PostGISFeatureBucket(FeatureBucket):
             )
             return commit
 
+    def query_all(self, limit=None, cursor=None):
+        return self._query(None, limit=limit, cursor=cursor)
+
+    def query_bbox(self, bbox, limit=None, cursor=None):
+        minx, miny, maxx, maxy = bbox
+        envelope = func.ST_MakeEnvelope(minx, miny, maxx, maxy,
+                                        self._column_srid)
+        condition = self.FEATURE_TABLE.c.geometry.op('&&')(envelope)
+        return self._query(condition, limit=limit, cursor=cursor)
+
+    def query_intersects(self, wkt, srid, limit=None, cursor=None):
+        geometry = self._make_geometry(wkt, srid)
+        # st_intersects() inlines a && test which uses the index
+        condition = func.ST_Intersects(self.FEATURE_TABLE.c.geometry,
+                                       geometry)
+        return self._query(condition, limit=limit, cursor=cursor)
+
+    def query_distance(self, wkt, srid, distance, limit=None, cursor=None):
+        geometry = self._make_geometry(wkt, srid)
+        # st_dwithin() expands the bbox and uses the index as well
+        condition = func.ST_DWithin(self.FEATURE_TABLE.c.geometry,
+                                    geometry, distance)
+        return self._query(condition, limit=limit, cursor=cursor)
+
+    @property
+    def _column_srid(self):
+        return self.FEATURE_TABLE.c.geometry.type.srid
+
+    def _make_geometry(self, wkt, srid):
+        geometry = func.ST_GeomFromText(wkt, srid)
+        if srid != self._column_srid:
+            geometry = func.ST_Transform(geometry, self._column_srid)
+        return geometry
+
+    def _query(self, condition, limit=None, cursor=None):
+        """Yields top revisions matching the spatial condition (all of them
+        if condition is None) ordered by name, rows are fetched by a server
+        side cursor in batches"""
+        select_stmt = select([
+            self.FEATURE_TABLE.c.name,
+            self._properties_text,
+            self.FEATURE_TABLE.c.metadata,
+            self.FEATURE_TABLE.c.geometry,
+            self.FEATURE_TABLE.c.create_at,
+            self.FEATURE_TABLE.c.expire_at,
+            self.FEATURE_TABLE.c.revision,
+        ]).where(
+            self.FEATURE_TABLE.c.expire_at == 'infinity'
+        ).order_by(self.FEATURE_TABLE.c.name)
+        if condition is not None:
+            select_stmt = select_stmt.where(condition)
+        if cursor is not None:
+            select_stmt = select_stmt.where(
+                self.FEATURE_TABLE.c.name > cursor)
+        if limit is not None:
+            select_stmt = select_stmt.limit(limit)
+
+        with self._engine.begin() as conn:
+            result = conn.execution_options(stream_results=True) \
+                .execute(select_stmt)
+            try:
+                for selected in result:
+                    yield self._make_commit_mapper(selected)
+            finally:
+                result.close()
+
+    @property
+    def _properties_text(self):
+        # read properties as stored json text so it can be passed through
+        # to the response without decoding
+        return sqlalchemy.cast(self.FEATURE_TABLE.c.properties,
+                               Text).label('properties')
+
+    def _make_commit_mapper(self, selected):
+        commit = Commit(
+            name=selected.name,
+            revision=selected.revision,
+            create_at=selected.create_at,
+            expire_at=selected.expire_at,
+        )
+
+        mapper = FeatureMapper(
+            properties=JsonObject(selected.properties)
+            if selected.properties is not None else None,
+            metadata=selected.metadata,
+            wkt=geoalchemy2.shape.to_shape(selected.geometry).wkt,
+            srid=selected.geometry.srid
+        )
+
+        return commit, mapper
+
     def _insert(self, conn, name, mapper):
         insert_stmt = self.FEATURE_TABLE.insert().returning(
             self.FEATURE_TABLE.c.name,
@@ -489,7 +587,7 @@ class PostGISFeatureBucket(FeatureBucket):
     def _select(self, conn, name, revision):
         select_stmt = select([
             self.FEATURE_TABLE.c.name,
-            self.FEATURE_TABLE.c.properties,
+            self._properties_text,
             self.FEATURE_TABLE.c.metadata,
             self.FEATURE_TABLE.c.geometry,
             self.FEATURE_TABLE.c.create_at,
@@ -524,7 +622,7 @@ class PostGISFeatureBucket(FeatureBucket):
     def _select_top(self, conn, name):
         select_stmt = select([
             self.FEATURE_TABLE.c.name,
-            self.FEATURE_TABLE.c.properties,
+            self._properties_text,
             self.FEATURE_TABLE.c.metadata,
             self.FEATURE_TABLE.c.geometry,
             self.FEATURE_TABLE.c.create_at,
@@ -11,7 +11,7 @@ __date__ = '6/20/14'
 import six
 from collections import namedtuple
 
-from ..geo import Key, Feature, SpatialReference, Metadata, Geometry
+from ..geo import Key, Feature, LazyFeature, Metadata
 from .bucket import FeatureBucket, FeatureMapper
 
 
@@ -26,12 +26,11 @@ def make_mapper_from_feature(feature):
 
 def make_feature_from_mapper(key, mapper):
     assert isinstance(mapper, FeatureMapper)
-    crs = SpatialReference(srid=mapper.srid)
     metadata = Metadata(**mapper.metadata)
-    properties = dict(mapper.properties)
-    geometry = Geometry.build_geometry(mapper.wkt, srid=mapper.srid)
-
-    feature = Feature(key, geometry, crs, properties, metadata)
+    # trust what we wrote into the storage, geometry and properties are
+    # decoded only when accessed
+    feature = LazyFeature(key, mapper.wkt, mapper.srid, mapper.properties,
+                          metadata)
     return feature
 
 
@@ -96,6 +95,28 @@ class FeatureEntry(object):
         commit = self._bucket.commit(full_name, mapper, parent=revision)
         return Response.from_commit(commit)
 
+    def put_features(self, items):
+        """ Put a batch of features in the bucket
+
+        Features are put as `put_feature()` without revision, in a single
+        transaction if the bucket supports it.
+
+        :param list items: list of (:class:`Key`, :class:`Feature`)
+        :rtype list of :class:`Response`
+        """
+        batch = list()
+        for key, feature in items:
+            assert isinstance(key, Key)
+            assert isinstance(feature, Feature)
+            bucket, name = key
+            if not name:
+                name = self._bucket.make_random_name()
+            full_name = Key.make_key(bucket=bucket, name=name).qualified_name
+            batch.append((full_name, make_mapper_from_feature(feature)))
+
+        commits = self._bucket.commit_many(batch)
+        return list(Response.from_commit(commit) for commit in commits)
+
     def get_feature(self, key, revision=None):
         """ Get a feature in the bucket
 
@@ -157,3 +178,72 @@ class FeatureEntry(object):
         commit = self._bucket.remove(name, parent=revision)
         return Response.from_commit(commit)
 
+
+    def query_bbox(self, bbox, limit=None, cursor=None):
+        """ Find features whose bounding box overlaps given bbox
+
+        Features are ordered by key, only features after `cursor` are
+        returned, at most `limit` of them.
+
+        :param tuple bbox: (minx, miny, maxx, maxy)
+        :param int limit: max number of features
+        :param :class:`Key` cursor: key of last feature of previous page
+        :rtype list of tuple(:class:`Response`, :class:`Feature`)
+        """
+        return self._query(self._bucket.query_bbox, bbox,
+                           limit=limit, cursor=cursor)
+
+    def query_intersects(self, geometry, limit=None, cursor=None):
+        """ Find features intersects given geometry, see `query_bbox()`
+
+        :param :class:`Geometry` geometry: geometry to test
+        :rtype list of tuple(:class:`Response`, :class:`Feature`)
+        """
+        return self._query(self._bucket.query_intersects,
+                           geometry.wkt, geometry.crs.srid,
+                           limit=limit, cursor=cursor)
+
+    def query_distance(self, geometry, distance, limit=None, cursor=None):
+        """ Find features within distance of given geometry, see
+        `query_bbox()`
+
+        :param :class:`Geometry` geometry: geometry to measure from
+        :param float distance: distance in units of bucket coordinates
+        :rtype list of tuple(:class:`Response`, :class:`Feature`)
+        """
+        return self._query(self._bucket.query_distance,
+                           geometry.wkt, geometry.crs.srid, distance,
+                           limit=limit, cursor=cursor)
+
+    def query_geohash(self, prefix, limit=None, cursor=None):
+        """ Find features whose geohash starts with prefix, see
+        `query_bbox()`
+
+        :param str prefix: geohash prefix
+        :rtype list of tuple(:class:`Response`, :class:`Feature`)
+        """
+        return self._query(self._bucket.query_geohash, prefix,
+                           limit=limit, cursor=cursor)
+
+    def iter_features(self, cursor=None):
+        """ Iterate all features in the bucket ordered by key, features
+        are read from the bucket as the iterator advances
+
+        :param :class:`Key` cursor: only features after this key
+        :rtype iterator of tuple(:class:`Response`, :class:`Feature`)
+        """
+        return self._iter_query(self._bucket.query_all, cursor=cursor)
+
+    def _query(self, method, *args, **kwargs):
+        return list(self._iter_query(method, *args, **kwargs))
+
+    def _iter_query(self, method, *args, **kwargs):
+        cursor = kwargs.pop('cursor', None)
+        assert cursor is None or isinstance(cursor, Key)
+        if cursor is not None:
+            cursor = cursor.qualified_name
+
+        for commit, mapper in method(*args, cursor=cursor, **kwargs):
+            key = Key.build_from_qualified_name(commit.name)
+            feature = make_feature_from_mapper(key, mapper)
+            yield Response.from_commit(commit), feature
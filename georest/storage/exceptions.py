@@ -42,3 +42,7 @@ class ParentRevisionNotFound(StorageError):
 
 class NotHeadRevision(StorageError):
     HTTP_STATUS_CODE = 409
+
+
+class QueryNotSupported(StorageError):
+    HTTP_STATUS_CODE = 501
@@ -0,0 +1,404 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'ray'
+__date__ = '10/18/14'
+
+"""
+    georest.storage.index
+    ~~~~~~~~~~~~~~~~~~~~~
+    In memory spatial indexes for buckets without native spatial index.
+"""
+
+import math
+import bisect
+import itertools
+import threading
+
+import geohash
+import shapely.wkt
+import shapely.prepared
+
+from ..geo import SpatialReference
+from .bucket import page_names
+from .exceptions import FeatureNotFound
+
+
+def bbox_intersects(a, b):
+    """Check whether two (minx, miny, maxx, maxy) bounding boxes overlap"""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _union_bbox(bboxes):
+    minx, miny, maxx, maxy = bboxes[0]
+    for bbox in bboxes[1:]:
+        minx = min(minx, bbox[0])
+        miny = min(miny, bbox[1])
+        maxx = max(maxx, bbox[2])
+        maxy = max(maxy, bbox[3])
+    return minx, miny, maxx, maxy
+
+
+def str_pack(entries, capacity=16):
+    """Bulk load (bbox, item) entries into a R-tree using Sort-Tile-Recursive
+
+    Returns the root node, a node is a tuple of (bbox, children, is_leaf)
+    where children of leaf nodes are the (bbox, item) entries.  Returns
+    `None` if there are no entries.
+    """
+    if not entries:
+        return None
+
+    nodes = list(entries)
+    is_leaf = True
+    while True:
+        nodes = list((_union_bbox(list(c[0] for c in group)), group, is_leaf)
+                     for group in _str_tiles(nodes, capacity))
+        is_leaf = False
+        if len(nodes) == 1:
+            return nodes[0]
+
+
+def _str_tiles(nodes, capacity):
+    # sort by center x, cut into vertical slices, then sort each slice by
+    # center y and cut into groups of `capacity`
+    num_groups = int(math.ceil(len(nodes) / float(capacity)))
+    num_slices = int(math.ceil(math.sqrt(num_groups)))
+    slice_size = num_slices * capacity
+
+    nodes = sorted(nodes, key=lambda n: n[0][0] + n[0][2])
+    for i in range(0, len(nodes), slice_size):
+        vertical = sorted(nodes[i:i + slice_size],
+                          key=lambda n: n[0][1] + n[0][3])
+        for j in range(0, len(vertical), capacity):
+            yield vertical[j:j + capacity]
+
+
+def str_search(root, bbox):
+    """Yield items of a packed R-tree whose bbox overlaps given bbox"""
+    if root is None:
+        return
+    stack = [root]
+    while stack:
+        node_bbox, children, is_leaf = stack.pop()
+        if not bbox_intersects(node_bbox, bbox):
+            continue
+        if is_leaf:
+            for child_bbox, item in children:
+                if bbox_intersects(child_bbox, bbox):
+                    yield item
+        else:
+            stack.extend(children)
+
+
+class RTreeIndex(object):
+    """Thread safe bounding box index of named items
+
+    Items are bulk loaded into a static STR packed R-tree.  Insertions
+    after the last packing go into a delta buffer which is scanned
+    linearly, removed or replaced items in the tree are masked by
+    tombstones.  The tree is repacked when the buffer and tombstones
+    together exceed `rebuild_ratio` of the tree size (but not before
+    `rebuild_min` changes).
+    """
+
+    def __init__(self, capacity=16, rebuild_ratio=0.25, rebuild_min=256):
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._rebuild_ratio = rebuild_ratio
+        self._rebuild_min = rebuild_min
+
+        self._bboxes = dict()  # all live items
+        self._root = None
+        self._packed = 0
+        self._delta = dict()
+        self._tombstones = set()
+        self._rebuilds = 0
+
+    def insert(self, name, bbox):
+        """Index item `name` with `bbox`, replaces existing one.  Items with
+        empty bbox (of empty geometries) are not indexed."""
+        with self._lock:
+            self._discard(name)
+            if not bbox:
+                return
+            bbox = tuple(bbox)
+            self._bboxes[name] = bbox
+            self._delta[name] = bbox
+            self._maybe_rebuild()
+
+    def remove(self, name):
+        with self._lock:
+            self._discard(name)
+            self._maybe_rebuild()
+
+    def query(self, bbox):
+        """Returns names of items whose bbox overlaps given bbox"""
+        with self._lock:
+            root = self._root
+            delta = list(self._delta.items())
+            tombstones = frozenset(self._tombstones)
+        # packed tree is immutable, safe to search outside of the lock
+        result = list(name for name in str_search(root, bbox)
+                      if name not in tombstones)
+        result.extend(name for name, item_bbox in delta
+                      if bbox_intersects(item_bbox, bbox))
+        return result
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    def _discard(self, name):
+        if self._bboxes.pop(name, None) is None:
+            return
+        if self._delta.pop(name, None) is None:
+            # the item is in the packed tree
+            self._tombstones.add(name)
+
+    def _maybe_rebuild(self):
+        changes = len(self._delta) + len(self._tombstones)
+        if changes > max(self._rebuild_min,
+                         self._rebuild_ratio * self._packed):
+            self._rebuild()
+
+    def _rebuild(self):
+        entries = list((bbox, name) for name, bbox in self._bboxes.items())
+        self._root = str_pack(entries, self._capacity)
+        self._packed = len(entries)
+        self._delta = dict()
+        self._tombstones = set()
+        self._rebuilds += 1
+
+    def __len__(self):
+        return len(self._bboxes)
+
+    def __contains__(self, name):
+        return name in self._bboxes
+
+    def describe(self):
+        with self._lock:
+            return {
+                'size': len(self._bboxes),
+                'packed': self._packed,
+                'delta': len(self._delta),
+                'tombstones': len(self._tombstones),
+                'rebuilds': self._rebuilds,
+            }
+
+
+def geohash_precision(width, height, max_precision=12):
+    """Longest geohash precision whose cells are not smaller than given
+    width and height in degrees"""
+    for precision in range(max_precision, 0, -1):
+        lon_bits = (precision * 5 + 1) // 2
+        lat_bits = precision * 5 // 2
+        if 360. / 2 ** lon_bits >= width and 180. / 2 ** lat_bits >= height:
+            return precision
+    return 0
+
+
+def geohash_cover(bbox, max_precision=12):
+    """Geohash cells covering given lonlat bbox
+
+    Cells are chosen at the precision where the bbox is not larger than a
+    cell, so it's covered by the cell containing its center and neighbors
+    of that cell.
+    """
+    minx, miny, maxx, maxy = bbox
+    precision = geohash_precision(maxx - minx, maxy - miny, max_precision)
+    if precision == 0:
+        return ['']
+    # geohash does not accept latitude 90
+    center = geohash.encode(max(-90., min(89.999999, (miny + maxy) / 2.)),
+                            max(-180., min(180., (minx + maxx) / 2.)),
+                            precision)
+    return sorted(set(geohash.expand(center)))
+
+
+class GeohashIndex(object):
+    """Thread safe geohash index of named items
+
+    Items are kept in a sorted array of (geohash, name) so a prefix query
+    is a binary search followed by a range scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = list()  # sorted list of (geohash, name)
+        self._hashes = dict()
+
+    def insert(self, name, hash_):
+        """Index item `name` with geohash, replaces existing one.  Items
+        without geohash are not indexed, while empty geohash (of
+        geometries cover too much of the globe) is."""
+        with self._lock:
+            self._discard(name)
+            if hash_ is None:
+                return
+            self._hashes[name] = hash_
+            bisect.insort(self._items, (hash_, name))
+
+    def remove(self, name):
+        with self._lock:
+            self._discard(name)
+
+    def query_prefix(self, prefix):
+        """Returns names of items whose geohash starts with prefix"""
+        with self._lock:
+            return list(name for hash_, name in self._scan(prefix))
+
+    def query_cells(self, cells):
+        """Returns names of items whose geohash cell overlaps any of cells,
+        that is, geohash of the item starts with a cell, or is a prefix of
+        a cell"""
+        ancestors = set()
+        for cell in cells:
+            ancestors.update(cell[:i] for i in range(len(cell)))
+        ancestors.difference_update(cells)
+
+        names = set()
+        with self._lock:
+            for cell in cells:
+                names.update(name for hash_, name in self._scan(cell))
+            for ancestor in ancestors:
+                names.update(name for hash_, name in
+                             self._scan(ancestor, exact=True))
+        return list(names)
+
+    def _scan(self, prefix, exact=False):
+        items = self._items
+        i = bisect.bisect_left(items, (prefix,))
+        while i < len(items):
+            hash_ = items[i][0]
+            if hash_ != prefix and (exact or not hash_.startswith(prefix)):
+                break
+            yield items[i]
+            i += 1
+
+    def _discard(self, name):
+        hash_ = self._hashes.pop(name, None)
+        if hash_ is None:
+            return
+        del self._items[bisect.bisect_left(self._items, (hash_, name))]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, name):
+        return name in self._hashes
+
+    def describe(self):
+        with self._lock:
+            return {'size': len(self._hashes)}
+
+
+class FeatureIndex(object):
+    """Spatial indexes of features in a bucket, built from metadata of
+    committed features"""
+
+    def __init__(self):
+        self.rtree = RTreeIndex()
+        self.geohash = GeohashIndex()
+        self._lock = threading.Lock()
+        self._names = set()  # including features without location
+
+    def insert(self, name, metadata):
+        with self._lock:
+            self._names.add(name)
+        bbox = metadata.get('bbox')
+        self.rtree.insert(name, bbox)
+        # empty geometries has no location
+        self.geohash.insert(name, metadata.get('geohash') if bbox else None)
+
+    def remove(self, name):
+        with self._lock:
+            self._names.discard(name)
+        self.rtree.remove(name)
+        self.geohash.remove(name)
+
+    def names(self):
+        """Returns names of all indexed features"""
+        with self._lock:
+            return list(self._names)
+
+    def describe(self):
+        return {
+            'size': len(self._names),
+            'rtree': self.rtree.describe(),
+            'geohash': self.geohash.describe(),
+        }
+
+
+class IndexedBucketMixin(object):
+    """Spatial queries of :class:`FeatureBucket` using a :class:`FeatureIndex`
+    as `self._index`, candidates are checked out and refined exactly
+    using shapely.
+
+    Bucket should update the index on commit and remove.
+    """
+
+    def query_all(self, limit=None, cursor=None):
+        # only names are copied, features are checked out while iterating
+        names = page_names(self._index.names(), limit=limit, cursor=cursor)
+        return self._iter_checkout(names)
+
+    def query_bbox(self, bbox, limit=None, cursor=None):
+        return self._checkout_candidates(self._index.rtree.query(bbox),
+                                         limit=limit, cursor=cursor)
+
+    def query_intersects(self, wkt, srid, limit=None, cursor=None):
+        geometry = shapely.wkt.loads(wkt)
+        prepared = shapely.prepared.prep(geometry)
+
+        def accept(mapper):
+            return mapper.srid == srid and \
+                   prepared.intersects(shapely.wkt.loads(mapper.wkt))
+
+        names = self._index.rtree.query(geometry.bounds) \
+            if not geometry.is_empty else []
+        return self._checkout_candidates(names, limit=limit, cursor=cursor,
+                                         accept=accept)
+
+    def query_distance(self, wkt, srid, distance, limit=None, cursor=None):
+        geometry = shapely.wkt.loads(wkt)
+
+        def accept(mapper):
+            return mapper.srid == srid and \
+                   geometry.distance(shapely.wkt.loads(mapper.wkt)) <= distance
+
+        if geometry.is_empty:
+            names = []
+        else:
+            minx, miny, maxx, maxy = geometry.bounds
+            bbox = minx - distance, miny - distance, \
+                   maxx + distance, maxy + distance
+            crs = SpatialReference.make_spatialref(srid)
+            if crs.proj.is_latlong():
+                names = self._index.geohash.query_cells(geohash_cover(bbox))
+            else:
+                names = self._index.rtree.query(bbox)
+        return self._checkout_candidates(names, limit=limit, cursor=cursor,
+                                         accept=accept)
+
+    def query_geohash(self, prefix, limit=None, cursor=None):
+        return self._checkout_candidates(
+            self._index.geohash.query_prefix(prefix),
+            limit=limit, cursor=cursor)
+
+    def _checkout_candidates(self, names, limit=None, cursor=None,
+                             accept=None):
+        return list(itertools.islice(
+            self._iter_checkout(page_names(names, cursor=cursor), accept),
+            limit))
+
+    def _iter_checkout(self, names, accept=None):
+        for name in names:
+            try:
+                commit, mapper = self.checkout(name)
+            except FeatureNotFound:
+                # gone without being removed
+                self._index.remove(name)
+                continue
+            if accept is not None and not accept(mapper):
+                continue
+            yield commit, mapper
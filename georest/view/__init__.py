@@ -16,7 +16,10 @@ from flask.json import jsonify
 
 from georest import __version__, geo
 from .feature import Features, Geometry, Properties
-from .operations import Operations, Attributes
+from .bucket import BucketImport, BucketExport
+from .compression import COMPRESSED_CACHE
+from .operations import Operations, BatchOperations, Pipeline, \
+    Attributes
 
 
 def describe():
@@ -30,4 +33,5 @@ def describe():
                 },
             'engine': geo.describe(),
             'feature_storage': current_app.feature_storage.describe(),
+            'compressed_cache': COMPRESSED_CACHE.describe(),
     })
@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'pp'
+__date__ = '10/18/14'
+
+"""
+    georest.view.bucket
+    ~~~~~~~~~~~~~~~~~~~
+
+    bucket level bulk resources
+"""
+
+import flask
+from flask import request
+from flask import current_app
+from flask.views import MethodView
+
+from ..geo import jsonhelper as json
+from ..geo.geojsonio import split_feature_collection, split_lines, \
+    CHUNK_SIZE
+from .exceptions import InvalidRequest
+from .utils import catcher
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+GEOJSON_MIMETYPES = ('application/json', 'application/geo+json',
+                     'application/vnd.geo+json')
+
+
+def _iter_request_chunks(chunk_size=CHUNK_SIZE):
+    """read request body in chunks, without loading the whole body"""
+    stream = request.stream
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class BucketImport(MethodView):
+    """Create features in the bucket from a FeatureCollection or newline
+    delimited GeoJson, results are streamed as newline delimited json"""
+    decorators = [catcher]
+
+    def __init__(self, model):
+        super(BucketImport, self).__init__()
+        self.model = model
+
+    def post(self, name):
+        if request.mimetype in NDJSON_MIMETYPES:
+            texts = split_lines(_iter_request_chunks())
+        elif request.mimetype in GEOJSON_MIMETYPES:
+            texts = split_feature_collection(_iter_request_chunks())
+        else:
+            raise InvalidRequest('Only FeatureCollection or newline '
+                                 'delimited GeoJson supported')
+
+        results = self.model.import_features(
+            texts, bucket=name,
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000))
+
+        def iter_lines():
+            for result in results:
+                yield json.dumps(result) + '\n'
+
+        # request body is read while the response is streamed
+        return flask.Response(flask.stream_with_context(iter_lines()),
+                              status=200,
+                              headers={'Content-Type': NDJSON_MIMETYPES[0]})
+
+
+class BucketExport(MethodView):
+    """Stream all features of the bucket as a FeatureCollection, or newline
+    delimited GeoJson if format=ndjson"""
+    decorators = [catcher]
+
+    def __init__(self, model):
+        super(BucketExport, self).__init__()
+        self.model = model
+
+    def get(self, name):
+        export_format = request.args.get('format', 'geojson')
+        if export_format not in ('geojson', 'ndjson'):
+            raise InvalidRequest('Unknown export format %r' % export_format)
+        ndjson = export_format == 'ndjson'
+
+        chunks = self.model.export_features(
+            bucket=name, ndjson=ndjson,
+            cursor=request.args.get('cursor', None))
+        content_type = NDJSON_MIMETYPES[0] if ndjson else 'application/json'
+        return flask.Response(flask.stream_with_context(chunks),
+                              status=200,
+                              headers={'Content-Type': content_type})
@@ -0,0 +1,189 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'pp'
+__date__ = '10/18/14'
+
+"""
+    georest.view.compression
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    gzip/deflate content coding of responses
+"""
+
+import zlib
+import itertools
+
+from werkzeug.datastructures import ETags
+import flask
+from flask import request
+from flask import current_app
+
+from ..geo.cache import LRUCache
+
+# supported content codings in order of preference
+ENCODINGS = ('gzip', 'deflate')
+
+# Compressed representations of immutable content, eg: a feature at a
+# revision, keyed by (cache key, encoding)
+COMPRESSED_CACHE = LRUCache(max_items=256,
+                            max_bytes=64 * 1024 * 1024,
+                            sizeof=len)
+
+
+def get_encoding():
+    """negotiate content coding by Accept-Encoding, None if response
+    should not be compressed"""
+    if not current_app.config.get('COMPRESSION', True):
+        return None
+    accept = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compressor(encoding, level):
+    if encoding == 'gzip':
+        # gzip container instead of zlib
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zlib.compressobj(level)
+
+
+def compress(data, encoding, level=6):
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    compressor = _compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def iter_compress(chunks, encoding, level=6):
+    compressor = _compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _cache_compressed(chunks, cache_key):
+    # cache compressed data after it's completely sent
+    collected = list()
+    for chunk in chunks:
+        collected.append(chunk)
+        yield chunk
+    COMPRESSED_CACHE.put(cache_key, ''.join(collected))
+
+
+def _peek(chunks, size):
+    """read chunks until `size` bytes are buffered, returns buffered chunks
+    and whether chunks are exhausted"""
+    buffered = list()
+    length = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            return buffered, False
+    return buffered, True
+
+
+def _add_vary(headers):
+    headers = dict(headers)
+    vary = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'Accept-Encoding' not in vary:
+        headers['Vary'] = '%s, Accept-Encoding' % vary
+    return headers
+
+
+def encoded_etag(etag, encoding):
+    """ETag of the `encoding` coded representation, the identity and coded
+    representations are not byte equal so they don't share a strong ETag"""
+    return '%s-%s' % (etag, encoding)
+
+
+def _set_encoding(headers, encoding):
+    headers['Content-Encoding'] = encoding
+    etags = headers.get('ETag', None)
+    if etags is not None:
+        headers['ETag'] = ETags(list(encoded_etag(etag, encoding)
+                                     for etag in etags.as_set()))
+
+
+def not_modified(headers):
+    """make a 304 response, keeping validators and Vary of `headers`"""
+    headers = dict((k, v) for k, v in headers.items()
+                   if k in ('ETag', 'Vary'))
+    if current_app.config.get('COMPRESSION', True):
+        headers = _add_vary(headers)
+    return flask.Response(status=304, headers=headers)
+
+
+def cached_response(cache_key, headers):
+    """make a 200 response of compressed content cached under `cache_key`,
+    None if not cached or compression is not negotiated"""
+    encoding = get_encoding()
+    if encoding is None or cache_key is None or \
+            not current_app.config.get('COMPRESSION_CACHE_SIZE', 256):
+        return None
+    compressed = COMPRESSED_CACHE.get((cache_key, encoding))
+    if compressed is None:
+        return None
+    headers = _add_vary(headers)
+    _set_encoding(headers, encoding)
+    return compressed, 200, headers
+
+
+def make_response(data, headers, cache_key=None):
+    """make a 200 response of `data`, compressed if negotiated and large
+    enough
+
+    `data` is either a string, or an iterator of string chunks which is
+    streamed.  If `cache_key` is given, the content is immutable and the
+    compressed bytes are cached under it.  The ETag of a compressed
+    response is suffixed by its encoding, see encoded_etag().
+    """
+    config = current_app.config
+    encoding = get_encoding()
+    if config.get('COMPRESSION', True):
+        headers = _add_vary(headers)
+    if encoding is None:
+        if isinstance(data, basestring):
+            return data, 200, headers
+        return flask.Response(data, status=200, headers=headers)
+
+    response = cached_response(cache_key, headers)
+    if response is not None:
+        return response
+    if not config.get('COMPRESSION_CACHE_SIZE', 256):
+        cache_key = None
+    elif cache_key is not None:
+        cache_key = (cache_key, encoding)
+
+    level = config.get('COMPRESSION_LEVEL', 6)
+    min_size = config.get('COMPRESSION_MIN_SIZE', 1024)
+
+    if isinstance(data, basestring):
+        if len(data) < min_size:
+            return data, 200, headers
+        compressed = compress(data, encoding, level)
+        if cache_key is not None:
+            COMPRESSED_CACHE.put(cache_key, compressed)
+        _set_encoding(headers, encoding)
+        return compressed, 200, headers
+
+    # streamed, length is not known until enough chunks are read
+    data = iter(data)
+    buffered, exhausted = _peek(data, min_size)
+    if exhausted:
+        return ''.join(buffered), 200, headers
+    chunks = iter_compress(itertools.chain(buffered, data), encoding, level)
+    if cache_key is not None:
+        chunks = _cache_compressed(chunks, cache_key)
+    _set_encoding(headers, encoding)
+    return flask.Response(chunks, status=200, headers=headers)
@@ -19,8 +19,11 @@ from flask import current_app
 from flask.views import MethodView
 from flask.json import jsonify
 
+from .. import geo
 from .exceptions import InvalidRequest
 from .utils import get_json_content, get_if_match, catcher
+from .compression import make_response, cached_response, not_modified, \
+    get_encoding, encoded_etag
 
 
 class StorageView(MethodView):
@@ -28,6 +31,9 @@ class StorageView(MethodView):
     """
     decorators = [catcher]
 
+    # whether coordinates can be quantized, see _get_quantization()
+    quantizable = False
+
     def __init__(self, model):
         super(StorageView, self).__init__()
         self.model = model
@@ -36,23 +42,57 @@ class StorageView(MethodView):
         if key is None:
             flask.abort(404)
 
+        # representation is negotiated before conditional checks, as
+        # validators are representation specific
+        kwargs = dict()
+        headers = {'Content-Type': 'application/json'}
+        quantization = None
+        if self.quantizable:
+            headers['Vary'] = 'Accept'
+            quantization = _get_quantization()
+        if quantization:
+            kwargs['quantization'] = quantization
+            headers['Content-Type'] = QUANTIZED_MIMETYPE
+
         obj, metadata = self.model.get(key)
-        data = self.model.as_json(obj)
 
-        headers = {'Content-Type': 'application/json'}
-        if 'etag' in metadata:
-            headers['ETag'] = ETags([metadata['etag']])
-            # check if-none-match
-            if request.if_none_match.contains(metadata['etag']):
-                return flask.Response(status=304)
+        etag = metadata.get('etag', None)
+        if etag is not None:
+            if quantization:
+                etag = '%s-q%d' % (etag, quantization)
+            headers['ETag'] = ETags([etag])
+            # check if-none-match, on the compressed representation too
+            if request.if_none_match.contains(etag):
+                return not_modified(headers)
+            encoding = get_encoding()
+            if encoding is not None and \
+                    request.if_none_match.contains(encoded_etag(etag,
+                                                                encoding)):
+                headers['ETag'] = ETags([encoded_etag(etag, encoding)])
+                return not_modified(headers)
 
         if 'last_modified' in metadata:
             headers['Last-Modified'] = http_date(metadata['last_modified'])
             # check if-not-modified
             if request.if_modified_since \
                     and request.if_modified_since >= metadata['last_modified']:
-                return flask.Response(status=304)
-        return data, 200, headers
+                return not_modified(headers)
+
+        # a revision is immutable, so is its compressed representation
+        if etag is not None:
+            cache_key = (request.endpoint, key, etag)
+        else:
+            cache_key = None
+        response = cached_response(cache_key, headers)
+        if response is not None:
+            return response
+
+        # encode only when the representation is actually sent
+        if current_app.config.get('STREAMING_RESPONSE', False):
+            data = self.model.iter_json(obj, **kwargs)
+        else:
+            data = self.model.as_json(obj, **kwargs)
+        return make_response(data, headers, cache_key=cache_key)
 
     def put(self, key=None):
         if key is None:
@@ -107,13 +147,115 @@ class StorageView(MethodView):
         return obj
 
 
+QUANTIZED_MIMETYPE = 'application/vnd.georest.quantized+json'
+MAX_QUANTIZATION = 1 << 31
+
+
+def _get_quantization():
+    """parse quantize=n query argument, or QUANTIZATION if quantized
+    representation is preferred by Accept header, None if not requested"""
+    quantization = request.args.get('quantize', None)
+    if quantization is None:
+        accept = request.accept_mimetypes
+        if accept.quality(QUANTIZED_MIMETYPE) > \
+                accept.quality('application/json'):
+            return current_app.config.get('QUANTIZATION', 100000)
+        return None
+    try:
+        quantization = int(quantization)
+    except ValueError:
+        raise InvalidRequest('quantize %s cannot convert to integer' % \
+                             quantization)
+    if not 2 <= quantization <= MAX_QUANTIZATION:
+        raise InvalidRequest('quantize must be between 2 and %d' % \
+                             MAX_QUANTIZATION)
+    return quantization
+
+
+def _get_bbox():
+    """parse bbox=minx,miny,maxx,maxy query argument"""
+    bbox = request.args.get('bbox', '')
+    try:
+        minx, miny, maxx, maxy = map(float, bbox.split(','))
+    except ValueError:
+        raise InvalidRequest('Invalid bbox %r, want minx,miny,maxx,maxy' % \
+                             bbox)
+    if minx > maxx or miny > maxy:
+        raise InvalidRequest('Invalid bbox %r, min greater than max' % bbox)
+    return minx, miny, maxx, maxy
+
+
+def _get_limit():
+    """parse limit query argument, capped by QUERY_LIMIT"""
+    max_limit = current_app.config.get('QUERY_LIMIT', 1000)
+    limit = request.args.get('limit', None)
+    if limit is None:
+        return max_limit
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise InvalidRequest('limit %s cannot convert to integer' % limit)
+    if limit <= 0:
+        raise InvalidRequest('limit must be positive')
+    return min(limit, max_limit)
+
+
+def _get_float(name):
+    value = request.args.get(name, '')
+    try:
+        return float(value)
+    except ValueError:
+        raise InvalidRequest('%s %r cannot convert to float' % (name, value))
+
+
+def _get_point():
+    """parse near=x,y&srid=srid query arguments as a point geometry"""
+    near = request.args.get('near', '')
+    try:
+        x, y = map(float, near.split(','))
+    except ValueError:
+        raise InvalidRequest('Invalid near %r, want x,y' % near)
+    srid = request.args.get('srid', '4326')
+    try:
+        srid = int(srid)
+    except ValueError:
+        raise InvalidRequest('srid %s cannot convert to integer' % srid)
+    return geo.Geometry.build_geometry('POINT (%r %r)' % (x, y), srid=srid)
+
+
 class Features(StorageView):
-    pass
+    quantizable = True
+
+    def get(self, key=None):
+        if key is None:
+            if 'bbox' in request.args:
+                return self._query(self.model.query_bbox, _get_bbox())
+            if 'geohash' in request.args:
+                return self._query(self.model.query_geohash,
+                                   request.args['geohash'])
+            if 'near' in request.args:
+                distance = _get_float('distance')
+                if distance < 0:
+                    raise InvalidRequest('distance must not be negative')
+                return self._query(self.model.query_distance,
+                                   _get_point(), distance)
+        return StorageView.get(self, key)
+
+    def _query(self, method, *args):
+        features, cursor = method(
+            *args,
+            bucket=request.args.get('bucket', None),
+            limit=_get_limit(),
+            cursor=request.args.get('cursor', None))
+        return flask.Response(self.model.iter_collection_json(features,
+                                                              cursor),
+                              status=200,
+                              headers={'Content-Type': 'application/json'})
 
 
 class Geometry(StorageView):
+    quantizable = True
     delete = None  # only delete feature allowed
-    pass
 
 
 class Properties(StorageView):
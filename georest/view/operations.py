@@ -16,13 +16,16 @@ from werkzeug.datastructures import ETags
 import flask
 from flask import request
 from flask import current_app
+from flask import stream_with_context
 from flask.views import MethodView
 from flask.json import jsonify
 
 from .. import geo
+from ..geo import jsonhelper as json
 
 from .exceptions import InvalidRequest
 from .utils import get_json_content, catcher
+from .compression import make_response, cached_response
 
 
 def _split_arg_list(arg_list):
@@ -93,18 +96,39 @@ class Operations(MethodView):
             return jsonify(self.operations_model.describe_operation(op_name))
         geoms = self._load_geoms(arg_list)
         kwargs = _get_kwargs()
+        headers = {'Content-Type': 'application/json'}
+
+        cache_key = self._get_cache_key(op_name, geoms, kwargs)
+        response = cached_response(cache_key, headers)
+        if response is not None:
+            return response
+
         result = self.operations_model.invoke(op_name, *geoms, **kwargs)
-        return result.json(), 200, {'Content-Type': 'application/json'}
+        return make_response(result.json(), headers, cache_key=cache_key)
 
     def post(self, op_name=None, arg_list=None):
         if op_name is None or arg_list is None:
             flask.abort(404)
         data = get_json_content()
-        geom = geo.Geometry.build_geometry(data)
+        geom = geo.Geometry.build_geometry(
+            data, validate=geo.Geometry.VALIDATE_STRICT)
         geoms = self._load_geoms(arg_list, geom)
         kwargs = _get_kwargs()
         result = self.operations_model.invoke(op_name, *geoms, **kwargs)
-        return result.json(), 200, {'Content-Type': 'application/json'}
+        return make_response(result.json(),
+                             {'Content-Type': 'application/json'})
+
+    def _get_cache_key(self, op_name, geoms, kwargs):
+        """key of the compressed result, results are only cached when
+        operation results are cached and all inputs are stored geometries,
+        whose revisions make the result immutable"""
+        if self.operations_model.result_cache is None:
+            return None
+        inputs = tuple(geom.cache_key for geom in geoms)
+        # unversioned geometries may change under the same key
+        if any(k is None or k[1] is None for k in inputs):
+            return None
+        return ('operations', op_name, tuple(sorted(kwargs.items())), inputs)
 
     def _load_geoms(self, arg_list, input_geom=None):
         geoms = []
@@ -121,8 +145,11 @@ class Operations(MethodView):
                 except (IndexError, TypeError):
                     raise InvalidRequest(
                         'literal token ~.%s is invalid' % token)
-                sub_geom = geo.Geometry.build_geometry(sub_geom,
-                                                       srid=input_geom.crs.srid)
+                # members of a valid geometry are valid
+                sub_geom = geo.Geometry.build_geometry(
+                    sub_geom,
+                    srid=input_geom.crs.srid,
+                    validate=geo.Geometry.VALIDATE_SKIP)
                 geoms.append(sub_geom)
             else:
                 geom, metadata = self.geometry_model.get(token)
@@ -131,6 +158,160 @@ class Operations(MethodView):
         return geoms
 
 
+def _get_pipeline_steps():
+    """parse pipeline steps from request args
+
+    Operation names are listed in `steps` split by comma, arguments of an
+    operation are prefixed by its index in the pipeline, eg:
+    `steps=buffer,simplify,area&0.distance=1&1.tolerance=0.1`.
+    """
+    kwargs = _get_kwargs()
+    try:
+        names = kwargs.pop('steps')
+    except KeyError:
+        raise InvalidRequest('Pipeline steps are required')
+    steps = list((name, {}) for name in names.split(','))
+
+    for k in list(kwargs):
+        index, dot, name = k.partition('.')
+        if not dot:
+            # pipeline argument, eg: srid
+            continue
+        if name == 'srid':
+            # geometries are transformed once before the first step
+            raise InvalidRequest('srid applies to the whole pipeline, '
+                                 'use srid instead of %s' % k)
+        try:
+            _, op_kwargs = steps[int(index)]
+        except (ValueError, IndexError):
+            raise InvalidRequest('Arg %s is not a valid step argument' % k)
+        op_kwargs[name] = kwargs.pop(k)
+    return steps, kwargs
+
+
+def _iter_batch_geoms():
+    """generate geometries from batch request content
+
+    Accepts a GeoJson FeatureCollection or GeometryCollection as
+    "application/json", or one geometry per line as "application/x-ndjson",
+    which is read lazily from the request stream.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                line = line.decode('utf-8')
+            except UnicodeError:
+                raise InvalidRequest('Cannot decode content with utf-8')
+            yield geo.Geometry.build_geometry(
+                line, validate=geo.Geometry.VALIDATE_STRICT)
+        return
+
+    data = get_json_content()
+    try:
+        literal = json.loads(data, precise_float=True)
+    except ValueError as e:
+        raise InvalidRequest('Invalid json content: %s' % e)
+
+    if not isinstance(literal, dict):
+        raise InvalidRequest('Expecting a FeatureCollection or '
+                             'GeometryCollection')
+    if literal.get('crs'):
+        srid = geo.SpatialReference.build_from_geojson_crs(
+            literal['crs']).srid
+    else:
+        srid = 4326
+
+    if literal.get('type') == 'FeatureCollection':
+        members = (f.get('geometry') if isinstance(f, dict) else None
+                   for f in literal.get('features', []))
+    elif literal.get('type') == 'GeometryCollection':
+        members = iter(literal.get('geometries', []))
+    else:
+        raise InvalidRequest('Expecting a FeatureCollection or '
+                             'GeometryCollection')
+
+    for member in members:
+        if not member:
+            raise InvalidRequest('Batch member has no geometry')
+        yield geo.Geometry.build_geometry(
+            member, srid=srid, validate=geo.Geometry.VALIDATE_STRICT)
+
+
+class Pipeline(Operations):
+    """invoke a chain of operations in one request"""
+
+    def get(self, arg_list=None):
+        steps, kwargs = _get_pipeline_steps()
+        geoms = self._load_geoms(arg_list)
+        result = self.operations_model.invoke_pipeline(steps, *geoms,
+                                                       **kwargs)
+        return make_response(result.json(),
+                             {'Content-Type': 'application/json'})
+
+    def post(self, arg_list=None):
+        steps, kwargs = _get_pipeline_steps()
+        data = get_json_content()
+        geom = geo.Geometry.build_geometry(
+            data, validate=geo.Geometry.VALIDATE_STRICT)
+        geoms = self._load_geoms(arg_list, geom)
+        result = self.operations_model.invoke_pipeline(steps, *geoms,
+                                                       **kwargs)
+        return make_response(result.json(),
+                             {'Content-Type': 'application/json'})
+
+
+class BatchOperations(MethodView):
+    """apply one operation to a batch of geometries
+
+    Results are returned in order as `{"results": [...]}`, or when `stream`
+    is set, as newline delimited `{"result": ...}` objects written while
+    the batch is processed.  An extra geometry may be given by key using
+    `other`, which is passed as the second argument of binary operations.
+    """
+
+    decorators = [catcher]
+
+    def __init__(self, operations_model, geometry_model):
+        self.operations_model = operations_model
+        self.geometry_model = geometry_model
+
+    def post(self, op_name):
+        kwargs = _get_kwargs()
+        stream = _str2bool(kwargs.pop('stream', ''))
+        args = []
+        if 'other' in kwargs:
+            other, metadata = self.geometry_model.get(kwargs.pop('other'))
+            args.append(other)
+
+        results = self.operations_model.invoke_batch(
+            op_name, _iter_batch_geoms(), *args, **kwargs)
+
+        if stream:
+            return flask.Response(stream_with_context(_stream_results(results)),
+                                  status=200,
+                                  mimetype='application/x-ndjson')
+
+        data = '{"results":[%s]}' % ','.join(r.value_json() for r in results)
+        return data, 200, {'Content-Type': 'application/json'}
+
+
+def _stream_results(results):
+    try:
+        for result in results:
+            yield result.json()
+            yield '\n'
+    except geo.GeoException as e:
+        # too late to change response status, report the error and stop
+        code = getattr(e, 'HTTP_STATUS_CODE', 500)
+        yield json.dumps(dict(code=code,
+                              message=str(e),
+                              exception=e.__class__.__name__))
+        yield '\n'
+
+
 class Attributes(MethodView):
     """get all useful attributes at once"""
 
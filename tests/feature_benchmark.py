@@ -0,0 +1,67 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+""" Benchmark reading features from the storage
+
+Compares building a `Feature` eagerly from a stored `FeatureMapper`, with
+the `LazyFeature` built by `make_feature_from_mapper()`, for requests
+reading only properties and requests encoding the whole feature.
+
+"""
+
+import time
+import gc
+
+from georest.geo import Feature, Geometry, SpatialReference, Metadata, Key
+from georest.storage.entry import make_feature_from_mapper, \
+    make_mapper_from_feature
+
+
+def make_feature_eagerly(key, mapper):
+    """Feature builder before LazyFeature, as make_feature_from_mapper()
+    was: new spatial references and a validated geometry for each feature"""
+    crs = SpatialReference(srid=mapper.srid)
+    metadata = Metadata(**mapper.metadata)
+    properties = dict(mapper.properties)
+    geometry = Geometry.build_geometry(mapper.wkt, srid=mapper.srid)
+    # build_geometry() created its own spatial reference too
+    geometry._the_crs = SpatialReference(srid=mapper.srid)
+    return Feature(key, geometry, crs, properties, metadata)
+
+
+def make_mapper(vertices=1000, properties=100):
+    coords = ', '.join('%f %f' % (i * 0.01, (i % 7) * 0.01)
+                       for i in range(vertices))
+    feature = Feature.build_from_geometry(
+        'LINESTRING (%s)' % coords,
+        key=Key.make_key(bucket='bench', name='feature'),
+        properties=dict(('prop%d' % i, 'value %d' % i)
+                        for i in range(properties)))
+    return make_mapper_from_feature(feature)
+
+
+def benchmark(name, builder, reader, mapper, iteration=1000):
+    key = Key.make_key(bucket='bench', name='feature')
+    tic = time.time()
+    for i in range(iteration):
+        reader(builder(key, mapper))
+    tac = time.time() - tic
+    print '%s: %d features in %f seconds.' % (name, iteration, tac)
+
+
+def main():
+    gc.disable()
+    mapper = make_mapper()
+
+    for builder_name, builder in [('eager', make_feature_eagerly),
+                                  ('lazy', make_feature_from_mapper)]:
+        benchmark('%s, properties only' % builder_name, builder,
+                  lambda feature: feature.properties, mapper)
+        benchmark('%s, geojson' % builder_name, builder,
+                  lambda feature: feature.geojson, mapper)
+
+
+if __name__ == '__main__':
+    main()
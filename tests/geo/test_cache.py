@@ -0,0 +1,56 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+import unittest
+
+from georest.geo.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = LRUCache(max_items=2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        description = cache.describe()
+        self.assertEqual(description['hits'], 1)
+        self.assertEqual(description['misses'], 1)
+        self.assertEqual(description['hit_rate'], 0.5)
+
+    def test_evict_lru(self):
+        cache = LRUCache(max_items=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_items=10, max_bytes=10, sizeof=len)
+        cache.put('a', 'x' * 6)
+        cache.put('b', 'x' * 6)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.describe()['bytes'], 6)
+        cache.put('c', 'x' * 11)
+        self.assertNotIn('c', cache)
+
+    def test_configure(self):
+        cache = LRUCache(max_items=10)
+        for i in range(10):
+            cache.put(i, i)
+        cache.configure(max_items=3)
+        self.assertEqual(len(cache), 3)
+        self.assertIn(9, cache)
+
+    def test_get_or_create(self):
+        cache = LRUCache()
+        self.assertEqual(cache.get_or_create('a', lambda: 1), 1)
+        self.assertEqual(cache.get_or_create('a', lambda: 2), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
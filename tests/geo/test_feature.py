@@ -6,9 +6,12 @@ __date__ = '6/7/14'
 import unittest
 import json
 import pickle
+import base64
 
-from georest.geo.feature import Feature
+from georest.geo.feature import Feature, LazyFeature
+from georest.geo.jsonhelper import JsonObject
 from georest.geo.geometry import Geometry
+from georest.geo.spatialref import SpatialReference
 from georest.geo.exceptions import InvalidFeature, InvalidGeoJsonInput, \
     InvalidGeometry, InvalidProperties
 
@@ -89,6 +92,58 @@ class TestFeature(unittest.TestCase):
             self.assertEqual(feature2.metadata, feature.metadata)
             self.assertTrue(feature2.equals(feature))
 
+    def test_pickle_version(self):
+        feature = Feature.build_from_geometry('POINT (1 2)',
+                                              properties=dict(x=1))
+        state = feature.__getstate__()
+        self.assertEqual(state[0], Feature.PICKLE_VERSION)
+        for protocol in [0, 2]:
+            feature2 = pickle.loads(pickle.dumps(feature, protocol))
+            self.assertTrue(feature2.equals(feature))
+            self.assertEqual(feature2.key, feature.key)
+            self.assertEqual(feature2.metadata, feature.metadata)
+            self.assertIs(feature2.crs, SpatialReference.make_spatialref(4326))
+            self.assertIs(feature2.geometry.crs, feature2.crs)
+
+        self.assertRaises(InvalidFeature, feature2.__setstate__,
+                          (99,) + state[1:])
+
+    def test_pickle_legacy(self):
+        # Feature('POINT (1 2)', key='foo.bar', properties={...}) pickled
+        # in legacy state format using protocol 0 and 2
+        legacy = [
+            'Y2NvcHlfcmVnCl9yZWNvbnN0cnVjdG9yCnAwCihjZ2VvcmVzdC5nZW8uZmVhdHVyZQpG'
+            'ZWF0dXJlCnAxCmNfX2J1aWx0aW5fXwpvYmplY3QKcDIKTnRwMwpScDQKKGcwCihjZ2Vv'
+            'cmVzdC5nZW8ua2V5CktleQpwNQpjX19idWlsdGluX18KdHVwbGUKcDYKKFMnZm9vJwpw'
+            'NwpTJ2JhcicKcDgKdHA5CnRwMTAKUnAxMQpTJ1x4MDFceDAxXHgwMFx4MDBceDAwXHgw'
+            'MFx4MDBceDAwXHgwMFx4MDBceDAwXHhmMD9ceDAwXHgwMFx4MDBceDAwXHgwMFx4MDBc'
+            'eDAwQCcKcDEyCmcwCihjZ2VvcmVzdC5nZW8uc3BhdGlhbHJlZgpTcGF0aWFsUmVmZXJl'
+            'bmNlCnAxMwpnMgpOdHAxNApScDE1Ckk0MzI2CmIoZHAxNgpTJ3gnCnAxNwpJMQpzUydu'
+            'YW1lJwpwMTgKVnNub3cKcDE5CnNnMAooY2dlb3Jlc3QuZ2VvLm1ldGFkYXRhCk1ldGFk'
+            'YXRhCnAyMApnNgooKGxwMjEKRjEuMAphRjIuMAphRjEuMAphRjIuMAphUydzMDJlcXUw'
+            'NHZlbjAnCnAyMgoobHAyMwpJMTcyOTY5NTU2MDAxMDU2MzU4NAphdHAyNAp0cDI1ClJw'
+            'MjYKdHAyNwpiLg==',
+            'gAJjZ2VvcmVzdC5nZW8uZmVhdHVyZQpGZWF0dXJlCnEAKYFxAShjZ2VvcmVzdC5nZW8u'
+            'a2V5CktleQpxAlUDZm9vcQNVA2JhcnEEhnEFgXEGVRUBAQAAAAAAAAAAAPA/AAAAAAAA'
+            'AEBxB2NnZW9yZXN0Lmdlby5zcGF0aWFscmVmClNwYXRpYWxSZWZlcmVuY2UKcQgpgXEJ'
+            'TeYQYn1xCihVAXhxC0sBVQRuYW1lcQxYBAAAAHNub3dxDXVjZ2VvcmVzdC5nZW8ubWV0'
+            'YWRhdGEKTWV0YWRhdGEKcQ5dcQ8oRz/wAAAAAAAAR0AAAAAAAAAARz/wAAAAAAAAR0AA'
+            'AAAAAAAAZVUMczAyZXF1MDR2ZW4wcRBdcRFJMTcyOTY5NTU2MDAxMDU2MzU4NAphh3ES'
+            'gXETdHEUYi4=',
+        ]
+        expected = Feature.build_from_geometry('POINT (1 2)',
+                                               properties=dict(x=1,
+                                                               name=u'snow'))
+        for data in legacy:
+            feature = pickle.loads(base64.b64decode(data))
+            self.assertTrue(feature.equals(expected))
+            self.assertEqual(feature.key.qualified_name, 'foo.bar')
+            self.assertEqual(feature.metadata, expected.metadata)
+            self.assertEqual(feature.crs.srid, 4326)
+            # repickled in current format
+            state = pickle.loads(pickle.dumps(feature)).__getstate__()
+            self.assertEqual(state[0], Feature.PICKLE_VERSION)
+
     def test_update_geometry(self):
         feature1 = Feature.build_from_geometry('POINT (1 2)',
                                                properties=dict(x=1, y=2))
@@ -98,5 +153,62 @@ class TestFeature(unittest.TestCase):
         self.assertNotEqual(metadata1, metadata2)
 
 
+class TestLazyFeature(unittest.TestCase):
+    def setUp(self):
+        self.feature = Feature.build_from_geometry(
+            'LINESTRING (1 2, 3 4)', properties=dict(x=1, y=[2, 3]))
+        self.stored = dict(self.feature.properties)
+        self.lazy = LazyFeature(self.feature.key, self.feature.geometry.wkb,
+                                4326, self.stored, self.feature.metadata)
+
+    def test_lazy_decode(self):
+        self.assertEqual(self.lazy.properties, self.stored)
+        self.assertIsNone(self.lazy._geometry)
+        self.assertIsNone(self.lazy._crs)
+        self.assertEqual(self.lazy.crs.srid, 4326)
+        self.assertTrue(self.lazy.geometry.equals(self.feature.geometry))
+        self.assertEqual(self.lazy.geometry.crs.srid, 4326)
+        self.assertTrue(self.lazy.equals(self.feature))
+
+        # properties are copied from storage on access
+        self.lazy.properties['x'] = 2
+        self.assertEqual(self.stored['x'], 1)
+
+    def test_geojson(self):
+        self.assertEqual(json.loads(self.lazy.geojson),
+                         json.loads(self.feature.geojson))
+        # encoding does not copy properties
+        self.assertIsNone(self.lazy._properties)
+
+    def test_update(self):
+        self.lazy.geometry = Geometry.build_geometry('POINT (3 4)')
+        self.assertEqual(self.lazy.geometry.wkt, 'POINT (3 4)')
+        self.assertNotEqual(self.lazy.metadata, self.feature.metadata)
+
+    def test_pickle(self):
+        lazy = pickle.loads(pickle.dumps(self.lazy))
+        self.assertTrue(lazy.equals(self.feature))
+        self.assertEqual(lazy.metadata, self.feature.metadata)
+
+    def test_json_properties(self):
+        text = '{"x": 1, "y": [2, 3]}'
+        lazy = LazyFeature(self.feature.key, self.feature.geometry.wkb,
+                           4326, JsonObject(text), self.feature.metadata)
+        # stored json is passed through as is
+        self.assertEqual(lazy.dump_properties(), text)
+        self.assertIs(lazy.read_properties().text, text)
+        self.assertEqual(json.loads(lazy.geojson),
+                         json.loads(self.feature.geojson))
+
+        self.assertEqual(lazy.properties, self.stored)
+        lazy.properties['x'] = 2
+        self.assertEqual(json.loads(lazy.dump_properties()),
+                         dict(x=2, y=[2, 3]))
+        self.assertEqual(lazy.read_properties(), dict(x=2, y=[2, 3]))
+
+        lazy = pickle.loads(pickle.dumps(lazy, 2))
+        self.assertEqual(lazy.properties, dict(x=2, y=[2, 3]))
+
+
 if __name__ == '__main__':
     unittest.main()
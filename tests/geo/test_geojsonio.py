@@ -0,0 +1,269 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+import unittest
+import json
+
+import shapely.geometry
+
+from georest.geo import Geometry, Feature
+from georest.geo.geojsonio import iter_geometry, buffered, read_geometry, \
+    split_feature_collection, split_lines, Quantizer
+from georest.geo.exceptions import InvalidGeometry, InvalidGeoJsonInput
+
+from tests.geo.data import jsondata, pydata
+
+
+class TestGeoJsonEncoder(unittest.TestCase):
+    def test_same_as_mapping(self):
+        for k, v in jsondata.iteritems():
+            geometry = Geometry.build_geometry(v)
+            expected = json.loads(json.dumps(
+                shapely.geometry.mapping(geometry)))
+            self.assertEqual(json.loads(''.join(iter_geometry(geometry))),
+                             expected)
+
+    def test_3d(self):
+        geometry = shapely.geometry.LineString([(1, 2, 3), (4, 5, 6)])
+        self.assertEqual(json.loads(''.join(iter_geometry(geometry))),
+                         {'type': 'LineString',
+                          'coordinates': [[1, 2, 3], [4, 5, 6]]})
+
+    def test_empty(self):
+        for geometry in [shapely.geometry.Point(),
+                         shapely.geometry.LineString(),
+                         shapely.geometry.Polygon(),
+                         shapely.geometry.GeometryCollection()]:
+            literal = json.loads(''.join(iter_geometry(geometry)))
+            self.assertEqual(literal['type'], geometry.geom_type)
+            self.assertEqual(literal.get('coordinates',
+                                         literal.get('geometries')), [])
+
+    def test_precision(self):
+        geometry = shapely.geometry.Point(0.123456789, 1)
+        self.assertEqual(''.join(iter_geometry(geometry, double_precision=3)),
+                         '{"type":"Point","coordinates":[0.123,1.0]}')
+
+    def test_crs(self):
+        geometry = Geometry.build_geometry('POINT(1 2)', srid=3857)
+        literal = json.loads(geometry.geojson)
+        self.assertEqual(literal['crs']['properties']['name'],
+                         'EPSG:3857')
+        geometry = Geometry.build_geometry('POINT(1 2)', srid=4326)
+        self.assertNotIn('crs', json.loads(geometry.geojson))
+
+    def test_chunks(self):
+        geometry = Geometry.build_geometry(
+            shapely.geometry.MultiPoint([(i, i) for i in range(1000)]))
+        chunks = list(geometry.iter_geojson(chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), geometry.geojson)
+        self.assertEqual(list(buffered(['a', 'b', 'c'], 2)), ['ab', 'c'])
+
+    def test_large_sequence(self):
+        coords = [(i * 0.5, -i * 0.25) for i in range(10000)]
+        geometry = Geometry.build_geometry(
+            shapely.geometry.LineString(coords))
+        # huge sequence is chunked too
+        chunks = list(geometry.iter_geojson(chunk_size=4096))
+        self.assertGreater(len(chunks), 2)
+        self.assertLess(max(len(c) for c in chunks), 4096 * 24)
+        self.assertEqual(json.loads(''.join(chunks))['coordinates'],
+                         list(map(list, coords)))
+
+    def test_feature(self):
+        feature = Feature.build_from_geojson(
+            '{"type":"Feature","geometry":{"type":"Point",'
+            '"coordinates":[1,2]},"properties":{"a":1.5}}')
+        literal = json.loads(feature.geojson)
+        self.assertEqual(literal['type'], 'Feature')
+        self.assertEqual(literal['id'], feature.key.qualified_name)
+        self.assertEqual(literal['geometry'],
+                         json.loads(feature.geometry.geojson))
+        self.assertEqual(literal['properties'], feature.properties)
+
+
+class TestGeoJsonReader(unittest.TestCase):
+    def test_same_as_shape(self):
+        for k, v in pydata.iteritems():
+            geometry = read_geometry(v)
+            self.assertEqual(geometry.geom_type, v['type'])
+            expected = shapely.geometry.shape(v) \
+                if k != 'geometrycollection' else None
+            if expected is not None:
+                self.assertTrue(geometry.equals(expected))
+            # round trip
+            self.assertEqual(json.loads(''.join(iter_geometry(geometry))), v)
+
+    def test_geo_interface(self):
+        geometry = shapely.geometry.Polygon([(0, 0), (1, 0), (1, 1), (0, 1)],
+                                            [[(.2, .2), (.5, .2), (.5, .5)]])
+        self.assertTrue(read_geometry(geometry.__geo_interface__).equals(
+            geometry))
+
+    def test_3d(self):
+        geometry = read_geometry({'type': 'LineString',
+                                  'coordinates': [[1, 2, 3], [4, 5, 6]]})
+        self.assertTrue(geometry.has_z)
+        self.assertEqual(list(geometry.coords), [(1, 2, 3), (4, 5, 6)])
+
+    def test_empty(self):
+        for geom_type in ['Point', 'LineString', 'Polygon', 'MultiPoint',
+                          'MultiLineString', 'MultiPolygon']:
+            geometry = read_geometry({'type': geom_type, 'coordinates': []})
+            self.assertTrue(geometry.is_empty)
+
+    def test_invalid_structure(self):
+        for literal in [
+            [],
+            {},
+            {'type': 'Snow', 'coordinates': [1, 2]},
+            {'type': 'Point'},
+            {'type': 'Point', 'coordinates': [1]},
+            {'type': 'Point', 'coordinates': [1, 2, 3, 4]},
+            {'type': 'LineString', 'coordinates': [[1, 2]]},
+            {'type': 'Polygon', 'coordinates': [[[1, 2], [3, 4]]]},
+            {'type': 'GeometryCollection', 'geometries': None},
+            {'type': 'GeometryCollection', 'geometries': [{}]},
+        ]:
+            self.assertRaises(InvalidGeometry, read_geometry, literal)
+
+    def test_invalid_coordinates(self):
+        for literal in [
+            {'type': 'Point', 'coordinates': 'blah'},
+            {'type': 'Point', 'coordinates': ['x', 'y']},
+            {'type': 'LineString', 'coordinates': [[1, 2], [3]]},
+            {'type': 'LineString', 'coordinates': [1, 2]},
+            {'type': 'Polygon', 'coordinates': [[1, 2]]},
+            {'type': 'MultiPolygon', 'coordinates': [1]},
+        ]:
+            self.assertRaises(ValueError, read_geometry, literal)
+
+
+def decode_sequence(positions, transform):
+    x = y = 0
+    result = list()
+    for dx, dy in positions:
+        x += dx
+        y += dy
+        result.append((x * transform['scale'][0] + transform['translate'][0],
+                       y * transform['scale'][1] + transform['translate'][1]))
+    return result
+
+
+class TestQuantizer(unittest.TestCase):
+    def test_round_trip(self):
+        geometry = Geometry.build_geometry(
+            'POLYGON ((0 0, 10 0, 10 5, 0 5, 0 0), (1 1, 2 1, 2 2, 1 1))')
+        literal = json.loads(''.join(geometry.iter_geojson(
+            quantization=1001)))
+        transform = literal['transform']
+        self.assertEqual(transform, {'scale': [0.01, 0.005],
+                                     'translate': [0, 0]})
+        exterior, interior = literal['coordinates']
+        self.assertEqual(exterior[:2], [[0, 0], [1000, 0]])
+        for quantized, ring in [(exterior, geometry.exterior),
+                                (interior, geometry.interiors[0])]:
+            for p1, p2 in zip(decode_sequence(quantized, transform),
+                              ring.coords):
+                self.assertAlmostEqual(p1[0], p2[0], places=6)
+                self.assertAlmostEqual(p1[1], p2[1], places=6)
+
+    def test_point(self):
+        geometry = Geometry.build_geometry('MULTIPOINT (1 2 3, 4 6 0)')
+        literal = json.loads(''.join(iter_geometry(geometry,
+                                                   quantization=4)))
+        # points are not delta encoded, z is dropped
+        self.assertEqual(literal['coordinates'], [[0, 0], [3, 3]])
+        self.assertEqual(literal['transform']['translate'], [1, 2])
+        self.assertEqual(literal['transform']['scale'][0], 1)
+        self.assertAlmostEqual(literal['transform']['scale'][1], 4. / 3)
+
+        geometry = Geometry.build_geometry('POINT (1 2)')
+        literal = json.loads(''.join(iter_geometry(geometry,
+                                                   quantization=4)))
+        self.assertEqual(literal['coordinates'], [0, 0])
+
+        quantizer = Quantizer([], 4)
+        self.assertEqual(quantizer.dump_sequence(
+            shapely.geometry.LineString().coords), '[]')
+
+    def test_feature(self):
+        feature = Feature.build_from_geometry('LINESTRING (0 0, 2 1, 1 1)')
+        literal = json.loads(''.join(feature.iter_geojson(quantization=3)))
+        self.assertEqual(literal['transform'], {'scale': [1, 0.5],
+                                                'translate': [0, 0]})
+        self.assertNotIn('transform', literal['geometry'])
+        self.assertEqual(literal['geometry']['coordinates'],
+                         [[0, 0], [2, 2], [-1, 0]])
+
+
+class TestSplitters(unittest.TestCase):
+    def setUp(self):
+        feature = {'type': 'Feature',
+                   'properties': {'a': '}{"[', 'features': [1]},
+                   'geometry': {'type': 'Point', 'coordinates': [1, 2]}}
+        self.features = list(dict(feature, id=n) for n in range(5))
+        self.crs = {'type': 'name', 'properties': {'name': 'EPSG:3857'}}
+        # members in order, crs precedes features
+        self.collection = '{"type":"FeatureCollection","crs":%s,' \
+                          '"features":%s,"bbox":[1,2,1,2]}' % \
+                          (json.dumps(self.crs), json.dumps(self.features))
+
+    def _split(self, data, size):
+        chunks = (data[i:i + size] for i in range(0, len(data), size))
+        return list(split_feature_collection(chunks))
+
+    def test_split_collection(self):
+        data = self.collection
+        for size in [1, 2, 7, 64, len(data)]:
+            texts = self._split(data, size)
+            self.assertEqual(list(json.loads(text) for text in texts),
+                             list(dict(feature, crs=self.crs)
+                                  for feature in self.features))
+
+    def test_split_collection_crs(self):
+        own = {'type': 'name', 'properties': {'name': 'EPSG:4326'}}
+        data = '{"crs" : %s , "features":[{"type":"Feature"},{}, ' \
+               '{"crs":%s}]}' % (json.dumps(self.crs), json.dumps(own))
+        for size in [1, 3, len(data)]:
+            texts = self._split(data, size)
+            self.assertEqual(list(json.loads(text) for text in texts),
+                             [{'type': 'Feature', 'crs': self.crs},
+                              {'crs': self.crs},
+                              {'crs': own}])
+        # no crs, or null crs
+        self.assertEqual(self._split('{"features":[{}]}', 1), ['{}'])
+        self.assertEqual(self._split('{"crs":null,"features":[{}]}', 1),
+                         ['{}'])
+        # crs after features can't be applied to features already read
+        self.assertRaises(InvalidGeoJsonInput, self._split,
+                          '{"features":[],"crs":%s}' % json.dumps(self.crs),
+                          100)
+
+    def test_split_collection_members(self):
+        # every member yields a text, so results keep their index
+        self.assertEqual(self._split('{"features":[{"a":1}, 5 ,"x",[],'
+                                     'null,{"b":[2]}]}', 3),
+                         ['{"a":1}', '5', '"x"', '[]', 'null', '{"b":[2]}'])
+        self.assertEqual(self._split('{"features":[{},]}', 1), ['{}', ''])
+        self.assertEqual(self._split('{"features":[ ]}', 1), [])
+
+    def test_split_collection_invalid(self):
+        self.assertEqual(list(split_feature_collection(['{"features":[]}'])),
+                         [])
+        for data in ['', '[]', '{"type":"FeatureCollection"}',
+                     '{"features":[{}', '{"features":[}}',
+                     self.collection[:-10]]:
+            self.assertRaises(InvalidGeoJsonInput, list,
+                              split_feature_collection([data]))
+
+    def test_split_lines(self):
+        self.assertEqual(list(split_lines(['a\nb', 'c\n\n', ' \nd'])),
+                         ['a', 'bc', 'd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,8 +11,9 @@ import json
 
 from georest.geo.exceptions import InvalidGeometry, InvalidSpatialReference, \
     InvalidGeoJsonInput
-from georest.geo.geometry import Geometry, \
-    create_geometrycollection_from_geojson
+from georest.geo.geometry import Geometry, sniff_geometry_format, \
+    PARSER_STATS, VALIDATION_STATS
+from georest.geo.geojsonio import read_geometry
 from georest.geo.spatialref import SpatialReference
 
 from tests.geo.data import jsondata, pydata
@@ -123,6 +124,59 @@ class TestBuildGeometry(unittest.TestCase):
         self.assertTrue(geom2.crs.equals(SpatialReference(srid=4326)))
 
 
+class TestValidationPolicy(unittest.TestCase):
+    def setUp(self):
+        self.invalid = 'POLYGON((0 0, 1 0, 0 1, 1 1, 0 0))'
+
+    def test_strict(self):
+        self.assertRaises(InvalidGeometry, Geometry.build_geometry,
+                          self.invalid, validate=Geometry.VALIDATE_STRICT)
+
+    def test_skip(self):
+        skipped = VALIDATION_STATS.describe()['skipped']
+        geom = Geometry.build_geometry(self.invalid,
+                                       validate=Geometry.VALIDATE_SKIP)
+        self.assertFalse(geom.is_valid)
+        geom.check_validity()
+        self.assertEqual(VALIDATION_STATS.describe()['skipped'], skipped + 1)
+
+    def test_lazy(self):
+        geom = Geometry.build_geometry(self.invalid,
+                                       validate=Geometry.VALIDATE_LAZY)
+        self.assertRaises(InvalidGeometry, geom.check_validity)
+
+        geom = Geometry.build_geometry('POINT (1 2)',
+                                       validate=Geometry.VALIDATE_LAZY)
+        checked = VALIDATION_STATS.describe()['deferred_checked']
+        geom.check_validity()
+        geom.check_validity()
+        self.assertEqual(VALIDATION_STATS.describe()['deferred_checked'],
+                         checked + 1)
+
+
+class TestSniffGeometryFormat(unittest.TestCase):
+    def test_sniff(self):
+        self.assertEqual(sniff_geometry_format(shapely.geometry.Point(1, 2)),
+                         'geometry')
+        self.assertEqual(sniff_geometry_format({'type': 'Point'}), 'literal')
+        self.assertEqual(sniff_geometry_format('  \n{"type": "Point"}'),
+                         'geojson')
+        self.assertEqual(sniff_geometry_format('SRID=3857;POINT(1 2)'), 'wkt')
+        self.assertEqual(sniff_geometry_format(' point(1 2)'), 'wkt')
+        self.assertEqual(sniff_geometry_format(
+            '0101000000000000000000F03F0000000000000040'), 'hexwkb')
+        self.assertEqual(sniff_geometry_format(
+            shapely.geometry.Point(1, 2).wkb), 'wkb')
+        self.assertRaises(InvalidGeometry, sniff_geometry_format, 'bad')
+        self.assertRaises(InvalidGeometry, sniff_geometry_format, '')
+        self.assertRaises(InvalidGeometry, sniff_geometry_format, 1)
+
+    def test_stats(self):
+        count = PARSER_STATS.describe().get('wkt', {}).get('count', 0)
+        Geometry.build_geometry('POINT (1 2)')
+        self.assertEqual(PARSER_STATS.describe()['wkt']['count'], count + 1)
+
+
 class TestBuildGeometryCollection(unittest.TestCase):
     def test_collection(self):
         geo_input = geojson.loads('''{
@@ -138,7 +192,7 @@ class TestBuildGeometryCollection(unittest.TestCase):
             }
           ]
         }''')
-        geometry = create_geometrycollection_from_geojson(geo_input)
+        geometry = read_geometry(geo_input)
         self.assertEqual(geometry.geom_type, 'GeometryCollection')
 
     def test_collection_empty(self):
@@ -146,7 +200,7 @@ class TestBuildGeometryCollection(unittest.TestCase):
           "type": "GeometryCollection",
           "geometries": []
         }''')
-        geometry = create_geometrycollection_from_geojson(geo_input)
+        geometry = read_geometry(geo_input)
         self.assertEqual(geometry.geom_type, 'GeometryCollection')
 
     def test_collection_in_collection(self):
@@ -174,9 +228,21 @@ class TestBuildGeometryCollection(unittest.TestCase):
             ]
         }
         ''')
-        geometry = create_geometrycollection_from_geojson(geo_input)
+        geometry = read_geometry(geo_input)
         self.assertEqual(geometry.geom_type, 'GeometryCollection')
 
+    def test_collection_precision(self):
+        geo_input = {
+            'type': 'GeometryCollection',
+            'geometries': [
+                {'type': 'Point',
+                 'coordinates': [0.12345678901234567, 1.2345678901234567]}
+            ]
+        }
+        geometry = read_geometry(geo_input)
+        self.assertEqual(geometry.geoms[0].coords[0],
+                         (0.12345678901234567, 1.2345678901234567))
+
 
 class TestBuildAllGeometryTypes(unittest.TestCase):
     def test_geometry_types(self):
@@ -7,7 +7,10 @@ import unittest
 from pprint import pprint
 
 import shapely.geometry
-from georest.geo.metadata import Metadata, calc_bbox, calc_geohash
+import shapely.ops
+from georest.geo.metadata import Metadata, calc_bbox, calc_geohash, \
+    calc_cell_union, cell_id, cell_level, cell_range, cell_children, \
+    cell_parent, cell_bounds, normalize_cells
 from georest.geo.spatialref import SpatialReference
 from georest.geo.geometry import Geometry
 
@@ -20,11 +23,17 @@ class TestMetadata(unittest.TestCase):
         self.assertIsInstance(metadata, Metadata)
         self.assertIsNotNone(metadata.geohash)
         self.assertIsNotNone(metadata.bbox)
+        self.assertEqual(len(metadata.cells), 1)
 
         metadata2 = metadata.spawn(
             geometry=Geometry.build_geometry('POINT (1 2)'))
         self.assertNotEqual(metadata, metadata2)
 
+    def test_legacy_metadata(self):
+        # metadata stored before cells is added
+        metadata = Metadata(**dict(bbox=[1, 1, 1, 1], geohash='s00'))
+        self.assertEqual(metadata.cells, [])
+
 
 class TestHelpers(unittest.TestCase):
     def test_calc_bbox(self):
@@ -51,5 +60,58 @@ class TestHelpers(unittest.TestCase):
         self.assertEqual('sq0', hash2)
 
 
+class TestCells(unittest.TestCase):
+    def test_cell_id(self):
+        root = cell_id(0, 0, 0)
+        self.assertEqual(cell_level(root), 0)
+        self.assertEqual(cell_bounds(root), (-180., -90., 180., 90.))
+
+        cell = cell_id(3, 5, 2)
+        self.assertEqual(cell_level(cell), 3)
+        self.assertEqual(cell_bounds(cell), (45., -45., 90., -22.5))
+        for child in cell_children(cell):
+            self.assertEqual(cell_level(child), 4)
+            self.assertEqual(cell_parent(child), cell)
+            low, high = cell_range(cell)
+            self.assertTrue(low <= cell_range(child)[0] <= high)
+            self.assertTrue(low <= cell_range(child)[1] <= high)
+
+    def test_normalize(self):
+        cell = cell_id(3, 5, 2)
+        children = cell_children(cell)
+        self.assertEqual(normalize_cells(children), [cell])
+        self.assertEqual(normalize_cells(children, min_level=4), children)
+        self.assertEqual(normalize_cells([cell, children[1]]), [cell])
+
+    def test_point(self):
+        geometry = Geometry.build_geometry('POINT (1 1)')
+        cells = calc_cell_union(geometry, max_level=20)
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cell_level(cells[0]), 20)
+        left, bottom, right, top = cell_bounds(cells[0])
+        self.assertTrue(left <= 1 <= right and bottom <= 1 <= top)
+
+    def test_covering(self):
+        geometry = Geometry.build_geometry(
+            'POLYGON ((0.1 0.1, 0.1 10, 10 10, 10 0.1, 0.1 0.1))')
+        for max_cells in [1, 4, 8, 32]:
+            cells = calc_cell_union(geometry, min_level=2, max_level=12,
+                                    max_cells=max_cells)
+            self.assertTrue(cells)
+            self.assertEqual(cells, sorted(cells))
+            covering = shapely.ops.unary_union(
+                [shapely.geometry.box(*cell_bounds(c)) for c in cells])
+            self.assertTrue(geometry.difference(covering).is_empty)
+            for cell in cells:
+                self.assertTrue(2 <= cell_level(cell) <= 12)
+            if max_cells >= 8:
+                self.assertLessEqual(len(cells), max_cells)
+
+    def test_crs(self):
+        geometry = Geometry.build_geometry('POINT (1 1)', srid=3857)
+        self.assertEqual(calc_cell_union(geometry), [])
+        self.assertTrue(calc_cell_union(geometry, ignore_crs=True))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'kotaimen'
+__date__ = '10/18/14'
+
+import time
+import unittest
+
+from georest.geo.geometry import Geometry
+from georest.geo.operations import Buffer, ParallelOffset, Area, \
+    UnaryConstructor
+from georest.geo.offload import OFFLOAD_EXECUTOR, count_vertices
+from georest.geo.exceptions import InvalidParameter, OperationTimeout
+
+
+class Sleep(UnaryConstructor):
+    HEAVY = True
+
+    def _impl(self, this):
+        time.sleep(5)
+        return this
+
+
+class TestOffloadExecutor(unittest.TestCase):
+    def setUp(self):
+        OFFLOAD_EXECUTOR.configure(processes=1, min_vertices=0,
+                                   timeout=10., timeouts={'Sleep': 0.2})
+        self.line = Geometry.build_geometry('LINESTRING (0 0, 1 1, 2 0)')
+
+    def tearDown(self):
+        OFFLOAD_EXECUTOR.configure(processes=0, min_vertices=10000)
+
+    def test_count_vertices(self):
+        self.assertEqual(count_vertices(self.line), 3)
+        polygon = Geometry.build_geometry(
+            'POLYGON ((0 0, 0 4, 4 4, 0 0), (1 2, 1 3, 2 3, 1 2))')
+        self.assertEqual(count_vertices(polygon), 8)
+
+    def test_offload(self):
+        result = Buffer(distance=0.5)(self.line)
+        reference = self.line.buffer(0.5)
+        self.assertTrue(result.almost_equals(reference))
+        self.assertEqual(result.crs.srid, 4326)
+        description = OFFLOAD_EXECUTOR.describe()
+        self.assertEqual(description['completed'], 1)
+        self.assertEqual(description['workers'], 1)
+
+    def test_light_operation(self):
+        # not heavy, always runs inline
+        Area()(self.line)
+        self.assertEqual(OFFLOAD_EXECUTOR.describe()['workers'], 0)
+
+    def test_error(self):
+        point = Geometry.build_geometry('POINT (1 1)')
+        self.assertRaises(InvalidParameter, ParallelOffset(), point)
+
+    def test_timeout(self):
+        self.assertRaises(OperationTimeout, Sleep(), self.line)
+        description = OFFLOAD_EXECUTOR.describe()
+        self.assertEqual(description['timeouts'], 1)
+        self.assertEqual(description['workers'], 0)
+        # replaced worker still works
+        self.assertTrue(Buffer()(self.line))
+
+
+if __name__ == '__main__':
+    unittest.main()
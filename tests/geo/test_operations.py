@@ -4,11 +4,16 @@ __author__ = 'kotaimen'
 __date__ = '6/16/14'
 
 import unittest
+import threading
 
+import mock
+import numpy
 import shapely.geometry
 
 from georest.geo.operations import *
-from georest.geo.operations import ParameterHelper
+from georest.geo.operations import ParameterHelper, \
+    PREPARED_GEOMETRY_CACHE, partition_geometries
+from georest.geo.bulk import BULK_EXECUTOR, chunked
 from georest.geo.geometry import Geometry
 
 from georest.geo.exceptions import InvalidParameter
@@ -231,6 +236,148 @@ class TestBinaryOperation(unittest.TestCase):
         self.assertFalse(result)
 
 
+class TestPreparedBinaryPredicate(unittest.TestCase):
+    def setUp(self):
+        PREPARED_GEOMETRY_CACHE.clear()
+        self.area = Geometry.build_geometry(
+            'POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+        self.area._cache_key = ('foo.area', 'rev1', 4326)
+        self.inside = Geometry.build_geometry('POINT (0.5 0.5)')
+        self.outside = Geometry.build_geometry('POINT (2 2)')
+
+    def test_prepared_this(self):
+        self.assertTrue(Contains()(self.area, self.inside))
+        self.assertFalse(Contains()(self.area, self.outside))
+        self.assertTrue(Intersects()(self.area, self.inside))
+        self.assertTrue(Disjoint()(self.area, self.outside))
+        self.assertIn(self.area.cache_key, PREPARED_GEOMETRY_CACHE)
+        self.assertEqual(len(PREPARED_GEOMETRY_CACHE), 1)
+
+    def test_prepared_other(self):
+        self.assertTrue(Within()(self.inside, self.area))
+        self.assertFalse(Within()(self.outside, self.area))
+        self.assertFalse(Contains()(self.inside, self.area))
+        self.assertFalse(Touches()(self.outside, self.area))
+        self.assertIn(self.area.cache_key, PREPARED_GEOMETRY_CACHE)
+
+    def test_cache_stats(self):
+        for i in range(10):
+            Within()(self.inside, self.area)
+        description = PREPARED_GEOMETRY_CACHE.describe()
+        self.assertEqual(description['size'], 1)
+        self.assertGreater(description['bytes'], 0)
+        self.assertGreaterEqual(description['hits'], 9)
+
+    def test_threads(self):
+        area = Geometry.build_geometry(
+            shapely.geometry.Point(0, 0).buffer(1, resolution=256))
+        area._cache_key = ('foo.circle', 'rev1', 4326)
+        points = list(Geometry.build_geometry('POINT (%r %r)' % (x, x))
+                      for x in numpy.linspace(-1, 1, 200))
+        expected = list(p.within(area) for p in points)
+        errors = list()
+
+        def run():
+            if list(Within()(p, area) for p in points) != expected:
+                errors.append('mismatch')
+
+        threads = list(threading.Thread(target=run) for _ in range(8))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_not_stored(self):
+        area = Geometry.build_geometry('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+        self.assertTrue(Contains()(area, self.inside))
+        self.assertEqual(len(PREPARED_GEOMETRY_CACHE), 0)
+
+
+class TestOperationMap(unittest.TestCase):
+    def setUp(self):
+        BULK_EXECUTOR.configure(threads=2, chunk_size=3)
+        self.area = Geometry.build_geometry(
+            'POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+        self.points = [Geometry.build_geometry('POINT (%f %f)' % (x, y))
+                       for x in (-0.5, 0, 0.5) for y in (0.25, 1, 1.5)]
+        self.lines = [Geometry.build_geometry('LINESTRING (0 0, 1 %d)' % i)
+                      for i in range(10)]
+
+    def tearDown(self):
+        BULK_EXECUTOR.configure(threads=1, chunk_size=256)
+
+    def check_map(self, operation, geometries, *args):
+        expected = [operation(g, *args) for g in geometries]
+        results = operation.map(geometries, *args)
+        self.assertEqual(len(results), len(expected))
+        for result, reference in zip(results, expected):
+            if isinstance(reference, bool):
+                self.assertIs(result, reference)
+            elif Geometry.is_geometry(reference):
+                self.assertEqual(reference.wkt, result.wkt)
+                self.assertEqual(result.crs.srid, reference.crs.srid)
+            else:
+                self.assertAlmostEqual(result, reference)
+
+    def test_predicates(self):
+        for operation in [Contains(), Within(), Intersects(), Disjoint(),
+                          Touches(), Crosses(), Equals()]:
+            self.check_map(operation, self.points, self.area)
+            self.check_map(operation, self.lines, self.area)
+
+    def test_unary(self):
+        for operation in [Length(), Area(), Buffer(distance=0.1), Centroid(),
+                          Envelope(), ConvexHull(), Boundary()]:
+            self.check_map(operation, self.lines)
+
+    def test_distance(self):
+        self.check_map(Distance(), self.points, self.area)
+
+    def test_srid(self):
+        self.check_map(Length(srid=3857), self.lines)
+
+    def test_srid_binary(self):
+        operation = Within(srid=3857)
+        self.check_map(operation, self.points, self.area)
+        with mock.patch.object(operation, '_transform_crs',
+                               wraps=operation._transform_crs) as transform:
+            operation.map(self.points, self.area)
+        # extra geometry is transformed once for the whole batch
+        transformed = list(g for (geometries,), _ in transform.call_args_list
+                           for g in geometries)
+        self.assertEqual(sum(1 for g in transformed if g is self.area), 1)
+        self.assertEqual(len(transformed), len(self.points) + 1)
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+
+class TestPipeline(unittest.TestCase):
+    def test_pipeline(self):
+        this = Geometry.build_geometry('LINESTRING (0 0, 1 0)')
+        pipeline = Pipeline([Buffer(distance=1., srid=3857),
+                             Simplify(tolerance=0.1),
+                             Area()])
+        result = pipeline(this)
+        reference = Area()(Simplify(tolerance=0.1)(
+            Buffer(distance=1., srid=3857)(this)))
+        self.assertAlmostEqual(result, reference)
+        self.assertIs(pipeline.RESULT_TYPE, float)
+
+    def test_binary_first(self):
+        this = Geometry.build_geometry('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+        other = Geometry.build_geometry('POLYGON ((0 0, 0 2, 2 2, 2 0, 0 0))')
+        result = Pipeline([Union(), Envelope()])(this, other)
+        self.assertEqual(result.area, 4.)
+        self.assertEqual(result.crs.srid, 4326)
+
+    def test_invalid(self):
+        self.assertRaises(InvalidParameter, Pipeline, [Area(), Buffer()])
+        self.assertRaises(InvalidParameter, Pipeline, [Buffer(), Union()])
+
+
 class TestBinarySetTheoreticMethods(unittest.TestCase):
     def test_intersection(self):
         this = Geometry.build_geometry('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
@@ -256,7 +403,66 @@ class TestBinarySetTheoreticMethods(unittest.TestCase):
 
 class TestMultiOperations(unittest.TestCase):
     def test_cascade_union(self):
-        pass
+        squares = [Geometry.build_geometry(
+            'POLYGON ((%d %d, %d %d, %d %d, %d %d, %d %d))' % (
+                x, y, x + 2, y, x + 2, y + 2, x, y + 2, x, y))
+                   for x in range(20) for y in range(20)]
+        reference = CascadeUnion()(*squares)
+
+        operation = CascadeUnion()
+        operation.PARTITION_SIZE = 16
+        operation.MERGE_FANOUT = 3
+        BULK_EXECUTOR.configure(threads=2)
+        try:
+            result = operation(*squares)
+        finally:
+            BULK_EXECUTOR.configure(threads=1)
+        self.assertTrue(result.equals(reference))
+        self.assertAlmostEqual(result.area, 21. * 21.)
+        self.assertEqual(result.crs.srid, 4326)
+
+    def test_cascade_union_reduce(self):
+        squares = [Geometry.build_geometry(
+            'POLYGON ((%d %d, %d %d, %d %d, %d %d, %d %d))' % (
+                x, y, x + 2, y, x + 2, y + 2, x, y + 2, x, y))
+                   for x in range(20) for y in range(20)]
+        operation = CascadeUnion()
+        operation.PARTITION_SIZE = 16
+        operation.MERGE_FANOUT = 3
+        consumed = list()
+
+        def stream():
+            for square in squares:
+                consumed.append(square)
+                yield square
+
+        unions = list()
+        union = operation._union
+
+        def record(geometries):
+            # no more than one group is read ahead of the unions
+            self.assertLessEqual(len(consumed), 16 * (len(unions) + 1))
+            unions.append(len(geometries))
+            return union(geometries)
+
+        operation._union = record
+        result = operation.reduce(stream())
+        self.assertAlmostEqual(result.area, 21. * 21.)
+        self.assertEqual(result.crs.srid, 4326)
+        self.assertLessEqual(max(unions), 16)
+
+        self.assertRaises(InvalidParameter, CascadeUnion().reduce, [])
+        self.assertRaises(InvalidParameter, CascadeUnion().reduce,
+                          [squares[0], Geometry.build_geometry(
+                              'POINT (1 1)', srid=3857)])
+
+    def test_partition_geometries(self):
+        points = [Geometry.build_geometry('POINT (%d %d)' % (x, y))
+                  for x in (0, 100) for y in (0, 100) for i in range(4)]
+        partitions = partition_geometries(points, 4)
+        self.assertEqual(len(partitions), 4)
+        for partition in partitions:
+            self.assertEqual(len(set(p.wkt for p in partition)), 1)
 
 
 if __name__ == '__main__':
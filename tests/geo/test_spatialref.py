@@ -4,13 +4,15 @@ __author__ = 'kotaimen'
 __date__ = '6/7/14'
 
 import unittest
+import pickle
 import geojson
 
 import shapely.geometry
+import shapely.wkt
 
-from georest.geo.spatialref import SpatialReference, CoordinateTransform
-from georest.geo.exceptions import InvalidSpatialReference, \
-    CoordinateTransformationError
+from georest.geo.spatialref import SpatialReference, CoordinateTransform, \
+    SpatialReferenceRegistry
+from georest.geo.exceptions import InvalidSpatialReference
 from georest.geo.geometry import Geometry
 
 from tests.geo.data import jsondata
@@ -62,6 +64,40 @@ class TestSpatialReference(unittest.TestCase):
                           })
 
 
+class TestSpatialReferenceRegistry(unittest.TestCase):
+    def test_interned(self):
+        crs1 = SpatialReference.make_spatialref(4326)
+        crs2 = SpatialReference.make_spatialref(4326)
+        self.assertIs(crs1, crs2)
+        self.assertTrue(crs1.proj.is_latlong())
+
+    def test_pickle(self):
+        crs = SpatialReference.make_spatialref(3857)
+        for protocol in [0, 2]:
+            self.assertIs(pickle.loads(pickle.dumps(crs, protocol)), crs)
+        # legacy pickle carrying srid as state
+        legacy = 'ccopy_reg\n_reconstructor\np0\n(cgeorest.geo.spatialref\n' \
+                 'SpatialReference\np1\nc__builtin__\nobject\np2\nNtp3\n' \
+                 'Rp4\nI3857\nb.'
+        crs2 = pickle.loads(legacy)
+        self.assertEqual(crs2.srid, 3857)
+        self.assertIs(crs2.proj, crs.proj)
+
+    def test_counters(self):
+        registry = SpatialReferenceRegistry()
+        registry.preload([4326, 3857])
+        self.assertDictEqual(registry.describe(),
+                             {'size': 2, 'hits': 0, 'misses': 2})
+        self.assertEqual(registry.get(3857).srid, 3857)
+        self.assertDictEqual(registry.describe(),
+                             {'size': 2, 'hits': 1, 'misses': 2})
+
+    def test_invalid(self):
+        registry = SpatialReferenceRegistry()
+        self.assertRaises(InvalidSpatialReference, registry.get, 12345)
+        self.assertEqual(registry.describe()['size'], 0)
+
+
 class TestCoordinateTransform(unittest.TestCase):
     def test_transform(self):
         geom1 = shapely.geometry.Point(1, 1)
@@ -85,12 +121,44 @@ class TestCoordinateTransform(unittest.TestCase):
 
         for k, v in jsondata.iteritems():
             geom1 = Geometry.build_geometry(v, copy=True)
-            if k == 'geometrycollection':
-                self.assertRaises(CoordinateTransformationError, forward, geom1)
-            else:
-                geom2 = forward(geom1)
-                geom3 = backward(geom2)
-                self.assertTrue(geom1.almost_equals(geom3))
+            geom2 = forward(geom1)
+            self.assertEqual(geom2.geom_type, geom1.geom_type)
+            self.assertEqual(geom2.crs.srid, 3857)
+            geom3 = backward(geom2)
+            self.assertTrue(geom1.almost_equals(geom3))
+
+    def test_transform_3d(self):
+        geom1 = Geometry.build_geometry('LINESTRING (1 1 5, 2 2 6)')
+        forward = CoordinateTransform.build_transform(4326, 3857)
+        geom2 = forward(geom1)
+        self.assertTrue(geom2.has_z)
+        self.assertAlmostEqual(geom2.coords[0][0], 111319.4907932723)
+        self.assertEqual(geom2.coords[1][2], 6)
+
+    def test_transform_empty(self):
+        geom1 = shapely.wkt.loads('POLYGON EMPTY')
+        geom2 = CoordinateTransform.build_transform(4326, 3857)(geom1)
+        self.assertTrue(geom2.is_empty)
+        self.assertEqual(geom2.geom_type, 'Polygon')
+        self.assertEqual(geom2.crs.srid, 3857)
+        self.assertIsNot(geom1, geom2)
+
+    def test_transform_mixed_dimensions(self):
+        geom1 = Geometry.build_geometry(
+            'GEOMETRYCOLLECTION (POINT (1 1), LINESTRING (1 1 5, 2 2 6))')
+        geom2 = CoordinateTransform.build_transform(4326, 3857)(geom1)
+        point, line = geom2.geoms
+        self.assertFalse(point.has_z)
+        self.assertAlmostEqual(point.x, 111319.4907932723)
+        self.assertTrue(line.has_z)
+        self.assertEqual(line.coords[1][2], 6)
+        self.assertEqual(geom2.crs.srid, 3857)
+
+    def test_transform_cache(self):
+        transform1 = CoordinateTransform.build_transform(4326, 3857)
+        transform2 = CoordinateTransform.build_transform(
+            SpatialReference.make_spatialref(4326), 3857)
+        self.assertIs(transform1, transform2)
 
 
 if __name__ == '__main__':
@@ -176,6 +176,124 @@ def benchmark_ujson_load(data, precise_float=False):
     return features
 
 
+#
+# GeometryCollection
+#
+
+def create_geometrycollection_via_wkt(geometry, buf=None):
+    """Old GeometryCollection builder, converts members to WKT and load the
+    whole collection again"""
+    if buf is None:
+        is_top = True
+        buf = io.BytesIO()
+    else:
+        is_top = False
+
+    length = len(geometry['geometries'])
+    if length == 0:
+        buf.write('GEOMETRYCOLLECTION EMPTY')
+    else:
+        buf.write('GEOMETRYCOLLECTION (')
+        for n, geom in enumerate(geometry['geometries']):
+            if geom['type'] == 'GeometryCollection':
+                create_geometrycollection_via_wkt(geom, buf=buf)
+            else:
+                buf.write(shapely.geometry.asShape(geom).wkt)
+            if n < length - 1:
+                buf.write(',')
+        buf.write(')')
+    if is_top:
+        return shapely.wkt.loads(buf.getvalue())
+
+
+def make_geometrycollection(members=10000):
+    """Make a geojson GeometryCollection with mixed members"""
+    geometries = list()
+    for n in range(members):
+        x, y = n % 360 - 180. + 0.123456789, n % 180 - 90. + 0.987654321
+        kind = n % 4
+        if kind == 0:
+            geometries.append({'type': 'Point', 'coordinates': [x, y]})
+        elif kind == 1:
+            geometries.append({'type': 'LineString',
+                               'coordinates': [[x, y], [x + 1, y + 1],
+                                               [x + 2, y]]})
+        elif kind == 2:
+            geometries.append({'type': 'Polygon',
+                               'coordinates': [[[x, y], [x + 1, y],
+                                                [x + 1, y + 1], [x, y]]]})
+        else:
+            geometries.append({'type': 'GeometryCollection',
+                               'geometries': [
+                                   {'type': 'Point', 'coordinates': [x, y]},
+                                   {'type': 'MultiPoint',
+                                    'coordinates': [[x, y], [y, x]]}]})
+    return {'type': 'GeometryCollection', 'geometries': geometries}
+
+
+def benchmark_geometrycollection_build(collection, builder):
+    tic = time.clock()
+    geometry = builder(collection)
+    tac = time.clock() - tic
+    print '%d members in %f seconds.' % (len(geometry.geoms), tac)
+    return geometry
+
+
+def benchmark_geometrycollection():
+    from georest.geo.geojsonio import read_geometry
+
+    collection = make_geometrycollection(10000)
+
+    print 'Build GeometryCollection via WKT...',
+    benchmark_geometrycollection_build(collection,
+                                       create_geometrycollection_via_wkt)
+
+    print 'Build GeometryCollection from members...',
+    benchmark_geometrycollection_build(collection,
+                                       read_geometry)
+
+
+#
+# Quantized coordinates
+#
+
+def make_country(n, vertices=20000):
+    """Make a country like polygon with a wiggly border"""
+    import math
+    cx, cy = n % 36 * 10 - 175., n % 18 * 10 - 85.
+    ring = list()
+    for i in range(vertices):
+        a = 2 * math.pi * i / vertices
+        r = 4 + 0.5 * math.sin(a * 37) + 0.1 * math.sin(a * 491)
+        ring.append((cx + r * math.cos(a), cy + r * math.sin(a) * 0.9))
+    ring.append(ring[0])
+    return shapely.geometry.Polygon(ring)
+
+
+def benchmark_quantized_dump(features, quantization):
+    tic = time.clock()
+    length = 0
+    for feature in features:
+        length += len(''.join(feature.iter_geojson(quantization=quantization)))
+    tac = time.clock() - tic
+    print '%d features, %d bytes in %f seconds.' % \
+          (len(features), length, tac)
+
+
+def benchmark_quantization():
+    from georest.geo import Feature as GeoFeature
+
+    features = list(GeoFeature.build_from_geometry(make_country(n))
+                    for n in range(50))
+
+    print 'Dump as GeoJson...',
+    benchmark_quantized_dump(features, None)
+    for quantization in [10000, 100000]:
+        print 'Dump as quantized GeoJson (%d)...' % quantization,
+        benchmark_quantized_dump(features, quantization)
+
+
+
 #
 # Benchmark
 #
@@ -237,6 +355,16 @@ def main():
     print 'Build Features from geojson using ujson (precise float) ...',
     benchmark_ujson_load(data, precise_float=True)
 
+    #
+    # GeometryCollection
+    #
+    benchmark_geometrycollection()
+
+    #
+    # Quantized coordinates
+    #
+    benchmark_quantization()
+
 
 if __name__ == '__main__':
     main()
@@ -6,11 +6,15 @@ __date__ = '6/24/14'
 
 import json
 import unittest
+
+import mock
+
 from tests.view.base import ViewTestMixin
 from georest import storage
 from georest.storage import build_feature_storage
 from georest.model import *
 from georest import geo
+from georest.geo.jsonhelper import JsonObject
 
 
 class FeatureModelMixin(object):
@@ -68,6 +72,105 @@ class TestFeaturesModel(FeatureModelMixin, unittest.TestCase):
             r_obj, r_metadata = self.model.get(self.key)
 
 
+    def test_export_features(self):
+        for name in ['b', 'a']:
+            self.model.put(self.obj, key='foo.%s' % name)
+
+        collection = json.loads(''.join(self.model.export_features('foo')))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(list(f['id'] for f in collection['features']),
+                         ['foo.a', 'foo.b'])
+
+        lines = ''.join(self.model.export_features(
+            'foo', ndjson=True, cursor='foo.a')).splitlines()
+        self.assertEqual(list(json.loads(line)['id'] for line in lines),
+                         ['foo.b'])
+
+        with self.assertRaises(storage.BucketNotFound):
+            self.model.export_features('nothere')
+
+    def test_import_features(self):
+        point = '{"type":"Feature","geometry":{"type":"Point",' \
+                '"coordinates":[%d,%d]},"properties":{"n":%d}}'
+        texts = [point % (n, n, n) for n in range(5)]
+        texts[2] = '{"type":"Feature","geometry":{"type":"Point",' \
+                   '"coordinates":[1]}}'
+        results = list(self.model.import_features(iter(texts),
+                                                  bucket=self.bucket,
+                                                  batch_size=2))
+        self.assertEqual(list(r['index'] for r in results), range(5))
+        self.assertEqual(list(r['code'] for r in results),
+                         [201, 201, 400, 201, 201])
+        self.assertEqual(results[2]['exception'], 'InvalidGeometry')
+        for n in [0, 1, 3, 4]:
+            feature, metadata = self.model.get(results[n]['key'])
+            self.assertEqual(feature.properties['n'], n)
+
+        # unexpected failure of a feature in the middle of a batch
+        texts[2] = point % (10, 100, 2)
+        results = list(self.model.import_features(iter(texts),
+                                                  bucket=self.bucket,
+                                                  batch_size=5))
+        self.assertEqual(list(r['index'] for r in results), range(5))
+        self.assertEqual(list(r['code'] for r in results),
+                         [201, 201, 400, 201, 201])
+        self.assertEqual(results[2]['exception'], 'InvalidFeature')
+
+        # broken input ends the results
+        def broken():
+            yield point % (1, 1, 1)
+            raise geo.exceptions.InvalidGeoJsonInput('broken')
+        results = list(self.model.import_features(broken(),
+                                                  bucket=self.bucket))
+        self.assertEqual(results[-1]['exception'], 'InvalidGeoJsonInput')
+        self.assertNotIn('index', results[-1])
+
+    def test_import_collection(self):
+        collection = '{"type":"FeatureCollection","crs":{"type":"name",' \
+                     '"properties":{"name":"EPSG:3857"}},"features":[' \
+                     '{"type":"Feature","geometry":{"type":"Point",' \
+                     '"coordinates":[10,20]},"properties":{}},5,' \
+                     '{"type":"Feature","geometry":{"type":"Point",' \
+                     '"coordinates":[30,40]},"properties":{}}]}'
+        texts = geo.geojsonio.split_feature_collection([collection])
+        results = list(self.model.import_features(texts,
+                                                  bucket=self.bucket))
+        self.assertEqual(list(r['index'] for r in results), range(3))
+        self.assertEqual(list(r['code'] for r in results), [201, 400, 201])
+        self.assertEqual(results[1]['exception'], 'InvalidFeature')
+        for n in [0, 2]:
+            feature, metadata = self.model.get(results[n]['key'])
+            self.assertEqual(feature.crs.srid, 3857)
+
+    def test_query_bbox(self):
+        for name, x in [('a', 1), ('b', 2), ('c', 3), ('d', 30)]:
+            feature = geo.Feature.build_from_geojson(
+                '{"type":"Feature","geometry":{"type":"Point",'
+                '"coordinates":[%d,%d]},"properties":{}}' % (x, x))
+            self.model.put(feature, key='foo.%s' % name)
+
+        features, cursor = self.model.query_bbox((0, 0, 10, 10),
+                                                 bucket='foo', limit=2)
+        self.assertEqual(list(f.key.qualified_name for f in features),
+                         ['foo.a', 'foo.b'])
+        self.assertEqual(cursor, 'foo.b')
+        features, cursor = self.model.query_bbox((0, 0, 10, 10),
+                                                 bucket='foo', limit=2,
+                                                 cursor=cursor)
+        self.assertEqual(list(f.key.qualified_name for f in features),
+                         ['foo.c'])
+        self.assertIsNone(cursor)
+
+        collection = json.loads(''.join(
+            self.model.iter_collection_json(features, cursor)))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(collection['features'][0]['id'], 'foo.c')
+        self.assertIsNone(collection['cursor'])
+
+        self.assertRaises(geo.exceptions.InvalidKey, self.model.query_bbox,
+                          (0, 0, 10, 10), bucket='foo', cursor='bar.a')
+
+
 class TestGeometryModel(FeatureModelMixin, unittest.TestCase):
     def setUp(self):
         super(TestGeometryModel, self).setUp()
@@ -92,6 +195,25 @@ class TestGeometryModel(FeatureModelMixin, unittest.TestCase):
         self.assertEqual(metadata, r_metadata)
         self.assert_(self.obj.equals(r_obj))
 
+    def test_cache_key(self):
+        self.model.put(self.obj, key=self.key)
+        r_obj1, _ = self.model.get(self.key)
+        self.assertEqual(r_obj1.cache_key[0], self.key)
+        self.assertEqual(r_obj1.cache_key[2], 4326)
+        self.model.put(self.obj, key=self.key)
+        r_obj2, _ = self.model.get(self.key)
+        self.assertNotEqual(r_obj1.cache_key, r_obj2.cache_key)
+
+    def test_cache_key_unversioned(self):
+        # storage without revision nor timestamp, eg: memcache
+        feature = geo.Feature.build_from_geometry(self.obj)
+        response = storage.entry.Response(
+            geo.Key.build_from_qualified_name(self.key), None, None, None)
+        with mock.patch.object(storage.FeatureEntry, 'get_feature',
+                               return_value=(response, feature)):
+            r_obj, _ = self.model.get(self.key)
+        self.assertIsNone(r_obj.cache_key)
+
 
 class TestPropertiesModel(FeatureModelMixin, unittest.TestCase):
     def setUp(self):
@@ -117,3 +239,9 @@ class TestPropertiesModel(FeatureModelMixin, unittest.TestCase):
         r_obj, r_metadata = self.model.get(self.key)
         self.assertEqual(metadata, r_metadata)
         self.assertEqual(self.obj, r_obj)
+
+    def test_as_json(self):
+        self.assertEqual(json.loads(self.model.as_json(self.obj)), self.obj)
+        # stored json is not encoded again
+        stored = JsonObject(self.jsonobj)
+        self.assertIs(self.model.as_json(stored), self.jsonobj)
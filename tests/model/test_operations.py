@@ -8,7 +8,8 @@ import unittest
 import json
 
 from georest import geo
-from georest.model import OperationsModel, AttributesModel
+from georest.model import OperationsModel, AttributesModel, \
+    OperationResultCache
 from georest.model.operations import NoSuchOperation, BadInvoke
 
 
@@ -42,6 +43,130 @@ class TestOperationsModel(unittest.TestCase):
         self.assertFalse(result.is_pod)
         self.assert_(geom.equals(result.value))
 
+    def test_pipeline(self):
+        geom = geo.Geometry.build_geometry('{"type":"LineString","coordinates":[[10.0,0.0],[10.0,10.0]]}')
+        result = self.model.invoke_pipeline(
+            [('buffer', {'distance': '1'}), ('envelope', {}), ('area', {})],
+            geom)
+        self.assert_(result.is_pod)
+        self.assertAlmostEqual(result.value, 2 * 12.)
+
+        result = self.model.invoke_pipeline([('centroid', {})], geom,
+                                            srid=3857)
+        self.assertFalse(result.is_pod)
+        self.assertEqual(result.value.crs.srid, 3857)
+
+        with self.assertRaises(NoSuchOperation):
+            self.model.invoke_pipeline([('kangaroo', {})], geom)
+
+        with self.assertRaises(BadInvoke):
+            self.model.invoke_pipeline([], geom)
+
+        with self.assertRaises(BadInvoke):
+            self.model.invoke_pipeline([('area', {}), ('buffer', {})], geom)
+
+        with self.assertRaises(BadInvoke):
+            self.model.invoke_pipeline([('buffer', {}), ('union', {})], geom)
+
+        with self.assertRaises(BadInvoke):
+            self.model.invoke_pipeline([('area', {})], geom, distance=1)
+
+    def test_batch(self):
+        geoms = [geo.Geometry.build_geometry('{"type":"LineString","coordinates":[[0.0,0.0],[0.0,%d]]}' % i)
+                 for i in range(1, 4)]
+        results = self.model.invoke_batch('length', iter(geoms))
+        self.assertEqual([r.value for r in results], [1.0, 2.0, 3.0])
+
+        other = geo.Geometry.build_geometry('{"type":"Point","coordinates":[0,1]}')
+        results = self.model.invoke_batch('intersects', geoms, other)
+        self.assertEqual([r.value_json() for r in results],
+                         ['true', 'true', 'true'])
+
+        results = list(self.model.invoke_batch('cascade_union', geoms))
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0].is_pod)
+        self.assertEqual(results[0].value.length, 3.0)
+
+        with self.assertRaises(NoSuchOperation):
+            self.model.invoke_batch('kangaroo', geoms)
+
+        with self.assertRaises(BadInvoke):
+            self.model.invoke_batch('difference', geoms)
+
+
+class TestOperationResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = OperationResultCache(max_items=2)
+        self.model = OperationsModel(result_cache=self.cache)
+
+    def make_stored(self, revision):
+        geom = geo.Geometry.build_geometry('{"type":"LineString","coordinates":[[10.0,0.0],[10.0,10.0]]}')
+        geom._cache_key = ('foo.bar', revision, 4326)
+        return geom
+
+    def test_hit(self):
+        geom = self.make_stored('1')
+        result1 = self.model.invoke('buffer', geom, distance='0.5')
+        result2 = self.model.invoke('buffer', self.make_stored('1'),
+                                    distance='0.50')
+        self.assertIs(result1, result2)
+        self.assertEqual(self.cache.describe()['hits'], 1)
+
+    def test_literal(self):
+        geom1 = geo.Geometry.build_geometry('POINT (1 2)')
+        geom2 = geo.Geometry.build_geometry('{"type":"Point","coordinates":[1,2]}')
+        geom3 = geo.Geometry.build_geometry('POINT (1 3)')
+        result1 = self.model.invoke('centroid', geom1)
+        self.assertIs(self.model.invoke('centroid', geom2), result1)
+        self.assertIsNot(self.model.invoke('centroid', geom3), result1)
+
+    def test_invalidate(self):
+        result1 = self.model.invoke('length', self.make_stored('1'))
+        self.assertEqual(self.cache.describe()['size'], 1)
+        result2 = self.model.invoke('length', self.make_stored('2'))
+        self.assertIsNot(result1, result2)
+        description = self.cache.describe()
+        self.assertEqual(description['size'], 1)
+        self.assertEqual(description['invalidations'], 1)
+
+    def test_invalidate_binary(self):
+        other = self.make_stored('1')
+        other._cache_key = ('foo.baz', '1', 4326)
+        self.model.invoke('distance', self.make_stored('1'), other)
+        self.cache.invalidate('foo.bar')
+        self.assertEqual(self.cache.describe()['size'], 0)
+        self.assertEqual(self.cache._entries, {})
+        self.assertEqual(self.cache._revisions, {})
+
+        # failed operations leave nothing behind
+        self.assertRaises(geo.GeoException, self.model.invoke, 'buffer',
+                          self.make_stored('2'), distance='-x')
+        self.assertRaises(geo.GeoException, self.model.invoke, 'intersects',
+                          self.make_stored('2'),
+                          geo.Geometry.build_geometry('POINT (1 2)',
+                                                      srid=3857))
+        self.assertEqual(self.cache._entries, {})
+        self.assertEqual(self.cache._revisions, {})
+
+    def test_unversioned(self):
+        # eg: memcache buckets, updated in place without a revision
+        small = geo.Geometry.build_geometry(
+            'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))')
+        small._cache_key = ('foo.bar', None, 4326)
+        large = geo.Geometry.build_geometry(
+            'POLYGON ((0 0, 2 0, 2 2, 0 2, 0 0))')
+        large._cache_key = ('foo.bar', None, 4326)
+        self.assertEqual(self.model.invoke('area', small).value, 1.0)
+        self.assertEqual(self.model.invoke('area', large).value, 4.0)
+
+    def test_evict(self):
+        for i in range(3):
+            self.model.invoke('buffer', self.make_stored('1'), distance=i + 1.)
+        description = self.cache.describe()
+        self.assertEqual(description['size'], 2)
+        self.assertEqual(description['evictions'], 1)
+        self.assertIn('result_cache', self.model.describe())
+
 
 class TestAttributesModel(unittest.TestCase):
     def setUp(self):
@@ -10,6 +10,94 @@ __date__ = '7/1/14'
 
 """
 
+import unittest
 
+from georest.geo import Geometry, Metadata
+from georest.storage import DummyFeatureStorage, FeatureMapper
 
 
+class TestDummyFeatureBucket(unittest.TestCase):
+    def setUp(self):
+        self.storage = DummyFeatureStorage()
+        self.bucket = self.storage.create_bucket('test')
+
+    def make_mapper(self, x, y):
+        geometry = Geometry.build_geometry('POINT (%r %r)' % (x, y),
+                                           srid=4326)
+        return FeatureMapper(
+            properties=dict(),
+            metadata=Metadata.make_metadata(geometry)._asdict(),
+            wkt=geometry.wkt,
+            srid=4326,
+        )
+
+    def test_query_bbox(self):
+        for i in range(10):
+            self.bucket.commit('test.f%d' % i, self.make_mapper(i, i))
+
+        result = self.bucket.query_bbox((2.5, 2.5, 7, 7))
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f3', 'test.f4', 'test.f5', 'test.f6',
+                          'test.f7'])
+
+        result = self.bucket.query_bbox((2.5, 2.5, 7, 7), limit=2,
+                                        cursor='test.f4')
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f5', 'test.f6'])
+
+        self.bucket.commit('test.f4', self.make_mapper(100, 80))
+        self.bucket.remove('test.f5')
+        result = self.bucket.query_bbox((2.5, 2.5, 7, 7))
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f3', 'test.f6', 'test.f7'])
+
+    def test_query_all(self):
+        for i in [3, 1, 2, 0]:
+            self.bucket.commit('test.f%d' % i, self.make_mapper(i, i))
+        self.bucket.remove('test.f2')
+
+        result = self.bucket.query_all()
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f0', 'test.f1', 'test.f3'])
+        result = self.bucket.query_all(limit=1, cursor='test.f0')
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f1'])
+
+    def test_query_distance(self):
+        for i in range(10):
+            self.bucket.commit('test.f%d' % i,
+                               self.make_mapper(116.3 + i * 0.001, 39.9))
+        self.bucket.commit('test.polygon', FeatureMapper(
+            properties=dict(),
+            metadata=dict(bbox=[100, 30, 120, 40], geohash='w'),
+            wkt='POLYGON ((100 30, 100 40, 116.3 40, 116.3 30, 100 30))',
+            srid=4326))
+
+        result = self.bucket.query_distance('POINT (116.3025 39.9)', 4326,
+                                            0.002)
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f1', 'test.f2', 'test.f3', 'test.f4'])
+
+        result = self.bucket.query_distance('POINT (116.2995 39.9)', 4326,
+                                            0.001, limit=1)
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.f0'])
+        result = self.bucket.query_distance('POINT (116.2995 39.9)', 4326,
+                                            0.001, cursor='test.f0')
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.polygon'])
+
+    def test_query_geohash_intersects(self):
+        self.bucket.commit('test.a', self.make_mapper(116.3, 39.9))
+        self.bucket.commit('test.b', self.make_mapper(-73.9, 40.7))
+        result = self.bucket.query_geohash('wx4')
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.a'])
+        result = self.bucket.query_intersects(
+            'POLYGON ((-74 40, -74 41, -73 41, -73 40, -74 40))', 4326)
+        self.assertEqual(list(commit.name for commit, mapper in result),
+                         ['test.b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,8 +11,11 @@ __date__ = '7/7/14'
 """
 import unittest
 
+from memcache import Client
+
 from georest.storage import MemcacheFeatureStorage, FeatureMapper, \
-    DuplicatedBucket
+    DuplicatedBucket, QueryNotSupported
+from georest.storage.buckets.memcash import MemcacheFeatureBucket
 
 
 class TestMemcacheFeatureStorage(unittest.TestCase):
@@ -94,3 +97,21 @@ class TestMemcacheFeatureStorage(unittest.TestCase):
         self.assertIsNone(commit2.expire_at)
 
         self.assertEqual(mapper, self.test_mapper)
+
+
+class TestMemcacheQueries(unittest.TestCase):
+    def setUp(self):
+        # no server required, queries are refused before connecting
+        self.bucket = MemcacheFeatureBucket(u'mem_test',
+                                            Client(['localhost']), '1')
+
+    def test_spatial_queries(self):
+        self.assertRaises(QueryNotSupported, self.bucket.query_bbox,
+                          (0, 0, 1, 1))
+        self.assertRaises(QueryNotSupported, self.bucket.query_intersects,
+                          'POINT (1 1)', 4326)
+        self.assertRaises(QueryNotSupported, self.bucket.query_distance,
+                          'POINT (1 1)', 4326, 1.)
+        self.assertRaises(QueryNotSupported, self.bucket.query_geohash,
+                          'wx4g')
+        self.assertRaises(QueryNotSupported, self.bucket.query_all)
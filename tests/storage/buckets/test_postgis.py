@@ -244,3 +244,52 @@ class TestPostGISStorage(unittest.TestCase):
         self.assertGreaterEqual(commit3.create_at, commit1.create_at)
         self.assertIsInstance(commit3.expire_at, datetime.datetime)
         self.assertLess(commit3.expire_at, datetime.datetime.max)
+
+    def test_spatial_query(self):
+        for i in range(5):
+            mapper = FeatureMapper(
+                properties={},
+                metadata={},
+                wkt='POINT (%d %d)' % (i, i),
+                srid=4326)
+            self.bucket.commit(name='feature.f%d' % i, mapper=mapper)
+        # old revision is not returned
+        self.bucket.commit(name='feature.f4', mapper=FeatureMapper(
+            properties={}, metadata={}, wkt='POINT (10 10)', srid=4326))
+
+        result = list(self.bucket.query_bbox((1.5, 1.5, 5, 5)))
+        self.assertEqual(list(c.name for c, m in result),
+                         ['feature.f2', 'feature.f3'])
+
+        result = list(self.bucket.query_bbox((0, 0, 5, 5), limit=2,
+                                             cursor='feature.f0'))
+        self.assertEqual(list(c.name for c, m in result),
+                         ['feature.f1', 'feature.f2'])
+
+        result = list(self.bucket.query_intersects(
+            'POLYGON ((0.5 0.5, 0.5 2.5, 2.5 2.5, 0.5 0.5))', 4326))
+        self.assertEqual(list(c.name for c, m in result),
+                         ['feature.f1', 'feature.f2'])
+
+        result = list(self.bucket.query_distance('POINT (0 0)', 4326, 1.5))
+        self.assertEqual(list(c.name for c, m in result),
+                         ['feature.f0', 'feature.f1'])
+
+    def test_query_all_commit_many(self):
+        commits = self.bucket.commit_many(list(
+            ('feature.f%d' % i, FeatureMapper(properties={'i': i},
+                                              metadata={},
+                                              wkt='POINT (%d %d)' % (i, i),
+                                              srid=4326))
+            for i in range(3)))
+        self.assertEqual(list(c.name for c in commits),
+                         ['feature.f0', 'feature.f1', 'feature.f2'])
+        self.bucket.remove(name='feature.f1')
+
+        result = list(self.bucket.query_all())
+        self.assertEqual(list(c.name for c, m in result),
+                         ['feature.f0', 'feature.f2'])
+        # properties are passed through as stored json
+        self.assertEqual(dict(result[1][1].properties), {'i': 2})
+        result = list(self.bucket.query_all(cursor='feature.f0'))
+        self.assertEqual(list(c.name for c, m in result), ['feature.f2'])
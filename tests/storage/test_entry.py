@@ -49,6 +49,34 @@ class TestFeatureEntry(unittest.TestCase):
         self.assertEqual(feature.key, self.test_key)
         self.assertTrue(feature.equals(self.test_feature2))
 
+    def test_put_features(self):
+        entry = FeatureEntry(self.bucket)
+        random_key = Key.make_key(bucket=self.bucket.bucket_name)
+        responses = entry.put_features([(self.test_key, self.test_feature1),
+                                        (random_key, self.test_feature2)])
+
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses[0].key, self.test_key)
+        self.assertIsNotNone(responses[1].key.name)
+
+        response, feature = entry.get_feature(responses[1].key)
+        self.assertTrue(feature.equals(self.test_feature2))
+
+    def test_iter_features(self):
+        entry = FeatureEntry(self.bucket)
+        keys = list(Key.make_key(bucket=self.bucket.bucket_name, name=name)
+                    for name in ['a', 'b', 'c'])
+        for key in keys:
+            entry.put_feature(key, self.test_feature1)
+
+        result = list(entry.iter_features())
+        self.assertEqual(list(response.key for response, feature in result),
+                         keys)
+        self.assertTrue(result[0][1].equals(self.test_feature1))
+        result = entry.iter_features(cursor=keys[0])
+        self.assertEqual(list(feature.key for response, feature in result),
+                         keys[1:])
+
     def test_get_feature(self):
         test_key = Key.make_key(bucket=self.bucket.bucket_name, name='alice')
         test_feature1 = Feature.build_from_geometry(
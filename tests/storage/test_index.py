@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'ray'
+__date__ = '10/18/14'
+
+"""
+    tests.storage.test_index
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+    Test for in memory spatial indexes
+
+"""
+
+import random
+import unittest
+
+import geohash
+
+from georest.storage.index import RTreeIndex, str_pack, str_search, \
+    bbox_intersects, GeohashIndex, geohash_cover, geohash_precision
+
+
+def random_bbox(rnd, size=10.):
+    x = rnd.uniform(-180, 180)
+    y = rnd.uniform(-90, 90)
+    return x, y, x + rnd.uniform(0, size), y + rnd.uniform(0, size)
+
+
+class TestRTreeIndex(unittest.TestCase):
+    def setUp(self):
+        self.rnd = random.Random(42)
+        self.items = dict(('f%d' % i, random_bbox(self.rnd))
+                          for i in range(1000))
+
+    def brute_force(self, items, bbox):
+        return sorted(name for name, item in items.items()
+                      if bbox_intersects(item, bbox))
+
+    def test_str_pack(self):
+        self.assertIsNone(str_pack([]))
+        root = str_pack(list((b, n) for n, b in self.items.items()),
+                        capacity=8)
+        for i in range(50):
+            bbox = random_bbox(self.rnd, 50.)
+            self.assertEqual(sorted(str_search(root, bbox)),
+                             self.brute_force(self.items, bbox))
+
+    def test_insert_remove(self):
+        index = RTreeIndex(rebuild_min=100)
+        for name, bbox in self.items.items():
+            index.insert(name, bbox)
+        self.assertEqual(len(index), 1000)
+        self.assertGreater(index.describe()['rebuilds'], 0)
+
+        # replace and remove items, mixing packed tree and delta buffer
+        for n, name in enumerate(sorted(self.items)):
+            if n % 3 == 0:
+                index.remove(name)
+                del self.items[name]
+            elif n % 3 == 1:
+                self.items[name] = random_bbox(self.rnd)
+                index.insert(name, self.items[name])
+        self.assertEqual(len(index), len(self.items))
+
+        for i in range(50):
+            bbox = random_bbox(self.rnd, 50.)
+            self.assertEqual(sorted(index.query(bbox)),
+                             self.brute_force(self.items, bbox))
+
+        index.rebuild()
+        self.assertEqual(index.describe()['delta'], 0)
+        self.assertEqual(index.describe()['tombstones'], 0)
+        bbox = (-180, -90, 180, 90)
+        self.assertEqual(sorted(index.query(bbox)), sorted(self.items))
+
+    def test_empty_bbox(self):
+        index = RTreeIndex()
+        index.insert('foo', [])
+        self.assertNotIn('foo', index)
+        index.remove('bar')
+        self.assertEqual(index.query((-180, -90, 180, 90)), [])
+
+
+class TestGeohashIndex(unittest.TestCase):
+    def test_precision(self):
+        self.assertEqual(geohash_precision(0, 0), 12)
+        self.assertEqual(geohash_precision(360, 180), 0)
+        self.assertEqual(geohash_precision(40, 40), 1)
+        self.assertEqual(geohash_precision(1, 1), 3)
+
+    def test_cover(self):
+        rnd = random.Random(42)
+        for i in range(100):
+            bbox = random_bbox(rnd, rnd.choice([0.001, 0.1, 10.]))
+            bbox = bbox[0], bbox[1], min(bbox[2], 180), min(bbox[3], 89.9)
+            cells = geohash_cover(bbox)
+            self.assertLessEqual(len(cells), 9)
+            # corners are covered
+            for x, y in [(bbox[0], bbox[1]), (bbox[2], bbox[3])]:
+                hash_ = geohash.encode(y, x, 12)
+                self.assertTrue(any(hash_.startswith(c) for c in cells))
+        self.assertEqual(geohash_cover((-180, -90, 180, 90)), [''])
+
+    def test_query(self):
+        index = GeohashIndex()
+        index.insert('a', 'wx4g0')
+        index.insert('b', 'wx4g1e')
+        index.insert('c', 'wx4')
+        index.insert('d', 'u')
+        index.insert('e', '')
+        index.insert('f', None)
+        self.assertEqual(len(index), 5)
+
+        self.assertEqual(sorted(index.query_prefix('wx4g')), ['a', 'b'])
+        self.assertEqual(sorted(index.query_prefix('')),
+                         ['a', 'b', 'c', 'd', 'e'])
+        # ancestors of the cell overlaps the cell
+        self.assertEqual(sorted(index.query_cells(['wx4g0', 'wx4g1'])),
+                         ['a', 'b', 'c', 'e'])
+
+        index.insert('a', 'u1')
+        index.remove('c')
+        self.assertEqual(sorted(index.query_cells(['wx4g0', 'u'])),
+                         ['a', 'd', 'e'])
+
+
+if __name__ == '__main__':
+    unittest.main()
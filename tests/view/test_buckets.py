@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+
+__author__ = 'pp'
+__date__ = '10/18/14'
+
+import json
+import unittest
+from georest import storage
+from tests.view.base import ViewTestMixin
+
+
+class TestBucketImport(ViewTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(TestBucketImport, self).setUp()
+        self.model = self.mock_feature_model
+        self.feature = '{"type":"Feature","geometry":{"type":"Point",' \
+                       '"coordinates":[1,2]},"properties":{}}'
+
+        def import_features(texts, bucket=None, batch_size=None):
+            return iter(list(dict(index=n, code=201, key='%s.%d' % (bucket, n))
+                             for n, text in enumerate(texts)))
+
+        self.model.import_features.side_effect = import_features
+
+    def check_results(self, r, count):
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'application/x-ndjson')
+        results = list(json.loads(line) for line in r.data.splitlines())
+        self.assertEqual(list(result['key'] for result in results),
+                         list('foo.%d' % n for n in range(count)))
+
+    def test_import_collection(self):
+        data = '{"type":"FeatureCollection","features":[%s]}' % \
+               ','.join([self.feature] * 3)
+        r = self.client.post('/buckets/foo/import', data=data,
+                             content_type='application/json')
+        self.check_results(r, 3)
+        args, kwargs = self.model.import_features.call_args
+        self.assertEqual(kwargs['bucket'], 'foo')
+        self.assertEqual(kwargs['batch_size'], 1000)
+
+    def test_import_ndjson(self):
+        data = '\n'.join([self.feature] * 2 + [''])
+        r = self.client.post('/buckets/foo/import', data=data,
+                             content_type='application/x-ndjson')
+        self.check_results(r, 2)
+
+    def test_import_invalid(self):
+        r = self.client.post('/buckets/foo/import', data='foo',
+                             content_type='text/plain')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.post('/buckets/foo/import', data='[]',
+                             content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+
+
+class TestBucketExport(ViewTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(TestBucketExport, self).setUp()
+        self.model = self.mock_feature_model
+        self.model.export_features.return_value = iter(['{"type":', '1}'])
+
+    def test_export(self):
+        r = self.client.get('/buckets/foo/export')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'application/json')
+        self.assertEqual(json.loads(r.data), {'type': 1})
+        self.model.export_features.assert_called_once_with(
+            bucket='foo', ndjson=False, cursor=None)
+
+    def test_export_ndjson(self):
+        r = self.client.get('/buckets/foo/export?format=ndjson&cursor=foo.a')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'application/x-ndjson')
+        self.model.export_features.assert_called_once_with(
+            bucket='foo', ndjson=True, cursor='foo.a')
+
+    def test_export_invalid(self):
+        r = self.client.get('/buckets/foo/export?format=shp')
+        self.assertEqual(r.status_code, 400)
+
+    def test_export_not_supported(self):
+        self.model.export_features.side_effect = \
+            storage.QueryNotSupported('listing is not supported')
+        r = self.client.get('/buckets/foo/export')
+        self.assertEqual(r.status_code, 501)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,8 +4,10 @@ __author__ = 'pp'
 __date__ = '6/11/14'
 
 import json
+import zlib
 from datetime import datetime
 import unittest
+from georest.view.compression import COMPRESSED_CACHE
 from tests.view.base import ViewTestMixin
 
 
@@ -34,8 +36,67 @@ class StorageViewBase(ViewTestMixin):
         r = self.client.get(self.get_url,
                             headers={'If-None-Match': '"hodorhodorhodor"'})
         self.assertEqual(r.status_code, 304)
+        self.assertIn('Accept-Encoding', r.headers['Vary'])
         self.model.get.assert_called_once_with(self.key)
 
+    def test_get_compressed(self):
+        COMPRESSED_CACHE.clear()
+        large = json.dumps([self.data] * 200)
+        self.model.get.return_value = self.data, {'etag': 'rev1'}
+        self.model.as_json.return_value = large
+        r = self.client.get(self.get_url,
+                            headers={'Accept-Encoding': 'deflate, gzip'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', r.headers['Vary'])
+        self.assertEqual(r.headers['ETag'], '"rev1-gzip"')
+        self.assertEqual(zlib.decompress(r.data, 16 + zlib.MAX_WBITS), large)
+
+        # compressed revision is cached
+        r = self.client.get(self.get_url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(zlib.decompress(r.data, 16 + zlib.MAX_WBITS), large)
+        self.assertEqual(r.headers['ETag'], '"rev1-gzip"')
+        self.assertEqual(self.model.as_json.call_count, 1)
+
+        # the coded representation has its own validator
+        r = self.client.get(self.get_url, headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': '"rev1-gzip"'})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.headers['ETag'], '"rev1-gzip"')
+        self.assertIn('Accept-Encoding', r.headers['Vary'])
+        r = self.client.get(self.get_url, headers={
+            'If-None-Match': '"rev1-gzip"'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['ETag'], '"rev1"')
+
+        r = self.client.get(self.get_url,
+                            headers={'Accept-Encoding': 'gzip;q=0.5, deflate'})
+        self.assertEqual(r.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(r.data), large)
+        self.assertEqual(self.model.as_json.call_count, 3)
+
+        r = self.client.get(self.get_url)
+        self.assertNotIn('Content-Encoding', r.headers)
+        self.assertEqual(r.headers['ETag'], '"rev1"')
+        self.assertEqual(r.data, large)
+
+        # too small to compress
+        self.model.get.return_value = self.data, {'etag': 'rev2'}
+        self.model.as_json.return_value = self.jdata
+        r = self.client.get(self.get_url, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', r.headers)
+        self.assertEqual(r.data, self.jdata)
+
+    def test_get_compressed_streaming(self):
+        self.app.config['STREAMING_RESPONSE'] = True
+        large = json.dumps([self.data] * 200)
+        self.model.get.return_value = self.data, {}
+        self.model.iter_json.return_value = iter([large[:100], large[100:]])
+        r = self.client.get(self.get_url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(zlib.decompress(r.data, 16 + zlib.MAX_WBITS), large)
+
     def test_put_ok(self):
         r = self.client.put(self.put_url, data=self.jdata,
                             content_type='application/json')
@@ -81,6 +142,87 @@ class TestFeatures(StorageViewBase, unittest.TestCase):
         self.bucket = 'foo'
         self.key = 'foo.bar'
 
+    def test_get_quantized(self):
+        self.model.get.return_value = self.data, {'etag': 'rev1'}
+        self.model.as_json.return_value = self.jdata
+        r = self.client.get(self.get_url + '?quantize=1000')
+        self.assertEqual(r.status_code, 200)
+        self.model.as_json.assert_called_once_with(self.data,
+                                                   quantization=1000)
+        self.assertEqual(r.mimetype, 'application/vnd.georest.quantized+json')
+        self.assertEqual(r.headers['ETag'], '"rev1-q1000"')
+        self.assertIn('Accept', r.headers['Vary'])
+
+        # validators are per representation
+        r = self.client.get(self.get_url + '?quantize=1000',
+                            headers={'If-None-Match': '"rev1"'})
+        self.assertEqual(r.status_code, 200)
+        r = self.client.get(self.get_url + '?quantize=1000',
+                            headers={'If-None-Match': '"rev1-q1000"'})
+        self.assertEqual(r.status_code, 304)
+        self.assertIn('Accept', r.headers['Vary'])
+        r = self.client.get(self.get_url,
+                            headers={'If-None-Match': '"rev1-q1000"'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'application/json')
+        self.assertEqual(r.headers['ETag'], '"rev1"')
+
+        self.model.as_json.reset_mock()
+        self.model.get.return_value = self.data, {}
+        r = self.client.get(self.get_url, headers={
+            'Accept': 'application/vnd.georest.quantized+json, '
+                      'application/json;q=0.5'})
+        self.assertEqual(r.status_code, 200)
+        self.model.as_json.assert_called_once_with(self.data,
+                                                   quantization=100000)
+
+        self.model.as_json.reset_mock()
+        r = self.client.get(self.get_url, headers={'Accept': '*/*'})
+        self.model.as_json.assert_called_once_with(self.data)
+
+        for quantize in ['x', '1']:
+            r = self.client.get(self.get_url + '?quantize=' + quantize)
+            self.assertEqual(r.status_code, 400)
+
+    def test_query_bbox(self):
+        self.model.query_bbox.return_value = [], None
+        self.model.iter_collection_json.return_value = \
+            iter(['{"type":"FeatureCollection","features":[],"cursor":null}'])
+        r = self.client.get('/features?bbox=0,0,10,10&bucket=foo&limit=5'
+                            '&cursor=foo.a')
+        self.assertEqual(r.status_code, 200)
+        self.model.query_bbox.assert_called_once_with(
+            (0., 0., 10., 10.), bucket='foo', limit=5, cursor='foo.a')
+        self.assertEqual(json.loads(r.data)['type'], 'FeatureCollection')
+
+    def test_query_near(self):
+        self.model.query_distance.return_value = [], None
+        self.model.iter_collection_json.return_value = iter(['{}'])
+        r = self.client.get('/features?near=1,2&distance=0.5&bucket=foo')
+        self.assertEqual(r.status_code, 200)
+        args, kwargs = self.model.query_distance.call_args
+        self.assertEqual(args[0].wkt, 'POINT (1 2)')
+        self.assertEqual(args[0].crs.srid, 4326)
+        self.assertEqual(args[1], 0.5)
+        r = self.client.get('/features?near=1,2&distance=-1')
+        self.assertEqual(r.status_code, 400)
+
+    def test_query_geohash(self):
+        self.model.query_geohash.return_value = [], None
+        self.model.iter_collection_json.return_value = iter(['{}'])
+        r = self.client.get('/features?geohash=wx4&limit=10')
+        self.assertEqual(r.status_code, 200)
+        self.model.query_geohash.assert_called_once_with(
+            'wx4', bucket=None, limit=10, cursor=None)
+
+    def test_query_bbox_invalid(self):
+        r = self.client.get('/features?bbox=0,0,10')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('/features?bbox=10,0,0,10')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('/features?bbox=0,0,10,10&limit=0')
+        self.assertEqual(r.status_code, 400)
+
     def test_delete(self):
         self.model.delete.return_value = {}
         r = self.client.delete(self.delete_url, headers={'If-Match': '"tatar"'})
@@ -119,6 +261,17 @@ class TestProperties(StorageViewBase, unittest.TestCase):
         self.bucket = 'foo'
         self.key = 'foo.bar'
 
+    def test_get_not_quantized(self):
+        self.model.get.return_value = self.data, {'etag': 'rev1'}
+        self.model.as_json.return_value = self.jdata
+        r = self.client.get(self.get_url + '?quantize=1000')
+        self.assertEqual(r.status_code, 200)
+        self.model.as_json.assert_called_once_with(self.data)
+        self.assertEqual(r.mimetype, 'application/json')
+        self.assertEqual(r.headers['ETag'], '"rev1"')
+        vary = r.headers.get('Vary', '').split(', ')
+        self.assertNotIn('Accept', vary)
+
     @unittest.skip('No post for properties')
     def test_post_ok(self):
         pass
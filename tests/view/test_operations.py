@@ -5,12 +5,14 @@ __date__ = '6/25/14'
 
 
 import json
+import zlib
 import unittest
 
 import mock
 
 from georest import geo
 from georest.model.operations import OperationResult
+from georest.view.compression import COMPRESSED_CACHE
 from tests.view.base import ViewTestMixin
 
 
@@ -47,6 +49,42 @@ class TestOperations(ViewTestMixin, unittest.TestCase):
         self.mock_geometry_model.get.assert_has_calls(
                          map(mock.call, ['knit.net', 'bit.bot']))
 
+    def test_get_compressed(self):
+        COMPRESSED_CACHE.clear()
+        result_geom = geo.Geometry.build_geometry(
+            'LINESTRING (%s)' % ','.join('%d %d' % (i, i) for i in range(500)))
+        self.mock_operations_model.invoke.return_value = \
+            OperationResult(result_geom, False)
+        geom = geo.Geometry.build_geometry(self.geojsons[1])
+        geom._cache_key = ('foo.bar', 'rev1', 4326)
+        self.mock_geometry_model.get.return_value = geom, {}
+        for _ in range(2):
+            r = self.client.get('/operations/buffer/foo.bar?distance=1',
+                                headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(
+                json.loads(zlib.decompress(r.data, 16 + zlib.MAX_WBITS)),
+                json.loads(result_geom.geojson))
+        # second one is served from compressed cache
+        self.mock_operations_model.invoke.assert_called_once_with(
+            'buffer', geom, distance='1')
+
+        # not cached for unversioned inputs
+        geom._cache_key = ('foo.bar', None, 4326)
+        r = self.client.get('/operations/buffer/foo.bar?distance=1',
+                            headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(self.mock_operations_model.invoke.call_count, 2)
+        geom._cache_key = ('foo.bar', 'rev1', 4326)
+
+        # not cached without result cache
+        self.mock_operations_model.result_cache = None
+        r = self.client.get('/operations/buffer/foo.bar?distance=1',
+                            headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(self.mock_operations_model.invoke.call_count, 3)
+
     def test_get_literal_fail(self):
         r = self.client.get('/operations/hedgehog/~?cat=Mike')
         self.assertEqual(r.status_code, 400)
@@ -104,6 +142,111 @@ class TestOperations(ViewTestMixin, unittest.TestCase):
         self.assertEqual(r.status_code, 400)
 
 
+class TestPipeline(ViewTestMixin, unittest.TestCase):
+    def test_get(self):
+        geom = geo.Geometry.build_geometry('{"type":"Point","coordinates":[30,10]}')
+        self.mock_geometry_model.get.return_value = geom, {}
+        self.mock_operations_model.invoke_pipeline.return_value = OperationResult(100, True)
+        r = self.client.get('/operations/pipeline/foo.bar?steps=buffer,area'
+                            '&0.distance=1&srid=3857')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(json.loads(r.data), {'result': 100})
+        self.mock_operations_model.invoke_pipeline.assert_called_once_with(
+            [('buffer', {'distance': '1'}), ('area', {})], geom, srid=3857)
+
+    def test_post(self):
+        self.mock_operations_model.invoke_pipeline.return_value = OperationResult(100, True)
+        r = self.client.post('/operations/pipeline/~?steps=centroid',
+                             content_type='application/json',
+                             data='{"type":"Point","coordinates":[30,10]}')
+        self.assertEqual(r.status_code, 200)
+        args, kwargs = self.mock_operations_model.invoke_pipeline.call_args
+        self.assertEqual(args[0], [('centroid', {})])
+
+    def test_fail(self):
+        r = self.client.get('/operations/pipeline/foo.bar')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('/operations/pipeline/foo.bar?steps=area&1.x=1')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('/operations/pipeline/foo.bar'
+                            '?steps=buffer,area&0.srid=3857')
+        self.assertEqual(r.status_code, 400)
+
+
+class TestBatchOperations(ViewTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(TestBatchOperations, self).setUp()
+
+        def invoke_batch(op_name, geoms, *args, **kwargs):
+            return (OperationResult(g.geom_type, True) for g in geoms)
+
+        self.mock_operations_model.invoke_batch.side_effect = invoke_batch
+        self.collection = '{"type":"GeometryCollection","geometries":[{"type":"Point","coordinates":[30,10]},{"type":"LineString","coordinates":[[30,10],[10,30]]}]}'
+
+    def test_geometry_collection(self):
+        r = self.client.post('/operations/batch/kangaroo?owl=Tyto',
+                             content_type='application/json',
+                             data=self.collection)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(json.loads(r.data),
+                         {'results': ['Point', 'LineString']})
+        args, kwargs = self.mock_operations_model.invoke_batch.call_args
+        self.assertEqual(args[0], 'kangaroo')
+        self.assertEqual(kwargs, {'owl': 'Tyto'})
+
+    def test_feature_collection(self):
+        data = '{"type":"FeatureCollection","features":[{"type":"Feature","properties":{},"geometry":{"type":"Point","coordinates":[30,10]}}]}'
+        r = self.client.post('/operations/batch/kangaroo',
+                             content_type='application/json',
+                             data=data)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(json.loads(r.data), {'results': ['Point']})
+
+    def test_ndjson_stream(self):
+        data = '{"type":"Point","coordinates":[30,10]}\n\nPOINT(1 2)\n'
+        r = self.client.post('/operations/batch/kangaroo?stream=1',
+                             content_type='application/x-ndjson',
+                             data=data)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([json.loads(l) for l in r.data.splitlines()],
+                         [{'result': 'Point'}, {'result': 'Point'}])
+
+    def test_other(self):
+        geom = geo.Geometry.build_geometry('{"type":"Point","coordinates":[30,10]}')
+        self.mock_geometry_model.get.return_value = geom, {}
+        r = self.client.post('/operations/batch/kangaroo?other=foo.bar',
+                             content_type='application/json',
+                             data=self.collection)
+        self.assertEqual(r.status_code, 200)
+        self.mock_geometry_model.get.assert_called_once_with('foo.bar')
+        args, kwargs = self.mock_operations_model.invoke_batch.call_args
+        self.assertIs(args[2], geom)
+
+    def test_fail(self):
+        r = self.client.post('/operations/batch/kangaroo',
+                             content_type='application/json',
+                             data='{"type":"Point","coordinates":[30,10]}')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.post('/operations/batch/kangaroo?stream=1',
+                             content_type='application/x-ndjson',
+                             data='POINT(1 2)\nbad\n')
+        self.assertEqual(r.status_code, 200)
+        lines = [json.loads(l) for l in r.data.splitlines()]
+        self.assertEqual(lines[0], {'result': 'Point'})
+        self.assertEqual(lines[1]['code'], 400)
+
+
+    def test_key_named_batch(self):
+        # not hidden by the batch endpoint
+        self.mock_operations_model.invoke.return_value = \
+            OperationResult(1, True)
+        geom = geo.Geometry.build_geometry('POINT (30 10)')
+        self.mock_geometry_model.get.return_value = geom, {}
+        r = self.client.get('/operations/kangaroo/batch')
+        self.assertEqual(r.status_code, 200)
+        self.mock_geometry_model.get.assert_called_once_with('batch')
+
+
 class TestAttributes(ViewTestMixin, unittest.TestCase):
     def test_attributes(self):
         jdata = '{"foo": "bar"}'